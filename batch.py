@@ -0,0 +1,225 @@
+import os
+import time
+import threading
+from collections import deque
+
+import launcher
+from journal import partial_path
+
+
+def default_job_count(cpu_count=None):
+    """Сколько задач ffmpeg запускать одновременно (по числу ядер)"""
+    cpu = cpu_count or os.cpu_count() or 1
+    # libx264 плохо масштабируется дальше ~8 потоков на один процесс,
+    # поэтому оставшиеся ядра лучше отдать другим файлам
+    return max(1, cpu // 8)
+
+
+def split_threads(total_threads, job_count):
+    """Делим потоки ffmpeg (-threads) между одновременными задачами"""
+    total = total_threads or os.cpu_count() or 1
+    return max(1, total // max(1, job_count))
+
+
+class ConversionJob:
+    """Одна задача конвертации: входной файл -> выходной файл"""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    def __init__(self, index, input_file, output_file):
+        self.index = index
+        self.input_file = input_file
+        self.source_file = input_file  # что читает ffmpeg: исходник или локальная копия
+        self.output_file = output_file
+        self.partial_file = partial_path(output_file)
+        self.name = os.path.basename(input_file)
+
+        self.status = self.PENDING
+        self.result = None
+        self.duration = 0
+        self.current_time = 0
+        self.fps = 0.0
+        self.speed = 0.0
+        self.output_size = 0
+        self.threads = 0
+        self.mode = None          # StreamPlan.mode: copy / audio / transcode
+        self.cached = None        # 'skipped' / 'cache' если кодировать не пришлось
+        self.renditions = []      # RenditionOutput, если задан набор качеств
+        self.clip_start = None    # фрагмент файла, с (None - с начала)
+        self.clip_end = None      # (None - до конца)
+        self.metrics = None       # metrics.JobMetrics
+        self.probe_time = 0.0     # сколько читались метаданные (при первом чтении, не из кэша), с
+        self.estimate = 0.0       # прогноз времени кодирования, с (eta.SpeedModel)
+        self.stage = None         # 'faststart' - кодирование закончено, ffmpeg переписывает файл
+        self.stage_start = None
+        self.error_category = None  # ffmpeg_errors: категория ошибки неудачной задачи
+        self.log_tail = []          # последние строки stderr ffmpeg неудачной задачи
+        self.process = None
+        self.cancel_requested = False
+        self.queued_at = None     # когда задача встала в очередь планировщика
+        self.start_time = None
+        self.end_time = None
+
+    @property
+    def finished(self):
+        return self.status in (self.DONE, self.FAILED, self.CANCELLED)
+
+    @property
+    def percent(self):
+        """Прогресс задачи в процентах"""
+        if self.status == self.DONE:
+            return 100.0
+        if self.duration > 0:
+            return min(100.0, self.current_time / self.duration * 100)
+        return 0.0
+
+    def terminate(self):
+        """Останавливаем процесс ffmpeg этой задачи"""
+        self.cancel_requested = True
+        launcher.terminate(self.process)
+
+
+def batch_percent(jobs):
+    """Общий прогресс пакета, взвешенный по длительности файлов"""
+    if not jobs:
+        return 0.0
+
+    known = [job.duration for job in jobs if job.duration > 0]
+    # Для файлов с неизвестной длительностью берем среднюю
+    fallback = sum(known) / len(known) if known else 1.0
+
+    total = 0.0
+    done = 0.0
+    for job in jobs:
+        weight = job.duration if job.duration > 0 else fallback
+        total += weight
+        if job.finished:
+            done += weight
+        else:
+            done += weight * job.percent / 100
+    return done / total * 100 if total > 0 else 0.0
+
+
+class BatchScheduler:
+    """Пул воркеров: выполняет до limit задач одновременно.
+
+    limit можно менять во время пакета (set_limit), а admission() может
+    временно запретить запуск новых задач (например, мало памяти).
+    В режиме keep_open задачи добавляются на ходу (submit) до close().
+    """
+
+    def __init__(self, run_job, max_jobs=0, total_threads=0, on_update=None, admission=None):
+        # run_job(job) -> (success, message), вызывается в потоке воркера
+        self.run_job = run_job
+        self.max_jobs = max_jobs or default_job_count()
+        self.total_threads = total_threads or os.cpu_count() or 1
+        self.on_update = on_update
+        self.admission = admission
+
+        self.condition = threading.Condition()
+        self.pending = deque()
+        self.running = []
+        self.limit = self.max_jobs
+        self.cancelled = False
+        self.closed = False
+
+    def set_limit(self, limit):
+        """Меняет число одновременных задач (лишние запущенные доработают)"""
+        with self.condition:
+            self.limit = max(1, limit)
+            self.condition.notify_all()
+
+    def _admitted(self):
+        # Хотя бы одна задача идет всегда, иначе пакет встанет
+        if not self.running or self.admission is None:
+            return True
+        try:
+            return self.admission()
+        except Exception:
+            return True
+
+    def notify(self, job):
+        if self.on_update:
+            try:
+                self.on_update(job)
+            except Exception:
+                pass
+
+    def submit(self, job):
+        """Добавляет задачу в очередь работающего пакета"""
+        with self.condition:
+            job.queued_at = time.time()
+            self.pending.append(job)
+            self.condition.notify_all()
+
+    def close(self):
+        """Новых задач не будет: run() вернется, когда доработают текущие"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def run(self, jobs, keep_open=False):
+        """Выполняет все задачи; возвращается когда пакет закончен"""
+        pending = self.pending
+        now = time.time()
+        for job in jobs:
+            job.queued_at = now
+        pending.extend(jobs)
+        if not keep_open:
+            self.limit = max(1, min(self.limit, len(jobs)))
+
+        with self.condition:
+            while pending or self.running or (keep_open and not self.closed and not self.cancelled):
+                while (pending and len(self.running) < self.limit and not self.cancelled
+                       and self._admitted()):
+                    job = pending.popleft()
+                    job.threads = split_threads(self.total_threads, self.limit)
+                    self.running.append(job)
+                    worker = threading.Thread(target=self._worker, args=(job,), daemon=True)
+                    worker.start()
+
+                if self.cancelled:
+                    while pending:
+                        job = pending.popleft()
+                        job.status = ConversionJob.CANCELLED
+                        self.notify(job)
+
+                self.condition.wait(0.5)
+
+        return jobs
+
+    def _worker(self, job):
+        job.status = ConversionJob.RUNNING
+        job.start_time = time.time()
+        self.notify(job)
+
+        try:
+            success, message = self.run_job(job)
+        except Exception as e:
+            success, message = False, f"Исключение: {str(e)}"
+
+        job.end_time = time.time()
+        job.result = message
+        if self.cancelled and not success:
+            job.status = ConversionJob.CANCELLED
+        else:
+            job.status = ConversionJob.DONE if success else ConversionJob.FAILED
+        self.notify(job)
+
+        with self.condition:
+            self.running.remove(job)
+            self.condition.notify_all()
+
+    def cancel(self):
+        """Отменяет пакет: ожидающие задачи не стартуют, запущенные останавливаются"""
+        with self.condition:
+            self.cancelled = True
+            running = list(self.running)
+            self.condition.notify_all()
+
+        for job in running:
+            job.terminate()
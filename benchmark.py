@@ -0,0 +1,279 @@
+"""Замер скорости конвертации: python -m benchmark [опции]
+
+Тестовые видео генерируются самим ffmpeg (testsrc2 + sine), поэтому
+результаты воспроизводимы на любой машине. Кодирование идет тем же путем,
+что и обычная конвертация (ConversionEngine.convert_video_with_progress).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import threading
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+import launcher
+from batch import ConversionJob
+from engine import ConversionEngine, ConversionOptions, find_ffmpeg, get_ffmpeg_version
+
+
+# Тестовые входы: имя -> (ширина, высота)
+SIZES = {
+    '360p': (640, 360),
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '2160p': (3840, 2160),
+}
+DEFAULT_CASES = ('360p', '720p', '1080p')
+DEFAULT_DURATION = 10
+FRAME_RATE = 25
+
+# Отклонение fps от эталона, которое считаем шумом
+DEFAULT_TOLERANCE = 0.05
+
+
+def generate_input(ffmpeg_path, name, duration, work_dir):
+    """Создает (или берет уже созданный) тестовый файл"""
+    width, height = SIZES[name]
+    path = os.path.join(work_dir, f"bench_{name}_{duration}s.mkv")
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(work_dir, exist_ok=True)
+    partial = path + '.part.mkv'
+    # MPEG-4 Part 2 кодируется быстро и точно не подойдет для копирования
+    result = launcher.run([
+        ffmpeg_path,
+        '-f', 'lavfi', '-i', f"testsrc2=size={width}x{height}:rate={FRAME_RATE}:duration={duration}",
+        '-f', 'lavfi', '-i', f"sine=frequency=1000:sample_rate=48000:duration={duration}",
+        '-c:v', 'mpeg4', '-q:v', '2',
+        '-c:a', 'pcm_s16le',
+        '-loglevel', 'error', '-y', partial
+    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"Не удалось создать тестовый файл {name}: "
+                           f"{result.stderr.decode('utf-8', 'ignore').strip()}")
+    os.replace(partial, path)
+    return path
+
+
+def _process_peak_rss(pid):
+    """Пиковая память процесса в байтах (или текущая, если пик недоступен)"""
+    if psutil is not None:
+        try:
+            info = psutil.Process(pid).memory_info()
+            return getattr(info, 'peak_wset', None) or info.rss
+        except Exception:
+            return 0
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+class PeakMemorySampler:
+    """Следит за процессом ffmpeg задачи и запоминает пик памяти"""
+
+    def __init__(self, job, interval=0.1):
+        self.job = job
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def _loop(self):
+        while not self.stopped.is_set():
+            process = self.job.process
+            if process is not None and hasattr(process, 'pid'):
+                self.peak = max(self.peak, _process_peak_rss(process.pid))
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        return self.peak
+
+
+def run_case(engine, name, input_file, duration, work_dir, threads=0):
+    """Один прогон: кодируем тестовый файл, возвращаем замеры"""
+    output_file = os.path.join(work_dir, 'out', f"bench_{name}.mp4")
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+
+    job = ConversionJob(0, input_file, output_file)
+    job.threads = threads
+    job.duration = duration
+    frames = [0]
+
+    def progress_callback(current_time, snapshot=None):
+        job.current_time = current_time
+        if snapshot is not None and snapshot.frame:
+            frames[0] = snapshot.frame
+
+    sampler = PeakMemorySampler(job)
+    start = time.perf_counter()
+    success, message = engine.convert_video_with_progress(job, progress_callback)
+    wall_time = time.perf_counter() - start
+    peak_rss = sampler.stop()
+
+    if not success:
+        raise RuntimeError(f"{name}: {message}")
+
+    size = os.path.getsize(job.partial_file)
+    os.remove(job.partial_file)
+    frame_count = frames[0] or int(duration * FRAME_RATE)
+    return {
+        'wall_time': round(wall_time, 3),
+        'fps': round(frame_count / wall_time, 2),
+        'realtime': round(duration / wall_time, 3),
+        'peak_rss_mb': round(peak_rss / 1024 ** 2, 1),
+        'output_size': size
+    }
+
+
+def run_benchmark(ffmpeg_path, cases=DEFAULT_CASES, duration=DEFAULT_DURATION,
+                  repeat=1, options=None, threads=0, work_dir='benchmark_data', log=None):
+    """Прогоняет все случаи; из повторов берется медиана по времени"""
+    options = options or ConversionOptions()
+    engine = ConversionEngine(options, ffmpeg_path)
+
+    results = []
+    for name in cases:
+        input_file = generate_input(ffmpeg_path, name, duration, work_dir)
+        runs = [run_case(engine, name, input_file, duration, work_dir, threads)
+                for _ in range(max(1, repeat))]
+        runs.sort(key=lambda run: run['wall_time'])
+        best = dict(runs[len(runs) // 2])
+        best['peak_rss_mb'] = max(run['peak_rss_mb'] for run in runs)
+        if len(runs) > 1:
+            best['wall_time_stdev'] = round(statistics.stdev(run['wall_time'] for run in runs), 3)
+
+        width, height = SIZES[name]
+        result = {'name': name, 'width': width, 'height': height, 'duration': duration,
+                  'runs': len(runs)}
+        result.update(best)
+        results.append(result)
+        if log:
+            log(result)
+
+    return {
+        'time': round(time.time(), 3),
+        'host': platform.node(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'ffmpeg': get_ffmpeg_version(ffmpeg_path),
+        'settings': {
+            'video_bitrate': options.video_bitrate,
+            'audio_bitrate': options.audio_bitrate,
+            'profile': options.profile,
+            'priority': options.priority,
+            'threads': threads
+        },
+        'cases': results
+    }
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Сравнение с эталоном по fps: список {'name', 'fps', 'baseline_fps', 'change', 'verdict'}"""
+    reference = {case['name']: case for case in baseline.get('cases', [])}
+    report = []
+    for case in results['cases']:
+        base = reference.get(case['name'])
+        if not base or not base.get('fps'):
+            continue
+        change = case['fps'] / base['fps'] - 1
+        if change > tolerance:
+            verdict = 'faster'
+        elif change < -tolerance:
+            verdict = 'slower'
+        else:
+            verdict = 'same'
+        report.append({'name': case['name'], 'fps': case['fps'], 'baseline_fps': base['fps'],
+                       'change': round(change, 4), 'verdict': verdict})
+    return report
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmark",
+        description="Замер скорости конвертации на синтетических видео"
+    )
+    parser.add_argument('--cases', default=','.join(DEFAULT_CASES),
+                        help="разрешения через запятую: " + ", ".join(SIZES))
+    parser.add_argument('--duration', type=int, default=DEFAULT_DURATION, metavar='SEC')
+    parser.add_argument('--repeat', type=int, default=1, metavar='N',
+                        help="повторов на случай (берется медиана)")
+    parser.add_argument('--threads', type=int, default=0, metavar='N',
+                        help="-threads для ffmpeg (0 - ffmpeg решает сам)")
+    parser.add_argument('--video-bitrate', type=int, default=2500, metavar='KBPS')
+    parser.add_argument('--audio-bitrate', type=int, default=128, metavar='KBPS')
+    parser.add_argument('--profile', choices=['main', 'baseline'], default='main')
+    parser.add_argument('--priority', choices=list(launcher.PRIORITIES), default='normal')
+    parser.add_argument('--work-dir', default='benchmark_data', metavar='DIR',
+                        help="папка для тестовых файлов")
+    parser.add_argument('--output', metavar='FILE', help="сохранить результаты в JSON")
+    parser.add_argument('--baseline', metavar='FILE', help="сравнить с сохраненными результатами")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="допустимое отклонение fps (доля)")
+    parser.add_argument('--ffmpeg', metavar='PATH', help="путь к ffmpeg")
+    return parser
+
+
+def print_json(data):
+    print(json.dumps(data, ensure_ascii=False), flush=True)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    cases = [name.strip() for name in args.cases.split(',') if name.strip()]
+    unknown = [name for name in cases if name not in SIZES]
+    if unknown:
+        print_json({'event': 'error', 'message': f"Неизвестные случаи: {', '.join(unknown)}"})
+        return 2
+
+    ffmpeg_path = args.ffmpeg or find_ffmpeg()
+    if not ffmpeg_path:
+        print_json({'event': 'error', 'message': "FFmpeg не найден"})
+        return 2
+
+    options = ConversionOptions(video_bitrate=args.video_bitrate, audio_bitrate=args.audio_bitrate,
+                                profile=args.profile, priority=args.priority,
+                                smart_copy=False, output_cache=False)
+    try:
+        results = run_benchmark(ffmpeg_path, cases, args.duration, args.repeat, options,
+                                args.threads, args.work_dir,
+                                log=lambda case: print_json(dict(case, event='case')))
+    except RuntimeError as e:
+        print_json({'event': 'error', 'message': str(e)})
+        return 2
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    regressions = 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        for row in compare(results, baseline, args.tolerance):
+            print_json(dict(row, event='compare'))
+            regressions += row['verdict'] == 'slower'
+
+    print_json({'event': 'summary', 'cases': len(results['cases']), 'regressions': regressions})
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import os
+import threading
+
+try:
+    import psutil
+except ImportError:  # psutil не обязателен: есть запасные способы
+    psutil = None
+
+from batch import ConversionJob
+
+
+# Не запускаем новые задачи, если занято больше этой доли памяти (%)
+DEFAULT_MEMORY_CEILING = 85
+
+# Цели контроллера по загрузке процессора (%)
+CPU_LOW = 75
+CPU_HIGH = 95
+
+# Насколько должна вырасти общая скорость, чтобы прибавка задачи окупилась
+MIN_GAIN = 1.05
+
+# Сколько шагов не пробуем снова поднять число задач после неудачной прибавки
+HOLD_STEPS = 12
+
+
+class SystemMonitor:
+    """Загрузка процессора и памяти (psutil, /proc или WinAPI)"""
+
+    def __init__(self):
+        self.last_cpu_times = None
+
+    def cpu_percent(self):
+        """Загрузка CPU в % с прошлого вызова или None"""
+        if psutil is not None:
+            return psutil.cpu_percent(interval=None)
+
+        times = _cpu_times()
+        if times is None:
+            return _loadavg_percent()
+
+        previous, self.last_cpu_times = self.last_cpu_times, times
+        if previous is None:
+            return None
+        busy = times[0] - previous[0]
+        total = times[1] - previous[1]
+        return busy / total * 100 if total > 0 else None
+
+    def memory_percent(self):
+        """Занятая память в % или None, если узнать нельзя"""
+        if psutil is not None:
+            return psutil.virtual_memory().percent
+        return _memory_percent()
+
+
+def _cpu_times():
+    """(занято, всего) в тиках с запуска системы или None"""
+    if os.name == 'nt':
+        return _windows_cpu_times()
+    try:
+        with open('/proc/stat', 'r') as f:
+            values = [int(v) for v in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+    idle = values[3] + (values[4] if len(values) > 4 else 0)  # idle + iowait
+    total = sum(values[:8])
+    return total - idle, total
+
+
+def _windows_cpu_times():
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        idle, kernel, user = wintypes.FILETIME(), wintypes.FILETIME(), wintypes.FILETIME()
+        if not ctypes.windll.kernel32.GetSystemTimes(ctypes.byref(idle), ctypes.byref(kernel),
+                                                     ctypes.byref(user)):
+            return None
+
+        def ticks(value):
+            return (value.dwHighDateTime << 32) | value.dwLowDateTime
+
+        # Время ядра включает простой
+        total = ticks(kernel) + ticks(user)
+        return total - ticks(idle), total
+    except Exception:
+        return None
+
+
+def _loadavg_percent():
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1) * 100
+    except (AttributeError, OSError):
+        return None
+
+
+def _memory_percent():
+    if os.name == 'nt':
+        try:
+            import ctypes
+
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                            ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                            ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                            ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                            ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return float(status.dwMemoryLoad)
+        except Exception:
+            pass
+        return None
+
+    try:
+        values = {}
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                values[key] = int(rest.split()[0])
+        return (1 - values['MemAvailable'] / values['MemTotal']) * 100
+    except (OSError, KeyError, ValueError, ZeroDivisionError):
+        return None
+
+
+class ConcurrencyController:
+    """Подбирает число одновременных задач во время пакета.
+
+    Раз в interval секунд смотрит на загрузку CPU и памяти и на общую
+    скорость кодирования (сумма speed= из прогресса ffmpeg):
+    - процессор недогружен - добавляет задачу;
+    - прибавка не ускорила пакет или CPU перегружен - убирает;
+    - память выше потолка - новые задачи не стартуют совсем (admit).
+    """
+
+    def __init__(self, scheduler, min_jobs=1, max_jobs=None,
+                 memory_ceiling=DEFAULT_MEMORY_CEILING, interval=5.0, monitor=None,
+                 on_change=None):
+        self.scheduler = scheduler
+        self.on_change = on_change  # on_change(limit, cpu, memory)
+        self.min_jobs = max(1, min_jobs)
+        self.max_jobs = max(self.min_jobs, max_jobs or os.cpu_count() or 1)
+        self.memory_ceiling = memory_ceiling
+        self.interval = interval
+        self.monitor = monitor or SystemMonitor()
+
+        self.stopped = threading.Event()
+        self.thread = None
+        self.last_throughput = None
+        self.just_raised = False
+        self.hold = 0
+
+    def admit(self):
+        """Можно ли сейчас запустить еще одну задачу (жесткий потолок памяти)"""
+        if not self.memory_ceiling:
+            return True
+        memory = self.monitor.memory_percent()
+        return memory is None or memory < self.memory_ceiling
+
+    def start(self):
+        self.monitor.cpu_percent()  # первый замер - точка отсчета
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _loop(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.step()
+            except Exception:
+                pass
+
+    def throughput(self):
+        """Общая скорость кодирования (секунд видео в секунду)"""
+        return sum(job.speed for job in list(self.scheduler.running)
+                   if job.status == ConversionJob.RUNNING)
+
+    def step(self):
+        """Один шаг регулировки"""
+        limit = self.scheduler.limit
+        running = len(self.scheduler.running)
+        cpu = self.monitor.cpu_percent()
+        memory = self.monitor.memory_percent()
+        throughput = self.throughput()
+
+        self.hold = max(0, self.hold - 1)
+        new_limit = limit
+        if self.memory_ceiling and memory is not None and memory >= self.memory_ceiling:
+            # Память на исходе: уменьшаем, чтобы следующая задача не стартовала
+            new_limit = max(self.min_jobs, min(limit, running) - 1)
+        elif self.just_raised and self.last_throughput and throughput < self.last_throughput * MIN_GAIN:
+            # Прибавка не ускорила пакет - возвращаем как было
+            new_limit = limit - 1
+            self.hold = HOLD_STEPS
+        elif cpu is not None and cpu > CPU_HIGH and running >= limit:
+            new_limit = limit - 1
+        elif cpu is not None and cpu < CPU_LOW and running >= limit and not self.hold:
+            new_limit = limit + 1
+
+        new_limit = max(self.min_jobs, min(self.max_jobs, new_limit))
+        self.just_raised = new_limit > limit
+        self.last_throughput = throughput
+        if new_limit != limit:
+            self.scheduler.set_limit(new_limit)
+            if self.on_change:
+                self.on_change(new_limit, cpu, memory)
+        return new_limit
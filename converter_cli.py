@@ -0,0 +1,278 @@
+"""Конвертер без окна: python -m converter_cli [опции] файлы/папки
+
+Прогресс выводится в stdout построчно в формате JSON (одно событие на строку).
+"""
+import os
+import sys
+import json
+import argparse
+import threading
+
+from engine import (ConversionEngine, ConversionOptions, DEFAULT_SETTINGS, Event,
+                    VIDEO_EXTENSIONS, collect_inputs, convert, find_ffmpeg)
+from journal import BatchJournal
+from metrics import export_report
+from eta import QUEUE_ORDERS
+from watch_folder import FolderWatcher
+from launcher import PRIORITIES
+from prefetch import PREFETCH_MODES
+from renditions import LADDERS
+from encoders import ENCODER_TARGETS
+from smart_cut import split_clip, with_clip, parse_time
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m converter_cli",
+        description="Конвертация видео в MP4 (H.264/AAC) без графического интерфейса"
+    )
+    parser.add_argument('inputs', nargs='*',
+                        help="видеофайлы или папки (с --watch - папки); "
+                             "фрагмент файла: 'видео.mp4#t=1:00,3:30'")
+    parser.add_argument('-r', '--recursive', action='store_true',
+                        help="искать видео во вложенных папках")
+    parser.add_argument('--settings', metavar='FILE',
+                        help="взять настройки из converter_settings.json")
+    parser.add_argument('--video-bitrate', type=int, metavar='KBPS')
+    parser.add_argument('--audio-bitrate', type=int, metavar='KBPS')
+    parser.add_argument('--profile', choices=['main', 'baseline'])
+    parser.add_argument('--output-dir', metavar='NAME',
+                        help="папка для результатов (рядом с исходниками)")
+    parser.add_argument('-j', '--jobs', type=int, metavar='N',
+                        help="файлов одновременно (0 - подбирать по загрузке CPU)")
+    parser.add_argument('--memory-ceiling', type=float, metavar='PERCENT',
+                        help="не запускать новые задачи, если занято больше %% памяти")
+    parser.add_argument('--split', dest='split_encode', action='store_true', default=None,
+                        help="кодировать длинные файлы частями параллельно")
+    parser.add_argument('--no-smart-copy', dest='smart_copy', action='store_false', default=None,
+                        help="всегда перекодировать, даже подходящие H.264/AAC")
+    parser.add_argument('--no-cache', dest='output_cache', action='store_false', default=None,
+                        help="не использовать кэш готовых файлов")
+    parser.add_argument('--cache-dir', metavar='DIR')
+    parser.add_argument('--cache-max-gb', type=float, metavar='GB')
+    parser.add_argument('--priority', choices=list(PRIORITIES),
+                        help="приоритет ffmpeg (CPU и диск)")
+    parser.add_argument('--prefetch', choices=list(PREFETCH_MODES),
+                        help="подготовка следующих файлов: только метаданные, "
+                             "чтение заранее или копия на локальный диск")
+    parser.add_argument('--prefetch-count', type=int, metavar='N',
+                        help="на сколько файлов вперед готовить (0 - выключить)")
+    parser.add_argument('--prefetch-budget-mb', type=int, metavar='MB',
+                        help="сколько данных можно прочитать/скопировать заранее")
+    parser.add_argument('--scratch-dir', metavar='DIR',
+                        help="локальная папка для копий (--prefetch stage)")
+    parser.add_argument('--ladder', metavar='NAME',
+                        help="несколько качеств за один проход: "
+                             + ", ".join(LADDERS) + " или свой набор из --settings")
+    parser.add_argument('--order', dest='queue_order', choices=list(QUEUE_ORDERS),
+                        help="порядок очереди: как указаны, сначала короткие "
+                             "(меньше ожидание) или сначала длинные (раньше конец пакета)")
+    parser.add_argument('--encoder-target', choices=list(ENCODER_TARGETS),
+                        help="подобрать кодировщик и пресет по замерам этой машины: "
+                             "максимальная скорость, баланс или лучшее качество при --min-speed")
+    parser.add_argument('--min-speed', dest='min_realtime', type=float, metavar='X',
+                        help="для --encoder-target quality: не медленнее X реального времени (1080p)")
+    parser.add_argument('--start', metavar='TIME',
+                        help="начало фрагмента для всех файлов (секунды или ЧЧ:ММ:СС)")
+    parser.add_argument('--end', metavar='TIME', help="конец фрагмента для всех файлов")
+    parser.add_argument('--smart-cut', dest='smart_cut', action='store_true', default=None,
+                        help="фрагменты H.264: копировать между ключевыми кадрами, "
+                             "перекодировать только края")
+    parser.add_argument('--mp4-layout', choices=['faststart', 'fragmented'],
+                        help="fragmented - индекс пишется по ходу кодирования, без второго "
+                             "прохода faststart по всему файлу")
+    parser.add_argument('--listen', metavar='HOST:PORT',
+                        help="распределенный режим: файлы кодируют исполнители "
+                             "(python -m distributed --connect), подключенные к этому адресу")
+    parser.add_argument('--token', metavar='KEY',
+                        help="ключ доступа исполнителей (--listen); без него - только 127.0.0.1")
+    parser.add_argument('--predict', action='store_true',
+                        help="сначала прогноз по коротким отрывкам (размер, место, время); "
+                             "если места на диске не хватит - не запускать")
+    parser.add_argument('--predict-only', action='store_true', help="только прогноз")
+    parser.add_argument('--report', metavar='FILE',
+                        help="сохранить метрики задач пакета в CSV или JSON (по расширению)")
+    parser.add_argument('--prometheus', metavar='FILE',
+                        help="снимок метрик для textfile-коллектора node_exporter")
+    parser.add_argument('--ffmpeg', metavar='PATH', help="путь к ffmpeg")
+    parser.add_argument('--resume', action='store_true',
+                        help="продолжить незавершенный пакет из журнала")
+    parser.add_argument('--watch', action='store_true',
+                        help="следить за папками и конвертировать новые файлы (до Ctrl+C)")
+    parser.add_argument('--settle', type=float, default=5.0, metavar='SEC',
+                        help="файл готов, если не менялся столько секунд (--watch)")
+    parser.add_argument('--poll', action='store_true',
+                        help="просматривать папки по таймеру вместо inotify (--watch)")
+    parser.add_argument('--skip-existing', action='store_true',
+                        help="не трогать файлы, которые уже лежат в папках (--watch)")
+    return parser
+
+
+def load_options(args):
+    """Настройки: значения по умолчанию < файл настроек < ключи командной строки"""
+    settings = dict(DEFAULT_SETTINGS)
+    settings_file = args.settings
+    # Служба по умолчанию работает с настройками, сохраненными в окне
+    if not settings_file and args.watch and os.path.exists("converter_settings.json"):
+        settings_file = "converter_settings.json"
+    if settings_file:
+        with open(settings_file, 'r', encoding='utf-8') as f:
+            settings.update(json.load(f))
+
+    overrides = {
+        "video_bitrate": args.video_bitrate,
+        "audio_bitrate": args.audio_bitrate,
+        "profile": args.profile,
+        "output_dir": args.output_dir,
+        "parallel_jobs": args.jobs,
+        "memory_ceiling": args.memory_ceiling,
+        "split_encode": args.split_encode,
+        "smart_copy": args.smart_copy,
+        "output_cache": args.output_cache,
+        "cache_dir": args.cache_dir,
+        "cache_max_gb": args.cache_max_gb,
+        "priority": args.priority,
+        "prefetch": args.prefetch,
+        "prefetch_count": args.prefetch_count,
+        "prefetch_budget_mb": args.prefetch_budget_mb,
+        "scratch_dir": args.scratch_dir,
+        "ladder": args.ladder,
+        "prometheus_file": args.prometheus,
+        "queue_order": args.queue_order,
+        "encoder_target": args.encoder_target,
+        "min_realtime": args.min_realtime,
+        "mp4_layout": args.mp4_layout,
+        "smart_cut": args.smart_cut,
+        "distributed_listen": args.listen,
+        "distributed_token": args.token,
+    }
+    settings.update({k: v for k, v in overrides.items() if v is not None})
+    return ConversionOptions.from_settings(settings)
+
+
+def print_event(data):
+    print(json.dumps(data, ensure_ascii=False), flush=True)
+
+
+print_lock = threading.Lock()
+
+
+def print_event_safe(data):
+    with print_lock:
+        print_event(data)
+
+
+def watch(args, options, ffmpeg_path):
+    """Режим службы: новые файлы в папках сразу уходят в работу"""
+    folders = [path for path in args.inputs if os.path.isdir(path)]
+    if not folders:
+        print_event({'event': 'error', 'message': "Укажите папки для наблюдения"})
+        return 2
+
+    # Файлы, не доделанные прошлым запуском (serve() начнет журнал заново)
+    remaining = []
+    if args.resume:
+        batch = BatchJournal("conversion_journal.jsonl").unfinished_batch()
+        if batch is not None:
+            remaining = [path for path in batch[0] if os.path.exists(split_clip(path)[0])]
+
+    engine = ConversionEngine(options, ffmpeg_path,
+                              on_event=lambda event: print_event_safe(event.to_dict()))
+    server = threading.Thread(target=engine.serve, daemon=True)
+    server.start()
+    if remaining:
+        engine.submit(remaining)
+
+    watcher = FolderWatcher(
+        folders,
+        on_ready=lambda path: engine.submit([path]),
+        extensions=VIDEO_EXTENSIONS,
+        recursive=args.recursive,
+        settle=args.settle,
+        skip_dirs=(options.output_dir, options.cache_dir),
+        include_existing=not args.skip_existing,
+        use_inotify=not args.poll
+    )
+    print_event_safe({'event': 'watch_started', 'folders': watcher.folders, 'mode': watcher.mode})
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        # Запущенные задачи останавливаем; журнал позволит продолжить (--resume)
+        watcher.stop()
+        engine.cancel()
+        server.join()
+        return 130
+    engine.stop()
+    server.join()
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    options = load_options(args)
+
+    if args.watch:
+        ffmpeg_path = args.ffmpeg or find_ffmpeg()
+        if not ffmpeg_path:
+            print_event({'event': 'error', 'message': "FFmpeg не найден"})
+            return 2
+        return watch(args, options, ffmpeg_path)
+
+    inputs = collect_inputs(args.inputs, recursive=args.recursive,
+                            skip_dirs=(options.output_dir, options.cache_dir))
+    if args.start or args.end:
+        try:
+            start, end = parse_time(args.start or ''), parse_time(args.end or '')
+        except ValueError:
+            print_event({'event': 'error', 'message': "Неверное время в --start/--end"})
+            return 2
+        # Фрагмент, указанный у самого файла (#t=), важнее общего
+        inputs = [spec if split_clip(spec)[1:] != (None, None) else with_clip(spec, start, end)
+                  for spec in inputs]
+    if args.resume:
+        batch = BatchJournal("conversion_journal.jsonl").unfinished_batch()
+        if batch is not None:
+            remaining, saved_settings = batch
+            inputs = [path for path in remaining if os.path.exists(split_clip(path)[0])] + inputs
+            options = ConversionOptions.from_settings(saved_settings)
+
+    if not inputs:
+        print_event({'event': 'error', 'message': "Не указаны файлы для конвертации"})
+        return 2
+
+    ffmpeg_path = args.ffmpeg or find_ffmpeg()
+    if not ffmpeg_path:
+        print_event({'event': 'error', 'message': "FFmpeg не найден"})
+        return 2
+
+    if args.predict or args.predict_only:
+        engine = ConversionEngine(options, ffmpeg_path, on_event=lambda event: print_event(event.to_dict()))
+        prediction = engine.predict(inputs)
+        if not prediction.enough_space:
+            print_event({'event': 'error', 'message': "Не хватит места на диске, конвертация не запущена"})
+            return 1
+        if args.predict_only:
+            return 0
+
+    failed = 0
+    records = []
+    events = convert(inputs, options, ffmpeg_path)
+    try:
+        for event in events:
+            print_event(event.to_dict())
+            if event.kind == Event.JOB_METRICS:
+                records.append(event.data['metrics'])
+            elif event.kind == Event.BATCH_FINISHED:
+                failed = event.data['failed']
+    except KeyboardInterrupt:
+        # Закрытие генератора отменяет пакет и останавливает ffmpeg
+        events.close()
+        return 130
+
+    if args.report:
+        export_report(records, args.report)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
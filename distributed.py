@@ -0,0 +1,654 @@
+"""Распределенная конвертация: координатор и исполнители на других ПК.
+
+Координатор работает внутри движка (настройка distributed_listen или
+--listen): задачи пакета готовятся как обычно, но команды ffmpeg
+уходят в его очередь. Исполнители подключаются к нему по TCP и сами
+берут команды, когда у них есть свободное место:
+
+    python -m distributed --connect 192.168.1.10:8765 --slots 2
+
+Протокол - строки JSON, одно сообщение на строку. Исполнитель запускает
+ту же команду ffmpeg (своим ffmpeg) и построчно пересылает ее stdout
+(прогресс) и stderr, поэтому для движка удаленная задача выглядит как
+обычный процесс. Исходники и результаты - на общем хранилище (сетевой
+папке); если у исполнителя она смонтирована по другому пути - --map.
+
+Исполнитель, от которого нет вестей AGENT_TIMEOUT секунд (или оборвалась
+связь), считается потерянным: его задачи возвращаются в очередь.
+
+Обе стороны доказывают знание общего ключа (--token), не передавая его:
+каждая присылает случайную строку, другая отвечает ее HMAC. Без ключа
+координатор слушает только 127.0.0.1, а исполнитель подключается только
+к координатору на этом же ПК.
+"""
+import os
+import sys
+import hmac
+import json
+import queue
+import socket
+import hashlib
+import secrets
+import argparse
+import ipaddress
+import platform
+import threading
+import subprocess
+from collections import deque
+
+import launcher
+from batch import split_threads
+from encoders import get_ffmpeg_encoders
+
+
+PROTOCOL_VERSION = 2
+DEFAULT_PORT = 8765
+
+# Пинг исполнителя и ответ координатора; без вестей дольше таймаута - связь потеряна, с
+HEARTBEAT_INTERVAL = 5
+AGENT_TIMEOUT = 20
+HELLO_TIMEOUT = 10
+
+# Пауза перед повторным подключением исполнителя, с
+RECONNECT_DELAY = 3
+
+# Сколько раз задача может потерять исполнителя, прежде чем считаться неудачной
+MAX_ATTEMPTS = 3
+
+# Самое длинное сообщение (строка stderr ffmpeg или команда с путями)
+MAX_MESSAGE = 1024 * 1024
+
+# Код завершения отмененной удаленной задачи и строка stderr о потере исполнителя
+CANCELLED_CODE = -15
+LOST_MESSAGE = "Связь с исполнителем потеряна"
+
+# Кодировщик исполнителя, если в его ffmpeg нет выбранного координатором
+FALLBACK_ENCODER = 'libx264'
+
+
+def parse_address(text, default_host='127.0.0.1'):
+    """'хост:порт', 'хост' или 'порт' -> (хост, порт)"""
+    text = text.strip()
+    host, sep, port = text.rpartition(':')
+    if not sep:
+        host, port = ('', text) if text.isdigit() else (text, '')
+    return host or default_host, int(port or DEFAULT_PORT)
+
+
+def is_loopback(host):
+    """Адрес доступен только с этого ПК (localhost, 127.x.x.x, ::1)"""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host.strip('[]')).is_loopback
+    except ValueError:
+        return False
+
+
+def check_token(host, token):
+    """Без ключа доступа - только этот ПК; иначе ValueError"""
+    if not token and not is_loopback(host):
+        raise ValueError(f"для адреса {host} нужен ключ доступа (--token)")
+
+
+def sign(token, role, *nonces):
+    """Доказательство знания ключа: HMAC от роли и случайных строк обеих сторон"""
+    text = ':'.join((role,) + nonces)
+    return hmac.new(token.encode('utf-8'), text.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+class Connection:
+    """Сокет со строками JSON: send() - из любого потока, receive() - из одного"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.reader = sock.makefile('rb')
+        self.send_lock = threading.Lock()
+
+    def send(self, message):
+        data = (json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8')
+        with self.send_lock:
+            self.sock.sendall(data)
+
+    def receive(self):
+        """Следующее сообщение или None, если соединение закрыто"""
+        line = self.reader.readline(MAX_MESSAGE)
+        if not line:
+            return None
+        if not line.endswith(b'\n'):
+            raise ValueError("Слишком длинное сообщение")
+        message = json.loads(line)
+        if not isinstance(message, dict):
+            raise ValueError("Ожидался объект JSON")
+        return message
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class _LineStream:
+    """Строки как из stdout процесса: readline() ждет строку, b'' - конец"""
+
+    def __init__(self):
+        self.lines = queue.Queue()
+
+    def put(self, line):
+        self.lines.put(line.encode('utf-8') + b'\n')
+
+    def close(self):
+        self.lines.put(b'')
+
+    def readline(self):
+        line = self.lines.get()
+        if not line:
+            self.lines.put(b'')  # конец потока читается сколько угодно раз
+        return line
+
+
+class RemoteProcess:
+    """ffmpeg на исполнителе; для движка выглядит как subprocess.Popen
+    (stdout, stderr, poll, wait, terminate)"""
+
+    def __init__(self, coordinator, task_id, cmd, priority, tag=None):
+        self.coordinator = coordinator
+        self.task_id = task_id
+        self.cmd = cmd
+        self.priority = priority
+        self.tag = tag  # для событий (номер задачи пакета)
+        self.stdout = _LineStream()
+        self.stderr = _LineStream()
+        self.returncode = None
+        self.agent_name = None
+        self.agent_host = None
+        self.attempts = 0
+        self.cancelled = False
+        self.done = threading.Event()
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        self.done.wait(timeout)
+        return self.returncode
+
+    def terminate(self):
+        self.coordinator.cancel(self)
+
+    kill = terminate
+
+    def finish(self, code):
+        if self.done.is_set():
+            return
+        self.returncode = code
+        self.stdout.close()
+        self.stderr.close()
+        self.done.set()
+
+
+class AgentSession:
+    """Подключенный исполнитель (на стороне координатора)"""
+
+    def __init__(self, connection, name, host, slots):
+        self.connection = connection
+        self.name = name
+        self.host = host
+        self.slots = slots
+        self.free = 0  # сколько команд исполнитель просил и еще не получил
+        self.tasks = {}  # номер -> RemoteProcess
+
+
+class Coordinator:
+    """Очередь команд ffmpeg, которую разбирают исполнители.
+
+    on_agents_changed(имя, подключен, всего мест, возвращено задач) и
+    on_requeued(tag, имя исполнителя, попытка) вызываются из потоков соединений.
+    """
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, token='',
+                 on_agents_changed=None, on_requeued=None):
+        self.host = host
+        self.port = port
+        self.token = token or ''
+        self.on_agents_changed = on_agents_changed
+        self.on_requeued = on_requeued
+
+        self.lock = threading.Lock()
+        self.pending = deque()
+        self.agents = []
+        self.next_task = 1
+        self.server = None
+        self.stopped = threading.Event()
+
+    @property
+    def slots(self):
+        """Сколько команд могут выполнять все исполнители сразу"""
+        with self.lock:
+            return sum(agent.slots for agent in self.agents)
+
+    def start(self):
+        check_token(self.host, self.token)
+        self.server = socket.create_server((self.host, self.port))
+        self.port = self.server.getsockname()[1]  # порт 0 - выбирает система
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def stop(self):
+        """Закрывает сервер и отключает исполнителей"""
+        self.stopped.set()
+        if self.server:
+            self.server.close()
+        with self.lock:
+            agents = list(self.agents)
+            pending = list(self.pending)
+            self.pending.clear()
+        for process in pending:
+            process.stderr.put(LOST_MESSAGE)
+            process.finish(-1)
+        for agent in agents:
+            agent.connection.close()
+
+    def start_process(self, cmd, priority=launcher.PRIORITY_NORMAL, tag=None):
+        """Ставит команду в очередь и сразу возвращает RemoteProcess
+        (ffmpeg запустится, когда у кого-то из исполнителей будет место)"""
+        with self.lock:
+            process = RemoteProcess(self, self.next_task, list(cmd), priority, tag)
+            self.next_task += 1
+            if self.stopped.is_set():
+                process.stderr.put(LOST_MESSAGE)
+                process.finish(-1)
+                return process
+            self.pending.append(process)
+        self._dispatch()
+        return process
+
+    def cancel(self, process):
+        with self.lock:
+            if process.done.is_set():
+                return
+            process.cancelled = True
+            if process in self.pending:
+                self.pending.remove(process)
+                process.finish(CANCELLED_CODE)
+                return
+            agent = next((a for a in self.agents if process.task_id in a.tasks), None)
+        if agent is not None:
+            try:
+                agent.connection.send({'type': 'cancel', 'task': process.task_id})
+            except OSError:
+                agent.connection.close()
+
+    def _dispatch(self):
+        """Раздает ожидающие команды исполнителям со свободным местом (самым незанятым)"""
+        assigned = []
+        with self.lock:
+            while self.pending:
+                free = [agent for agent in self.agents if agent.free > 0]
+                if not free:
+                    break
+                agent = min(free, key=lambda a: len(a.tasks) / a.slots)
+                process = self.pending.popleft()
+                agent.free -= 1
+                agent.tasks[process.task_id] = process
+                process.agent_name, process.agent_host = agent.name, agent.host
+                process.attempts += 1
+                assigned.append((agent, process))
+
+        for agent, process in assigned:
+            try:
+                agent.connection.send({'type': 'run', 'task': process.task_id,
+                                       'cmd': process.cmd, 'priority': process.priority})
+            except OSError:
+                # Поток соединения заметит обрыв и вернет задачу в очередь
+                agent.connection.close()
+
+    def _accept_loop(self):
+        while not self.stopped.is_set():
+            try:
+                sock, address = self.server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve_agent, args=(sock, address), daemon=True).start()
+
+    def _check_hello(self, hello, nonce):
+        """Причина отказа исполнителю или None"""
+        if not hello or hello.get('type') != 'hello':
+            return "Ожидалось приветствие"
+        if hello.get('version') != PROTOCOL_VERSION:
+            return f"Другая версия протокола (нужна {PROTOCOL_VERSION})"
+        agent_nonce = str(hello.get('nonce') or '')
+        if not agent_nonce or not hmac.compare_digest(
+                str(hello.get('proof') or ''), sign(self.token, 'agent', nonce, agent_nonce)):
+            return "Неверный ключ доступа"
+        return None
+
+    def _serve_agent(self, sock, address):
+        connection = Connection(sock)
+        agent = None
+        try:
+            sock.settimeout(HELLO_TIMEOUT)
+            nonce = secrets.token_hex(16)
+            connection.send({'type': 'challenge', 'version': PROTOCOL_VERSION, 'nonce': nonce})
+            hello = connection.receive()
+            refusal = self._check_hello(hello, nonce)
+            if refusal:
+                connection.send({'type': 'refused', 'message': refusal})
+                return
+
+            agent = AgentSession(connection, str(hello.get('name') or address[0]),
+                                 str(hello.get('host') or address[0]),
+                                 max(1, int(hello.get('slots') or 1)))
+            # Исполнитель тоже проверяет, что координатор знает ключ
+            connection.send({'type': 'welcome',
+                             'proof': sign(self.token, 'coordinator', str(hello['nonce']), nonce)})
+            sock.settimeout(AGENT_TIMEOUT)
+            with self.lock:
+                self.agents.append(agent)
+            if self.on_agents_changed:
+                self.on_agents_changed(agent.name, True, self.slots, 0)
+
+            while not self.stopped.is_set():
+                message = connection.receive()
+                if message is None:
+                    break
+                self._handle(agent, message)
+        except (OSError, ValueError, TypeError):
+            pass
+        finally:
+            connection.close()
+            if agent is not None:
+                self._lose(agent)
+
+    def _handle(self, agent, message):
+        kind = message.get('type')
+        if kind == 'want':
+            with self.lock:
+                agent.free += max(0, int(message.get('count') or 1))
+            self._dispatch()
+        elif kind in ('out', 'err'):
+            process = agent.tasks.get(message.get('task'))
+            if process is not None:
+                stream = process.stdout if kind == 'out' else process.stderr
+                stream.put(str(message.get('line', '')))
+        elif kind == 'exit':
+            with self.lock:
+                process = agent.tasks.pop(message.get('task'), None)
+                if process is not None:
+                    process.finish(int(message.get('code', -1)))
+        elif kind == 'ping':
+            agent.connection.send({'type': 'pong'})
+
+    def _lose(self, agent):
+        """Исполнитель отключился: его незаконченные задачи - снова в начало очереди"""
+        requeued = []
+        with self.lock:
+            if agent in self.agents:
+                self.agents.remove(agent)
+            lost = list(agent.tasks.values())
+            agent.tasks.clear()
+            for process in reversed(lost):
+                if process.cancelled:
+                    process.finish(CANCELLED_CODE)
+                elif self.stopped.is_set() or process.attempts >= MAX_ATTEMPTS:
+                    process.stderr.put(f"{LOST_MESSAGE}: {agent.name}")
+                    process.finish(-1)
+                else:
+                    process.agent_name = process.agent_host = None
+                    self.pending.appendleft(process)
+                    requeued.append(process)
+
+        if self.on_agents_changed:
+            self.on_agents_changed(agent.name, False, self.slots, len(requeued))
+        if self.on_requeued:
+            for process in reversed(requeued):
+                self.on_requeued(process.tag, agent.name, process.attempts)
+        self._dispatch()
+
+
+class Agent:
+    """Исполнитель: подключается к координатору и выполняет его команды ffmpeg.
+
+    Запускается только свой ffmpeg (первый элемент команды заменяется),
+    число потоков ffmpeg делится между местами этой машины. Если в своем
+    ffmpeg нет кодировщика из команды, используется FALLBACK_ENCODER.
+    """
+
+    def __init__(self, address, ffmpeg_path, slots=1, token='', name=None,
+                 path_map=(), priority=None, log=None):
+        self.address = address
+        self.ffmpeg_path = ffmpeg_path
+        self.slots = max(1, slots)
+        self.token = token or ''
+        self.host = platform.node()
+        self.name = name or f"{self.host}:{os.getpid()}"
+        self.path_map = list(path_map)  # [(путь у координатора, путь здесь)]
+        self.priority = priority  # None - как у координатора
+        self.log = log or (lambda event, **data: None)
+        self.threads = split_threads(0, self.slots)
+        self.encoders = None  # кодировщики своего ffmpeg (читаются при запуске)
+
+        self.lock = threading.Lock()
+        self.processes = {}  # номер задачи -> Popen
+        self.stopped = threading.Event()
+
+    def run(self):
+        """Работает до stop() или отказа координатора; при обрыве переподключается"""
+        if self.encoders is None:
+            self.encoders = get_ffmpeg_encoders(self.ffmpeg_path)
+        failed = False
+        while not self.stopped.is_set():
+            try:
+                sock = socket.create_connection(self.address, timeout=HELLO_TIMEOUT)
+            except OSError as e:
+                if not failed:  # координатор не запущен - пишем один раз, а не каждые 3 с
+                    self.log('connect_failed', message=str(e))
+                failed = True
+            else:
+                failed = False
+                if self.serve(Connection(sock)) is False:
+                    return False
+            self.stopped.wait(RECONNECT_DELAY)
+        return True
+
+    def stop(self):
+        self.stopped.set()
+
+    def serve(self, connection):
+        """Одно подключение; False - координатор отказал"""
+        closed = threading.Event()
+        try:
+            challenge = connection.receive()
+            if not challenge or challenge.get('type') != 'challenge':
+                self.log('refused', message="Ожидался запрос ключа от координатора")
+                return False
+            if challenge.get('version') != PROTOCOL_VERSION:
+                self.log('refused', message=f"Другая версия протокола (нужна {PROTOCOL_VERSION})")
+                return False
+            coordinator_nonce = str(challenge.get('nonce') or '')
+            nonce = secrets.token_hex(16)
+            connection.send({'type': 'hello', 'version': PROTOCOL_VERSION, 'name': self.name,
+                             'host': self.host, 'slots': self.slots, 'nonce': nonce,
+                             'proof': sign(self.token, 'agent', coordinator_nonce, nonce)})
+            reply = connection.receive()
+            if not reply or reply.get('type') != 'welcome':
+                self.log('refused', message=(reply or {}).get('message'))
+                return False
+            # Команды ffmpeg выполняем только от координатора, знающего ключ
+            if not coordinator_nonce or not hmac.compare_digest(
+                    str(reply.get('proof') or ''), sign(self.token, 'coordinator', nonce, coordinator_nonce)):
+                self.log('refused', message="Координатор не подтвердил ключ доступа")
+                return False
+
+            connection.sock.settimeout(AGENT_TIMEOUT)
+            self.log('connected', coordinator=f"{self.address[0]}:{self.address[1]}",
+                     name=self.name, slots=self.slots)
+            connection.send({'type': 'want', 'count': self.slots})
+            threading.Thread(target=self._heartbeat, args=(connection, closed), daemon=True).start()
+
+            while not self.stopped.is_set():
+                message = connection.receive()
+                if message is None:
+                    break
+                if message.get('type') == 'run':
+                    threading.Thread(target=self.run_task,
+                                     args=(connection, message.get('task'), message.get('cmd') or [],
+                                           message.get('priority')),
+                                     daemon=True).start()
+                elif message.get('type') == 'cancel':
+                    with self.lock:
+                        process = self.processes.get(message.get('task'))
+                    launcher.terminate(process)
+        except (OSError, ValueError):
+            pass
+        finally:
+            closed.set()
+            connection.close()
+            # Координатор уже вернул эти задачи в очередь - дорабатывать их незачем
+            with self.lock:
+                running = list(self.processes.values())
+            for process in running:
+                launcher.terminate(process)
+        self.log('disconnected')
+        return True
+
+    def _heartbeat(self, connection, closed):
+        while not closed.wait(HEARTBEAT_INTERVAL):
+            try:
+                connection.send({'type': 'ping'})
+            except OSError:
+                break
+
+    def map_path(self, arg):
+        """Путь координатора -> путь на этой машине (по --map)"""
+        for source, target in self.path_map:
+            if arg.startswith(source):
+                rest = arg[len(source):].replace('\\', '/')
+                return os.path.normpath(target + rest)
+        return arg
+
+    def prepare(self, cmd):
+        """Команда координатора для этой машины: свой ffmpeg, пути, потоки и кодировщик"""
+        args = [self.map_path(str(arg)) for arg in cmd[1:]]
+        replaced = False
+        for i in range(len(args) - 1):
+            if args[i] == '-threads':
+                args[i + 1] = str(self.threads)
+            elif (args[i].startswith('-c:v') and self.encoders
+                  and args[i + 1] != 'copy' and args[i + 1] not in self.encoders):
+                self.log('encoder_fallback', encoder=args[i + 1], fallback=FALLBACK_ENCODER)
+                args[i + 1] = FALLBACK_ENCODER
+                replaced = True
+            elif replaced and args[i].startswith('-profile:v') and args[i + 1] == 'constrained_baseline':
+                args[i + 1] = 'baseline'  # так этот профиль называет libx264
+        return [self.ffmpeg_path] + args
+
+    def run_task(self, connection, task, cmd, priority):
+        """Выполняет команду и пересылает ее вывод; потом просит следующую"""
+        self.log('task_started', task=task)
+        try:
+            process = launcher.popen(self.prepare(cmd),
+                                     priority=self.priority or priority or launcher.PRIORITY_NORMAL,
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except (OSError, IndexError) as e:
+            process = None
+            code = -1
+            self._send(connection, {'type': 'err', 'task': task, 'line': f"Не удалось запустить ffmpeg: {e}"})
+        else:
+            with self.lock:
+                self.processes[task] = process
+            stderr = threading.Thread(target=self._forward, args=(connection, task, process.stderr, 'err'),
+                                      daemon=True)
+            stderr.start()
+            self._forward(connection, task, process.stdout, 'out')
+            code = process.wait()
+            stderr.join(5)
+            with self.lock:
+                self.processes.pop(task, None)
+
+        self.log('task_finished', task=task, code=code)
+        self._send(connection, {'type': 'exit', 'task': task, 'code': code})
+        self._send(connection, {'type': 'want', 'count': 1})
+
+    def _forward(self, connection, task, stream, kind):
+        for raw in iter(stream.readline, b''):
+            line = raw.decode('utf-8', 'ignore').rstrip()
+            if line and not self._send(connection, {'type': kind, 'task': task, 'line': line}):
+                break
+        # Дочитываем, чтобы ffmpeg не встал на полном канале
+        for _ in iter(stream.readline, b''):
+            pass
+
+    def _send(self, connection, message):
+        try:
+            connection.send(message)
+            return True
+        except OSError:
+            return False
+
+
+def parse_path_map(values):
+    """['X:\\video=/mnt/video', ...] -> [(откуда, куда)]"""
+    result = []
+    for value in values or ():
+        source, sep, target = value.partition('=')
+        if not sep or not source:
+            raise ValueError(value)
+        result.append((source, target))
+    return result
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m distributed",
+        description="Исполнитель распределенной конвертации: берет задачи у координатора"
+    )
+    parser.add_argument('--connect', required=True, metavar='HOST:PORT',
+                        help=f"адрес координатора (порт по умолчанию {DEFAULT_PORT})")
+    parser.add_argument('--slots', type=int, default=1, metavar='N',
+                        help="сколько файлов кодировать одновременно")
+    parser.add_argument('--token', default='',
+                        help="ключ доступа (как у координатора); без него - только координатор на этом ПК")
+    parser.add_argument('--name', help="имя исполнителя в событиях координатора")
+    parser.add_argument('--map', action='append', metavar='FROM=TO',
+                        help="общая папка у координатора и здесь, например "
+                             "'\\\\server\\video=/mnt/video' (можно несколько)")
+    parser.add_argument('--priority', choices=list(launcher.PRIORITIES),
+                        help="приоритет ffmpeg (по умолчанию - как у координатора)")
+    parser.add_argument('--ffmpeg', metavar='PATH', help="путь к ffmpeg")
+    return parser
+
+
+def print_json(data):
+    print(json.dumps(data, ensure_ascii=False), flush=True)
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        address = parse_address(args.connect, default_host='127.0.0.1')
+        path_map = parse_path_map(args.map)
+        check_token(address[0], args.token)
+    except ValueError as e:
+        parser.error(f"неверное значение: {e}")
+
+    from engine import find_ffmpeg
+    ffmpeg_path = args.ffmpeg or find_ffmpeg()
+    if not ffmpeg_path:
+        print_json({'event': 'error', 'message': "FFmpeg не найден"})
+        return 2
+
+    agent = Agent(address, ffmpeg_path, slots=args.slots, token=args.token, name=args.name,
+                  path_map=path_map, priority=args.priority,
+                  log=lambda event, **data: print_json(dict(data, event=event)))
+    try:
+        return 0 if agent.run() else 1
+    except KeyboardInterrupt:
+        agent.stop()
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
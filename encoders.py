@@ -0,0 +1,279 @@
+"""Кодировщики H.264 и замер их скорости: python -m encoders [--calibrate]
+
+ffmpeg бывает собран с разным набором кодировщиков, а скорость пресетов
+зависит от машины. Калибровка один раз кодирует короткое синтетическое
+видео (testsrc2) каждым программным кодировщиком H.264 и несколькими
+пресетами libx264 и сохраняет замеры для этой машины и этого ffmpeg.
+По ним под выбранную цель подбирается кодировщик и пресет.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import threading
+
+import launcher
+
+
+# Цели выбора кодировщика
+TARGET_SPEED = 'speed'        # максимальная скорость
+TARGET_BALANCED = 'balanced'  # лучшее качество, заметно не теряя в скорости
+TARGET_QUALITY = 'quality'    # лучшее качество не медленнее N x реального времени
+ENCODER_TARGETS = (TARGET_SPEED, TARGET_BALANCED, TARGET_QUALITY)
+
+# Пресеты libx264 от быстрых к качественным (slower/veryslow для пакетов слишком медленные)
+X264_PRESETS = ('ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow')
+
+# Прочие программные кодировщики H.264; качество при том же битрейте - ниже ultrafast
+OTHER_SOFTWARE_H264 = ('libopenh264',)
+
+# Сбалансированный выбор: самый качественный вариант не медленнее этой доли от самого быстрого
+BALANCED_SHARE = 1 / 3
+
+# Тестовое видео калибровки
+SAMPLE_SIZE = (1280, 720)
+SAMPLE_DURATION = 3
+SAMPLE_RATE = 25
+SAMPLE_BITRATE = 2500
+
+# Скорость "1x" - реальное время для 1080p 25 кадров/с
+REFERENCE_PIXEL_RATE = 1920 * 1080 * 25
+
+
+def get_ffmpeg_encoders(ffmpeg_path):
+    """Имена кодировщиков из 'ffmpeg -encoders' (пустой список при ошибке)"""
+    try:
+        result = launcher.run(
+            [ffmpeg_path, '-hide_banner', '-encoders'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            encoding='utf-8',
+            errors='ignore',
+            timeout=10
+        )
+    except Exception:
+        return []
+    if result.returncode != 0:
+        return []
+
+    encoders = []
+    listing = False
+    for line in result.stdout.splitlines():
+        # Таблица начинается после строки-разделителя " ------"
+        if line.strip().startswith('---'):
+            listing = True
+            continue
+        parts = line.split()
+        if listing and len(parts) >= 2:
+            encoders.append(parts[1])
+    return encoders
+
+
+class EncoderChoice:
+    """Кодировщик H.264 и его пресет"""
+
+    def __init__(self, encoder='libx264', preset='medium'):
+        self.encoder = encoder
+        self.preset = preset if encoder == 'libx264' else None
+
+    @property
+    def label(self):
+        """Для метрик и прогноза времени: пресет libx264 или имя кодировщика"""
+        return self.preset if self.encoder == 'libx264' else self.encoder
+
+    @property
+    def quality_rank(self):
+        """Больше - лучше качество при том же битрейте"""
+        if self.encoder == 'libx264':
+            return len(OTHER_SOFTWARE_H264) + X264_PRESETS.index(self.preset)
+        return OTHER_SOFTWARE_H264.index(self.encoder) if self.encoder in OTHER_SOFTWARE_H264 else -1
+
+    def video_args(self, profile):
+        """-c:v, пресет и профиль (битрейт добавляет вызывающий)"""
+        args = ['-c:v', self.encoder]
+        if self.preset:
+            args += ['-preset', self.preset]
+        if self.encoder == 'libopenh264' and profile == 'baseline':
+            profile = 'constrained_baseline'
+        return args + ['-profile:v', profile]
+
+    def to_dict(self):
+        return {'encoder': self.encoder, 'preset': self.preset}
+
+    def __eq__(self, other):
+        return isinstance(other, EncoderChoice) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"EncoderChoice({self.encoder}, {self.preset})"
+
+
+def candidate_encoders(available):
+    """Что калибровать: пресеты libx264 и другие программные H.264 из сборки"""
+    candidates = []
+    if 'libx264' in available:
+        candidates += [EncoderChoice('libx264', preset) for preset in X264_PRESETS]
+    candidates += [EncoderChoice(name) for name in OTHER_SOFTWARE_H264 if name in available]
+    return candidates
+
+
+def measure(ffmpeg_path, choice, threads=0):
+    """Кодирует тестовое видео в никуда; скорость в пикселях в секунду или None"""
+    width, height = SAMPLE_SIZE
+    cmd = [
+        ffmpeg_path, '-hide_banner',
+        '-f', 'lavfi', '-i', f"testsrc2=size={width}x{height}:rate={SAMPLE_RATE}:duration={SAMPLE_DURATION}",
+        '-threads', str(threads),
+        *choice.video_args('main'),
+        '-b:v', f"{SAMPLE_BITRATE}k",
+        '-an', '-f', 'null', '-loglevel', 'error', '-'
+    ]
+    start = time.perf_counter()
+    try:
+        result = launcher.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=300)
+    except Exception:
+        return None
+    wall_time = time.perf_counter() - start
+    if result.returncode != 0 or wall_time <= 0:
+        return None
+    return width * height * SAMPLE_RATE * SAMPLE_DURATION / wall_time
+
+
+def calibrate(ffmpeg_path, available, log=None):
+    """Замеры всех кандидатов: список {'encoder', 'preset', 'pixel_rate', 'realtime'}"""
+    results = []
+    for choice in candidate_encoders(available):
+        rate = measure(ffmpeg_path, choice)
+        if rate is None:
+            continue  # кодировщик есть в списке, но не работает (например, без библиотеки)
+        result = dict(choice.to_dict(), pixel_rate=round(rate),
+                      realtime=round(rate / REFERENCE_PIXEL_RATE, 3))
+        results.append(result)
+        if log:
+            log(result)
+    return results
+
+
+def choose_encoder(results, target, min_realtime=1.0):
+    """Лучший вариант из замеров под цель (EncoderChoice) или None без замеров"""
+    measured = [(EncoderChoice(r['encoder'], r['preset']), r['realtime']) for r in results]
+    if not measured:
+        return None
+
+    fastest = max(realtime for _, realtime in measured)
+    if target == TARGET_SPEED:
+        suitable = [item for item in measured if item[1] == fastest]
+    elif target == TARGET_BALANCED:
+        suitable = [item for item in measured if item[1] >= fastest * BALANCED_SHARE]
+    else:
+        suitable = [item for item in measured if item[1] >= min_realtime]
+        if not suitable:
+            # Ни один вариант не успевает - берем самый быстрый
+            suitable = [item for item in measured if item[1] == fastest]
+
+    choice, _ = max(suitable, key=lambda item: (item[0].quality_rank, item[1]))
+    return choice
+
+
+def ffmpeg_key(ffmpeg_path):
+    """Ключ замеров: машина и конкретный файл ffmpeg (путь, размер, время изменения)"""
+    try:
+        stat = os.stat(ffmpeg_path)
+    except OSError:
+        return None
+    return f"{platform.node()}|{os.path.abspath(ffmpeg_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+class EncoderCalibration:
+    """Замеры калибровки по машинам и сборкам ffmpeg (JSON-файл)"""
+
+    def __init__(self, path="encoder_calibration.json"):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, ffmpeg_path):
+        key = ffmpeg_key(ffmpeg_path)
+        entry = self._load().get(key) if key else None
+        return entry['results'] if entry else None
+
+    def measure(self, ffmpeg_path, available=None, log=None):
+        """Калибрует и сохраняет; возвращает замеры"""
+        if available is None:
+            available = get_ffmpeg_encoders(ffmpeg_path)
+        results = calibrate(ffmpeg_path, available, log)
+        key = ffmpeg_key(ffmpeg_path)
+        if key and results:
+            with self.lock:
+                data = self._load()
+                data[key] = {'time': round(time.time(), 3), 'results': results}
+                temp_path = self.path + '.tmp'
+                try:
+                    with open(temp_path, 'w', encoding='utf-8') as f:
+                        json.dump(data, f, ensure_ascii=False, indent=2)
+                    os.replace(temp_path, self.path)
+                except OSError:
+                    pass
+        return results
+
+    def results(self, ffmpeg_path, available=None, log=None):
+        """Сохраненные замеры или новая калибровка, если их нет"""
+        cached = self.get(ffmpeg_path)
+        if cached is not None:
+            return cached
+        return self.measure(ffmpeg_path, available, log)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m encoders",
+        description="Кодировщики H.264 этой машины и выбор самого подходящего"
+    )
+    parser.add_argument('--calibrate', action='store_true', help="замерить заново")
+    parser.add_argument('--target', choices=ENCODER_TARGETS, default=TARGET_BALANCED)
+    parser.add_argument('--min-speed', type=float, default=1.0, metavar='X',
+                        help="для --target quality: не медленнее X реального времени (1080p)")
+    parser.add_argument('--file', default="encoder_calibration.json", metavar='FILE')
+    parser.add_argument('--ffmpeg', metavar='PATH', help="путь к ffmpeg")
+    return parser
+
+
+def print_json(data):
+    print(json.dumps(data, ensure_ascii=False), flush=True)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    from engine import find_ffmpeg
+    ffmpeg_path = args.ffmpeg or find_ffmpeg()
+    if not ffmpeg_path:
+        print_json({'event': 'error', 'message': "FFmpeg не найден"})
+        return 2
+
+    calibration = EncoderCalibration(args.file)
+    log = lambda result: print_json(dict(result, event='measure'))
+    if args.calibrate:
+        results = calibration.measure(ffmpeg_path, log=log)
+    else:
+        results = calibration.results(ffmpeg_path, log=log)
+
+    choice = choose_encoder(results, args.target, args.min_speed)
+    if choice is None:
+        print_json({'event': 'error', 'message': "Нет ни одного работающего кодировщика H.264"})
+        return 1
+    print_json(dict(choice.to_dict(), event='choice', target=args.target))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1107 @@
+import os
+import sys
+import time
+import queue
+import shutil
+import threading
+import subprocess
+
+import launcher
+from probe import ProbeCache, find_ffprobe, probe_media
+from batch import BatchScheduler, ConversionJob, batch_percent
+from split_encode import SplitEncoder, SPLIT_MIN_DURATION
+from passthrough import StreamPlan, choose_stream_plan
+from output_cache import OutputCache, job_fingerprint
+from journal import BatchJournal, finalize_output, discard_partial
+from progress import ProgressParser, StderrBuffer, Throttle
+from ffmpeg_errors import ErrorClassifier, LABELS as ERROR_LABELS
+from concurrency import ConcurrencyController
+from metrics import JobMetrics, MetricsHistory, summarize, write_prometheus
+from eta import SpeedModel, QUEUE_ORDERS, ORDER_INPUT, order_jobs, job_remaining, batch_remaining
+from prefetch import Prefetcher, PREFETCH_MODES, PREFETCH_PROBE
+from renditions import (get_ladder, rendition_outputs, ladder_command,
+                        finalize_outputs, discard_outputs)
+from smart_cut import (SmartCutter, split_clip, with_clip, clip_suffix, seek_args,
+                       read_sps, edge_video_args)
+from distributed import Coordinator, RemoteProcess, parse_address
+from predict import predict_batch
+from encoders import (EncoderChoice, EncoderCalibration, ENCODER_TARGETS,
+                      choose_encoder, get_ffmpeg_encoders)
+
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv',
+                    '.webm', '.mpg', '.mpeg', '.3gp')
+
+# Настройки конвертации по умолчанию (общие для окна и командной строки)
+DEFAULT_SETTINGS = {
+    "video_bitrate": "2500",
+    "audio_bitrate": "128",
+    "profile": "main",
+    "output_dir": "converted",
+    "parallel_jobs": "0",  # 0 - подбирать автоматически по загрузке CPU
+    "memory_ceiling": 85,  # Не запускать новые задачи, если занято больше % памяти
+    "split_encode": False,  # Делить длинные файлы на сегменты
+    "smart_copy": True,  # Не перекодировать уже подходящие H.264/AAC
+    "output_cache": True,  # Брать готовые результаты из кэша
+    "cache_dir": "output_cache",
+    "cache_max_gb": 20,
+    "priority": "normal",  # Приоритет ffmpeg: normal / low / idle
+    "prefetch": "probe",  # Подготовка следующих файлов: probe / readahead / stage
+    "prefetch_count": 3,  # На сколько файлов вперед
+    "prefetch_budget_mb": 4096,  # Сколько данных можно прочитать/скопировать заранее
+    "scratch_dir": "",  # Локальная папка для копий (stage); пусто - временная папка
+    "ladder": "",  # Набор качеств (web, mobile, ...); пусто - один файл
+    "ladders": {},  # Свои наборы качеств: {"имя": [{"name", "height", "video_bitrate", ...}]}
+    "prometheus_file": "",  # Снимок метрик для node_exporter (*.prom); пусто - не писать
+    "queue_order": "input",  # Порядок очереди: input / shortest / longest
+    "encoder_target": "",  # Подбор кодировщика: speed / balanced / quality; пусто - libx264 medium
+    "min_realtime": 1.0,  # Для quality: не медленнее стольких x реального времени (1080p)
+    "mp4_layout": "faststart",  # Устройство MP4: faststart / fragmented
+    "smart_cut": False,  # Фрагменты: копировать между ключевыми кадрами, кодировать только края
+    "distributed_listen": "",  # Адрес координатора для исполнителей (хост:порт); пусто - кодирует этот ПК
+    "distributed_token": ""  # Ключ доступа исполнителей
+}
+
+# Пресет libx264
+ENCODER_PRESET = 'medium'
+
+# Устройство MP4. faststart: индекс (moov) в начале, но после кодирования
+# ffmpeg переписывает весь файл вторым проходом. fragmented: индекс пишется
+# фрагментами по ходу кодирования, второго прохода нет
+MP4_FASTSTART = 'faststart'
+MP4_FRAGMENTED = 'fragmented'
+MP4_MOVFLAGS = {
+    MP4_FASTSTART: '+faststart',
+    MP4_FRAGMENTED: '+frag_keyframe+empty_moov+default_base_moof',
+}
+
+# Этап задачи после кодирования и строка ffmpeg (уровень info), с которой он начинается
+STAGE_FASTSTART = 'faststart'
+FASTSTART_MARKER = 'moving the moov atom'
+
+# Сколько последних строк stderr ffmpeg прикладывать к неудачной задаче
+LOG_TAIL_LINES = 20
+
+
+def ffmpeg_candidates():
+    """Места, где может лежать ffmpeg"""
+    possible_locations = []
+
+    # 1. Проверяем в папке с программой (для EXE)
+    if getattr(sys, 'frozen', False):
+        exe_dir = os.path.dirname(sys.executable)
+        possible_locations.append(os.path.join(exe_dir, launcher.FFMPEG_NAME))
+
+        # 2. Проверяем во временной папке PyInstaller
+        base_path = getattr(sys, '_MEIPASS', None)
+        if base_path:
+            possible_locations.append(os.path.join(base_path, launcher.FFMPEG_NAME))
+    else:
+        # Режим разработки - ищем рядом со скриптом
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        possible_locations.append(os.path.join(script_dir, launcher.FFMPEG_NAME))
+
+    # 3. Проверяем в PATH
+    possible_locations.append('ffmpeg')
+    return possible_locations
+
+
+def try_ffmpeg(path):
+    """Пробуем запустить ffmpeg"""
+    try:
+        result = launcher.run(
+            [path, '-version'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=2
+        )
+        return result.returncode == 0
+    except Exception:
+        return False
+
+
+def find_ffmpeg():
+    """Путь к работающему ffmpeg или None"""
+    for location in ffmpeg_candidates():
+        if try_ffmpeg(location):
+            return location
+    return None
+
+
+def get_ffmpeg_version(ffmpeg_path):
+    """Первая строка 'ffmpeg -version' или пустая строка"""
+    try:
+        result = launcher.run(
+            [ffmpeg_path, '-version'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            encoding='utf-8',
+            errors='ignore',
+            timeout=10
+        )
+        if result.returncode == 0:
+            return result.stdout.split('\n')[0]
+    except Exception:
+        pass
+    return ""
+
+
+def _resolve_candidate(location):
+    """Полный путь к существующему файлу кандидата (ffmpeg из PATH - через which)"""
+    if os.path.isfile(location):
+        return os.path.abspath(location)
+    found = shutil.which(location) if os.path.basename(location) == location else None
+    return os.path.abspath(found) if found else None
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+
+def detect_ffmpeg(cache=None):
+    """Путь, версия и кодировщики ffmpeg: {'path', 'size', 'mtime', 'version', 'encoders'}.
+
+    cache - результат прошлого вызова (хранится в настройках). Если первым
+    найденным кандидатом остался тот же файл того же размера и времени
+    изменения, ffmpeg не запускается вовсе. None - ffmpeg не найден.
+    """
+    for location in ffmpeg_candidates():
+        path = _resolve_candidate(location)
+        if path is None:
+            continue
+        try:
+            signature = _file_signature(path)
+        except OSError:
+            continue
+
+        if cache and all(cache.get(key) == value for key, value in signature.items()):
+            return dict(cache)
+
+        if not try_ffmpeg(path):
+            continue
+        signature['version'] = get_ffmpeg_version(path)
+        signature['encoders'] = get_ffmpeg_encoders(path)
+        return signature
+    return None
+
+
+def iter_video_files(folder, recursive=False, skip_dirs=()):
+    """Видеофайлы папки по одному (os.scandir, без списка всего дерева в памяти).
+
+    В каждой папке сначала ее файлы по имени, потом вложенные папки.
+    Скрытые папки и папки из skip_dirs (например, с результатами) пропускаются.
+    """
+    stack = [folder]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError:
+            continue
+
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and not entry.name.startswith('.') and entry.name not in skip_dirs:
+                        subdirs.append(entry.path)
+                elif entry.name.lower().endswith(VIDEO_EXTENSIONS) and not entry.name.startswith('.'):
+                    yield entry.path
+            except OSError:
+                continue
+        stack.extend(reversed(subdirs))
+
+
+def collect_inputs(paths, recursive=False, skip_dirs=()):
+    """Разворачиваем папки в список видеофайлов"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(iter_video_files(path, recursive, skip_dirs))
+        else:
+            files.append(path)
+    return files
+
+
+def _to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+class ConversionOptions:
+    """Параметры конвертации без привязки к интерфейсу"""
+
+    def __init__(self, video_bitrate=2500, audio_bitrate=128, profile='main',
+                 output_dir='converted', parallel_jobs=0, memory_ceiling=85, split_encode=False,
+                 smart_copy=True, output_cache=True, cache_dir='output_cache',
+                 cache_max_gb=20, priority='normal', prefetch='probe',
+                 prefetch_count=3, prefetch_budget_mb=4096, scratch_dir='',
+                 ladder='', ladders=None, prometheus_file='', queue_order='input',
+                 encoder_target='', min_realtime=1.0, mp4_layout='faststart',
+                 smart_cut=False, distributed_listen='', distributed_token=''):
+        self.video_bitrate = int(video_bitrate)
+        self.audio_bitrate = int(audio_bitrate)
+        self.profile = profile
+        self.output_dir = output_dir
+        self.parallel_jobs = int(parallel_jobs)
+        self.memory_ceiling = float(memory_ceiling)
+        self.split_encode = _to_bool(split_encode)
+        self.smart_copy = _to_bool(smart_copy)
+        self.output_cache = _to_bool(output_cache)
+        self.cache_dir = cache_dir
+        self.cache_max_gb = float(cache_max_gb)
+        self.priority = priority if priority in launcher.PRIORITIES else launcher.PRIORITY_NORMAL
+        self.prefetch = prefetch if prefetch in PREFETCH_MODES else PREFETCH_PROBE
+        self.prefetch_count = int(prefetch_count)
+        self.prefetch_budget_mb = int(prefetch_budget_mb)
+        self.scratch_dir = scratch_dir or ''
+        self.ladders = dict(ladders or {})
+        self.ladder = ladder if ladder and get_ladder(ladder, self.ladders) else ''
+        self.prometheus_file = prometheus_file or ''
+        self.queue_order = queue_order if queue_order in QUEUE_ORDERS else ORDER_INPUT
+        self.encoder_target = encoder_target if encoder_target in ENCODER_TARGETS else ''
+        self.min_realtime = float(min_realtime)
+        self.mp4_layout = mp4_layout if mp4_layout in MP4_MOVFLAGS else MP4_FASTSTART
+        self.smart_cut = _to_bool(smart_cut)
+        self.distributed_listen = (distributed_listen or '').strip()
+        self.distributed_token = distributed_token or ''
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Из словаря настроек (converter_settings.json)"""
+        merged = dict(DEFAULT_SETTINGS)
+        merged.update({k: v for k, v in settings.items() if k in DEFAULT_SETTINGS})
+        for key, default in (("video_bitrate", "2500"), ("audio_bitrate", "128"),
+                             ("parallel_jobs", "0")):
+            if str(merged[key]).strip() == "":
+                merged[key] = default
+        return cls(**merged)
+
+    def to_settings(self):
+        """Обратно в словарь настроек (строки - как в полях ввода)"""
+        return {
+            "video_bitrate": str(self.video_bitrate),
+            "audio_bitrate": str(self.audio_bitrate),
+            "profile": self.profile,
+            "output_dir": self.output_dir,
+            "parallel_jobs": str(self.parallel_jobs),
+            "memory_ceiling": self.memory_ceiling,
+            "split_encode": self.split_encode,
+            "smart_copy": self.smart_copy,
+            "output_cache": self.output_cache,
+            "cache_dir": self.cache_dir,
+            "cache_max_gb": self.cache_max_gb,
+            "priority": self.priority,
+            "prefetch": self.prefetch,
+            "prefetch_count": self.prefetch_count,
+            "prefetch_budget_mb": self.prefetch_budget_mb,
+            "scratch_dir": self.scratch_dir,
+            "ladder": self.ladder,
+            "ladders": self.ladders,
+            "prometheus_file": self.prometheus_file,
+            "queue_order": self.queue_order,
+            "encoder_target": self.encoder_target,
+            "min_realtime": self.min_realtime,
+            "mp4_layout": self.mp4_layout,
+            "smart_cut": self.smart_cut,
+            "distributed_listen": self.distributed_listen,
+            "distributed_token": self.distributed_token
+        }
+
+
+class Event:
+    """Событие движка: начало/прогресс/завершение задач и пакета"""
+
+    BATCH_STARTED = 'batch_started'
+    BATCH_PLANNED = 'batch_planned'
+    JOB_QUEUED = 'job_queued'
+    JOB_STARTED = 'job_started'
+    JOB_PROGRESS = 'job_progress'
+    JOB_STAGE = 'job_stage'
+    JOB_FINISHED = 'job_finished'
+    JOB_FAILED = 'job_failed'
+    JOB_ABORTING = 'job_aborting'
+    JOB_CANCELLED = 'job_cancelled'
+    JOB_METRICS = 'job_metrics'
+    JOBS_LIMIT_CHANGED = 'jobs_limit_changed'
+    ENCODER_SELECTED = 'encoder_selected'
+    AGENT_CONNECTED = 'agent_connected'
+    AGENT_DISCONNECTED = 'agent_disconnected'
+    JOB_REQUEUED = 'job_requeued'
+    BATCH_PREDICTED = 'batch_predicted'
+    BATCH_FINISHED = 'batch_finished'
+
+    def __init__(self, kind, **data):
+        self.kind = kind
+        self.time = time.time()
+        self.data = data
+
+    def to_dict(self):
+        result = {'event': self.kind, 'time': round(self.time, 3)}
+        result.update(self.data)
+        return result
+
+    def __repr__(self):
+        return f"Event({self.kind}, {self.data})"
+
+
+class ConversionEngine:
+    """Конвертация пакета файлов без интерфейса.
+
+    Все, что происходит, сообщается событиями Event через on_event
+    (вызывается из рабочих потоков).
+    """
+
+    def __init__(self, options, ffmpeg_path=None, on_event=None,
+                 probe_cache_file="probe_cache.json",
+                 journal_file="conversion_journal.jsonl",
+                 metrics_file="metrics_history.jsonl",
+                 calibration_file="encoder_calibration.json", ffmpeg_encoders=None,
+                 probe_cache_entries=5000):
+        self.options = options
+        self.ffmpeg_path = ffmpeg_path or find_ffmpeg()
+        self.ffprobe_path = find_ffprobe(self.ffmpeg_path)
+        self.on_event = on_event
+
+        # Кэш метаданных видео (чтобы не читать один файл дважды)
+        self.probe_cache = ProbeCache(probe_cache_file, probe_cache_entries)
+
+        # Кэш готовых файлов (чтобы не кодировать одно и то же повторно)
+        self.output_cache = OutputCache(
+            options.cache_dir,
+            int(options.cache_max_gb * 1024 ** 3)
+        )
+
+        # Журнал пакета для продолжения после закрытия или сбоя
+        self.journal = BatchJournal(journal_file)
+
+        # История замеров по задачам (для отчетов и мониторинга)
+        self.metrics_history = MetricsHistory(metrics_file)
+        self.metrics_records = []
+        self.metrics_lock = threading.Lock()
+        self.ffmpeg_version = None
+
+        # Прогноз времени по скорости прошлых задач на этой машине
+        self.speed_model = SpeedModel.from_history(self.metrics_history.load())
+
+        # Кодировщик H.264: по умолчанию libx264 medium, с целью - по замерам этой машины
+        self.encoder = EncoderChoice('libx264', ENCODER_PRESET)
+        self.calibration = EncoderCalibration(calibration_file)
+        self.ffmpeg_encoders = ffmpeg_encoders
+
+        self.scheduler = None
+        self.controller = None
+        self.prefetcher = None
+        self.coordinator = None  # распределенный режим: команды ffmpeg выполняют исполнители
+        self.ready = threading.Event()  # планировщик создан, можно submit()
+        self.submit_lock = threading.Lock()
+        self.jobs = []
+        self.start_time = None
+
+    def emit(self, kind, **data):
+        if self.on_event:
+            try:
+                self.on_event(Event(kind, **data))
+            except Exception:
+                pass
+
+    def probe_file(self, input_file):
+        """Получаем метаданные видео (только заголовок контейнера, с кэшем)"""
+        return probe_media(self.ffmpeg_path, input_file,
+                           cache=self.probe_cache,
+                           ffprobe_path=self.ffprobe_path)
+
+    def probe_job(self, job):
+        """Метаданные файла задачи; время настоящего чтения (не из кэша) - в задачу"""
+        info = self.probe_file(job.input_file)
+        if info is not None and info.probe_time:
+            job.probe_time = info.probe_time
+        return info
+
+    def rate_args(self):
+        """Битрейт видео"""
+        video_bitrate = f"{self.options.video_bitrate}k"
+        return ['-b:v', video_bitrate, '-maxrate', video_bitrate, '-bufsize', '5000k']
+
+    def get_encode_args(self, plan=None):
+        """Параметры кодирования: (видео, аудио)"""
+        audio_bitrate = f"{self.options.audio_bitrate}k"
+
+        video_args = self.encoder.video_args(self.options.profile) + self.rate_args()
+        audio_args = [
+            '-c:a', 'aac',
+            '-b:a', audio_bitrate
+        ]
+
+        # Подходящие потоки просто копируем
+        if plan is not None and plan.video_copy:
+            video_args = ['-c:v', 'copy']
+        if plan is not None and plan.audio_copy:
+            audio_args = ['-c:a', 'copy']
+
+        return video_args, audio_args
+
+    def build_command(self, job, plan=None):
+        """Команда ffmpeg для задачи"""
+        video_args, audio_args = self.get_encode_args(plan)
+
+        # Команда ffmpeg с прогрессом; для фрагмента -ss/-to стоят перед -i,
+        # чтобы ffmpeg начинал читать файл сразу у начала фрагмента
+        return [
+            self.ffmpeg_path,
+            *seek_args(job.clip_start, job.clip_end),
+            '-i', job.source_file
+        ] + video_args + audio_args + [
+            '-threads', str(job.threads or 0),  # 0 - ffmpeg решает сам
+            '-movflags', MP4_MOVFLAGS[self.options.mp4_layout],
+            '-nostats',              # Строки "frame=... time=..." не нужны
+            '-progress', 'pipe:1',   # Прогресс блоками key=value в stdout
+            '-loglevel', self.loglevel(),
+            '-y',
+            job.partial_file  # Пишем во временный файл, на место ставим после успеха
+        ]
+
+    def loglevel(self):
+        """В stderr только предупреждения и ошибки; для faststart - еще info
+        с меткой уровня, чтобы заметить начало второго прохода"""
+        return 'level+info' if self.options.mp4_layout == MP4_FASTSTART else 'level+warning'
+
+    def on_ffmpeg_info(self, job, line):
+        """Строка уровня info из stderr ffmpeg (поток чтения stderr)"""
+        if FASTSTART_MARKER in line and job.stage is None and job.error_category is None:
+            job.stage = STAGE_FASTSTART
+            job.stage_start = time.perf_counter()
+            self.emit(Event.JOB_STAGE, index=job.index, stage=job.stage)
+
+    def abort_job(self, job, category):
+        """Безнадежная ошибка в stderr: останавливаем ffmpeg, не дожидаясь конца файла"""
+        job.error_category = category
+        self.emit(Event.JOB_ABORTING, index=job.index, category=category)
+        launcher.terminate(job.process)
+
+    def convert_video_with_progress(self, job, progress_callback, plan=None):
+        """Конвертирует видео с отслеживанием прогресса"""
+        return self.run_ffmpeg(job, self.build_command(job, plan), progress_callback)
+
+    def run_ffmpeg(self, job, cmd, progress_callback):
+        """Запускает ffmpeg задачи и разбирает прогресс; (успех, сообщение)"""
+        try:
+            # stdout - только прогресс, stderr читается отдельно
+            # и хранит ограниченное число последних строк
+            if self.coordinator is not None:
+                job.process = self.coordinator.start_process(cmd, self.options.priority, tag=job.index)
+            else:
+                job.process = launcher.popen(
+                    cmd,
+                    priority=self.options.priority,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE
+                )
+            job.stage = None
+            job.error_category = None
+            classifier = ErrorClassifier()
+            stderr = StderrBuffer(job.process.stderr,
+                                  on_info=lambda line: self.on_ffmpeg_info(job, line),
+                                  classifier=classifier,
+                                  on_fatal=lambda category: self.abort_job(job, category))
+
+            # Отмену могли нажать пока процесс запускался
+            if job.cancel_requested:
+                job.terminate()
+
+            parser = ProgressParser()
+            for line in iter(job.process.stdout.readline, b''):
+                snapshot = parser.feed(line)
+                if snapshot is not None and progress_callback:
+                    current_time = snapshot.out_time
+                    if current_time is None:
+                        current_time = job.current_time
+                    progress_callback(current_time, snapshot)
+
+            # Ждем завершения процесса
+            job.process.wait()
+            stderr.join()
+            if job.metrics:
+                job.metrics.exit_code = job.process.returncode
+                if isinstance(job.process, RemoteProcess) and job.process.agent_host:
+                    job.metrics.host = job.process.agent_host  # скорость - того, кто кодировал
+                if job.stage == STAGE_FASTSTART:
+                    job.metrics.faststart_time = time.perf_counter() - job.stage_start
+
+            if job.process.returncode == 0 and not classifier.fatal:
+                return True, job.output_file
+
+            job.error_category = classifier.result_category()
+            job.log_tail = stderr.tail(LOG_TAIL_LINES)
+            if classifier.fatal:
+                message = f"Остановлено: {ERROR_LABELS[job.error_category]}"
+            else:
+                message = f"FFmpeg завершился с ошибкой ({ERROR_LABELS[job.error_category]})"
+            if classifier.corrupt_count:
+                message += f", ошибок декодирования: {classifier.corrupt_count}"
+            detail = classifier.line or stderr.last_line()
+            if detail:
+                message += f": {detail}"
+            return False, message
+
+        except Exception as e:
+            return False, f"Исключение: {str(e)}"
+        finally:
+            job.process = None
+
+    def convert_video_split(self, job, info, progress_callback):
+        """Кодирует длинный файл параллельными сегментами"""
+        video_args, audio_args = self.get_encode_args()
+
+        # Бюджет потоков задачи делим между сегментами (~4 потока на сегмент)
+        threads = job.threads or os.cpu_count() or 1
+        workers = max(1, threads // 4)
+
+        classifier = ErrorClassifier()
+        encoder = SplitEncoder(
+            self.ffmpeg_path, video_args, audio_args,
+            workers=workers,
+            threads_per_worker=max(1, threads // workers),
+            movflags=MP4_MOVFLAGS[self.options.mp4_layout],
+            priority=self.options.priority,
+            classifier=classifier,
+            on_fatal=lambda category: self.abort_job(job, category)
+        )
+
+        # Для отмены задачи кодировщик ведет себя как процесс
+        job.process = encoder
+        job.error_category = None
+        if job.cancel_requested:
+            encoder.terminate()
+
+        try:
+            result = encoder.encode(job.source_file, job.partial_file, job.duration,
+                                    has_audio=info.audio is not None,
+                                    on_progress=progress_callback)
+        finally:
+            job.process = None
+        return self.parts_result(job, encoder, classifier, result)
+
+    def parts_result(self, job, encoder, classifier, result):
+        """Итог кодирования по частям; при ошибке - категория по stderr всех ffmpeg"""
+        success, message = result
+        if success:
+            return result
+
+        job.error_category = classifier.result_category()
+        job.log_tail = list(encoder.errors)[-LOG_TAIL_LINES:]
+        if classifier.fatal:
+            message = f"Остановлено: {ERROR_LABELS[job.error_category]}"
+            if classifier.line:
+                message += f": {classifier.line}"
+        return False, message
+
+    def convert_smart_cut(self, job, info, progress_callback):
+        """Фрагмент без полного перекодирования; None - нарезка невозможна"""
+        # Края - с параметрами исходника; если их не повторить - кодируем фрагмент целиком
+        edge_args = edge_video_args(read_sps(self.ffmpeg_path, job.source_file), info.video,
+                                    self.encoder.preset, self.ffmpeg_encoders)
+        if edge_args is None:
+            return None
+        _, audio_args = self.get_encode_args()
+        classifier = ErrorClassifier()
+        cutter = SmartCutter(self.ffmpeg_path, edge_args + self.rate_args(), audio_args,
+                             threads_per_worker=job.threads,
+                             movflags=MP4_MOVFLAGS[self.options.mp4_layout],
+                             priority=self.options.priority,
+                             classifier=classifier,
+                             on_fatal=lambda category: self.abort_job(job, category))
+        job.process = cutter
+        job.error_category = None
+        if job.cancel_requested:
+            cutter.terminate()
+        start = job.clip_start or 0.0
+        try:
+            result = cutter.cut(job.source_file, job.partial_file, start, start + job.duration,
+                                has_audio=info.audio is not None, on_progress=progress_callback)
+        finally:
+            job.process = None
+        if result is None:
+            return None
+        return self.parts_result(job, cutter, classifier, result)
+
+    def convert_ladder(self, job, info, progress_callback):
+        """Все качества набора одним процессом ffmpeg (исходник декодируется один раз)"""
+        if info is not None and info.video is None:
+            return False, "В файле нет видеопотока"
+
+        discard_outputs(job.renditions)
+        success, result = self.run_ffmpeg(job, self.job_command(job), progress_callback)
+        if success:
+            success, result = finalize_outputs(job.renditions)
+        if not success:
+            discard_outputs(job.renditions)
+        return success, result
+
+    def job_command(self, job, plan=None):
+        """Команда ffmpeg задачи: все качества набора одним процессом или один файл"""
+        if job.renditions:
+            return ladder_command(self.ffmpeg_path, job.source_file, job.renditions, job.threads,
+                                  self.encoder, MP4_MOVFLAGS[self.options.mp4_layout], self.loglevel(),
+                                  seek_args(job.clip_start, job.clip_end))
+        return self.build_command(job, plan)
+
+    def stream_plan(self, job, info):
+        """Что можно скопировать без перекодирования; None - кодируем все.
+        Фрагмент копированием режется только по ключевым кадрам, поэтому кодируем"""
+        clip = job.clip_start is not None or job.clip_end is not None
+        if not self.options.smart_copy or clip or job.renditions:
+            return None
+        return choose_stream_plan(info, self.options.video_bitrate,
+                                  self.options.audio_bitrate, self.options.profile)
+
+    def expected_mode(self, info):
+        """Как, скорее всего, будет обработан файл: copy / audio / transcode"""
+        if self.options.smart_copy and not self.options.ladder:
+            return choose_stream_plan(info, self.options.video_bitrate,
+                                      self.options.audio_bitrate, self.options.profile).mode
+        return StreamPlan.TRANSCODE
+
+    def estimate_job(self, job, info):
+        """Прогноз времени задачи по истории"""
+        job.estimate = self.speed_model.predict(info, self.expected_mode(info), self.encoder.label)
+        if info is not None and info.duration > 0 and self.clip_length(job, info) < info.duration:
+            job.estimate *= self.clip_length(job, info) / info.duration
+        if job.renditions:
+            # Декодирование одно, но кодирование - на каждое качество
+            job.estimate *= len(job.renditions)
+
+    def clip_length(self, job, info):
+        """Длительность того, что будет закодировано: весь файл или фрагмент"""
+        duration = info.duration if info else 0
+        if job.clip_start is None and job.clip_end is None:
+            return duration
+        end = min(job.clip_end, duration) if job.clip_end is not None and duration else job.clip_end
+        if end is None:
+            end = duration
+        return max(0.0, end - (job.clip_start or 0.0))
+
+    def plan_jobs(self, jobs):
+        """Анализирует все файлы пакета и оценивает время каждого"""
+        for job in jobs:
+            if self.scheduler and self.scheduler.cancelled:
+                return
+            if job.estimate or job.status != ConversionJob.PENDING:
+                continue
+            info = self.probe_job(job)
+            if info is not None and job.status == ConversionJob.PENDING:
+                job.duration = self.clip_length(job, info)
+                self.estimate_job(job, info)
+
+        self.emit(Event.BATCH_PLANNED, order=self.options.queue_order,
+                  estimates={job.index: round(job.estimate, 1) for job in jobs},
+                  batch_eta=round(self.batch_eta(), 1))
+
+    def batch_eta(self):
+        """Сколько еще займет пакет, с"""
+        parallel = self.scheduler.limit if self.scheduler else 1
+        return batch_remaining(self.jobs, parallel)
+
+    def run_job(self, job):
+        """Выполняет одну задачу (вызывается в потоке воркера)"""
+        # Ожидание - с момента постановки в очередь (калибровка и анализ пакета не в счет)
+        if job.metrics and job.queued_at:
+            job.metrics.queue_wait = time.time() - job.queued_at
+
+        # Если файл уже скопирован на локальный диск - читаем копию
+        staged = self.prefetcher.claim(job) if self.prefetcher else None
+        job.source_file = staged or job.input_file
+        try:
+            return self._run_job(job)
+        finally:
+            job.source_file = job.input_file
+            if self.prefetcher:
+                self.prefetcher.release(job)
+
+    def _run_job(self, job):
+        # Метаданные (обычно уже в кэше - их заранее прочитал prefetcher);
+        # в метрики - время того чтения, которое действительно шло в ffmpeg
+        info = self.probe_job(job)
+        job.duration = self.clip_length(job, info)
+        if job.metrics:
+            job.metrics.probe_time = job.probe_time
+            job.metrics.set_media(info)
+            job.metrics.duration = job.duration  # для фрагмента - его длина
+        if not job.estimate:
+            self.estimate_job(job, info)
+
+        # Прогресс приходит на каждый блок ffmpeg, наружу - не чаще 10 раз в секунду
+        throttle = Throttle()
+
+        def progress_callback(current_time, snapshot=None):
+            job.current_time = current_time
+            if snapshot is not None:
+                job.fps = snapshot.fps
+                job.speed = snapshot.speed
+                job.output_size = snapshot.total_size
+                if job.metrics:
+                    job.metrics.record_progress(snapshot)
+            if not throttle.ready():
+                return
+            extra = {}
+            if job.renditions:
+                extra['renditions'] = {r.name: r.current_size() for r in job.renditions}
+            self.emit(Event.JOB_PROGRESS, index=job.index,
+                      time=round(current_time, 2), duration=round(job.duration, 3),
+                      percent=round(job.percent, 1), fps=job.fps, speed=job.speed,
+                      size=job.output_size, eta=round(job_remaining(job), 1),
+                      batch_eta=round(self.batch_eta(), 1),
+                      batch_percent=round(batch_percent(self.jobs), 1), **extra)
+
+        # Набор качеств: всегда кодируем (масштабирование), без кэша и сегментов
+        if job.renditions:
+            job.mode = StreamPlan.TRANSCODE
+            self.emit(Event.JOB_STARTED, index=job.index, file=job.input_file,
+                      output=[r.output_file for r in job.renditions],
+                      duration=round(job.duration, 3), mode=job.mode,
+                      renditions=[r.name for r in job.renditions], threads=job.threads)
+            if job.metrics:
+                job.metrics.start_encode()
+            return self.convert_ladder(job, info, progress_callback)
+
+        clip = job.clip_start is not None or job.clip_end is not None
+
+        # Решаем, что делать с потоками: копировать или кодировать
+        plan = self.stream_plan(job, info)
+        job.mode = plan.mode if plan else StreamPlan.TRANSCODE
+
+        self.emit(Event.JOB_STARTED, index=job.index, file=job.input_file,
+                  output=job.output_file, duration=round(job.duration, 3), mode=job.mode,
+                  reason=plan.reason if plan else None, threads=job.threads)
+
+        use_smart_cut = (clip and self.options.smart_cut and self.coordinator is None and info is not None
+                         and info.video is not None and info.video.codec == 'h264')
+        use_split = (plan is None or not plan.video_copy) and not clip and self.coordinator is None and (
+            self.options.split_encode and info is not None
+            and info.video is not None and job.duration >= SPLIT_MIN_DURATION)
+
+        # Тот же файл с теми же параметрами уже кодировали?
+        fingerprint = None
+        if self.options.output_cache:
+            try:
+                extra = 'split' if use_split else 'smart_cut' if use_smart_cut else None
+                fingerprint = job_fingerprint(job.source_file, self.build_command(job, plan),
+                                              extra=extra)
+            except OSError:
+                fingerprint = None
+
+        if fingerprint:
+            if self.output_cache.is_up_to_date(job.output_file, fingerprint):
+                job.cached = 'skipped'
+                return True, job.output_file
+            if self.output_cache.fetch(fingerprint, job.output_file):
+                job.cached = 'cache'
+                return True, job.output_file
+
+        # Кодируем во временный файл: под итоговым именем никогда
+        # не остается недописанный MP4 (и не портится жесткая ссылка в кэше)
+        discard_partial(job.partial_file)
+        if job.metrics:
+            job.metrics.start_encode()
+        cut = self.convert_smart_cut(job, info, progress_callback) if use_smart_cut else None
+        if cut is not None:
+            success, result = cut
+        elif use_split:
+            success, result = self.convert_video_split(job, info, progress_callback)
+        else:
+            success, result = self.convert_video_with_progress(job, progress_callback, plan)
+
+        if success:
+            try:
+                finalize_output(job.partial_file, job.output_file)
+                result = job.output_file
+            except OSError as e:
+                success, result = False, f"Не удалось сохранить файл: {str(e)}"
+        if not success:
+            discard_partial(job.partial_file)
+
+        if success and fingerprint:
+            self.output_cache.store(fingerprint, job.output_file)
+
+        return success, result
+
+    def on_job_update(self, job):
+        """Задача сменила состояние (вызывается из потока)"""
+        if job.finished and job.metrics:
+            job.metrics.finish(job)
+            if job.start_time:
+                self.record_metrics(job)
+        self.journal.set_state(job.index, job.status, job.result if job.status == ConversionJob.FAILED else None)
+
+        if job.status == ConversionJob.DONE:
+            output, extra = job.output_file, {}
+            if job.renditions:
+                output = [r.output_file for r in job.renditions]
+                extra['renditions'] = [r.to_dict() for r in job.renditions]
+            self.emit(Event.JOB_FINISHED, index=job.index, output=output,
+                      mode=job.mode, cached=job.cached,
+                      elapsed=round(job.end_time - job.start_time, 2),
+                      batch_percent=round(batch_percent(self.jobs), 1), **extra)
+        elif job.status == ConversionJob.FAILED:
+            self.emit(Event.JOB_FAILED, index=job.index, message=job.result,
+                      category=job.error_category, log=job.log_tail,
+                      batch_percent=round(batch_percent(self.jobs), 1))
+        elif job.status == ConversionJob.CANCELLED:
+            self.emit(Event.JOB_CANCELLED, index=job.index)
+
+    def on_jobs_limit_changed(self, limit, cpu, memory):
+        """Контроллер изменил число одновременных задач"""
+        self.emit(Event.JOBS_LIMIT_CHANGED, limit=limit,
+                  cpu=round(cpu, 1) if cpu is not None else None,
+                  memory=round(memory, 1) if memory is not None else None)
+
+    def create_jobs(self, inputs, first_index=0, make_dirs=True):
+        """Задачи для списка файлов; выходные папки создаются рядом с исходниками"""
+        ladder = get_ladder(self.options.ladder, self.options.ladders) if self.options.ladder else None
+        jobs = []
+        for file_idx, input_spec in enumerate(inputs, first_index):
+            # "видео.mp4#t=начало,конец" - только фрагмент файла
+            input_file, clip_start, clip_end = split_clip(input_spec)
+            filename = os.path.basename(input_file)
+
+            output_dir = os.path.join(os.path.dirname(os.path.abspath(input_file)),
+                                      self.options.output_dir)
+            if make_dirs:
+                os.makedirs(output_dir, exist_ok=True)
+
+            base_name = os.path.splitext(filename)[0]
+            if clip_start is not None or clip_end is not None:
+                base_name += clip_suffix(clip_start, clip_end)
+            job = ConversionJob(file_idx, input_file, os.path.join(output_dir, f"{base_name}.mp4"))
+            job.clip_start, job.clip_end = clip_start, clip_end
+            if ladder:
+                job.renditions = rendition_outputs(ladder, output_dir, base_name)
+            job.metrics = JobMetrics(input_file)
+            job.metrics.video_bitrate = self.options.video_bitrate
+            job.metrics.preset = self.encoder.label
+            jobs.append(job)
+        return jobs
+
+    def run(self, inputs):
+        """Конвертирует все файлы (несколько одновременно); блокирует до конца пакета"""
+        return self._run_batch(inputs, keep_open=False)
+
+    def serve(self):
+        """Режим службы: файлы добавляются через submit(), пока не вызван stop()"""
+        return self._run_batch([], keep_open=True)
+
+    def submit(self, inputs):
+        """Добавляет файлы в работающий пакет (после serve())"""
+        self.ready.wait()
+        with self.submit_lock:
+            jobs = self.create_jobs(inputs, len(self.jobs))
+            self.probe_cache.reserve(len(self.jobs) + len(jobs))
+            for job in jobs:
+                self.jobs.append(job)
+                self.journal.add_file(job.index, with_clip(job.input_file, job.clip_start,
+                                                           job.clip_end))
+                self.emit(Event.JOB_QUEUED, index=job.index, file=job.input_file,
+                          output=job.output_file)
+                self.scheduler.submit(job)
+        return jobs
+
+    def stop(self):
+        """Заканчивает режим службы: новые файлы не принимаются, текущие дорабатывают"""
+        if self.scheduler:
+            self.scheduler.close()
+
+    def start_coordinator(self):
+        """Распределенный режим: принимаем исполнителей на distributed_listen"""
+        host, port = parse_address(self.options.distributed_listen)
+        self.coordinator = Coordinator(host, port, self.options.distributed_token,
+                                       on_agents_changed=self.on_agents_changed,
+                                       on_requeued=self.on_job_requeued)
+        self.coordinator.start()
+
+    def on_agents_changed(self, name, connected, slots, requeued):
+        """Исполнитель подключился или пропал (вызывается из потока соединения)"""
+        if self.scheduler:
+            self.scheduler.set_limit(slots)
+        if connected:
+            self.emit(Event.AGENT_CONNECTED, agent=name, slots=slots)
+        else:
+            self.emit(Event.AGENT_DISCONNECTED, agent=name, slots=slots, requeued=requeued)
+
+    def on_job_requeued(self, index, agent, attempt):
+        self.emit(Event.JOB_REQUEUED, index=index, agent=agent, attempt=attempt)
+
+    def predict(self, inputs):
+        """Прогноз пакета до запуска (predict.BatchPrediction): несколько коротких
+        отрывков каждого файла кодируются текущими настройками"""
+        if self.options.encoder_target:
+            self.select_encoder()
+        prediction = predict_batch(self, inputs)
+        self.probe_cache.save()
+        self.emit(Event.BATCH_PREDICTED, **prediction.to_dict())
+        return prediction
+
+    def select_encoder(self):
+        """Кодировщик и пресет под цель по замерам этой машины (первый раз - калибровка)"""
+        needs_calibration = self.calibration.get(self.ffmpeg_path) is None
+        if self.ffmpeg_encoders is None and needs_calibration:
+            self.ffmpeg_encoders = get_ffmpeg_encoders(self.ffmpeg_path)
+        results = self.calibration.results(self.ffmpeg_path, self.ffmpeg_encoders)
+        choice = choose_encoder(results, self.options.encoder_target, self.options.min_realtime)
+        if choice is not None:
+            self.encoder = choice
+        # calibrated - выбор по сохраненным замерам (иначе калибровка прошла только что)
+        self.emit(Event.ENCODER_SELECTED, target=self.options.encoder_target,
+                  calibrated=not needs_calibration, **self.encoder.to_dict())
+
+    def _run_batch(self, inputs, keep_open):
+        self.start_time = time.time()
+        try:
+            # До создания задач: от кодировщика зависят прогнозы и метрики
+            if self.options.encoder_target:
+                self.select_encoder()
+            self.jobs = self.create_jobs(inputs)
+            self.probe_cache.reserve(len(self.jobs))
+            if self.options.distributed_listen:
+                try:
+                    self.start_coordinator()
+                except (OSError, ValueError) as e:
+                    # Без исполнителей пакет не пойдет - сразу сообщаем, почему
+                    message = f"Не удалось ждать исполнителей на {self.options.distributed_listen}: {e}"
+                    for job in self.jobs:
+                        job.status, job.result = ConversionJob.FAILED, message
+                    return self.jobs
+            self.journal.start_batch(inputs, self.options.to_settings())
+            self.emit(Event.BATCH_STARTED, total=len(self.jobs),
+                      files=[job.input_file for job in self.jobs])
+
+            self.scheduler = BatchScheduler(
+                self.run_job,
+                max_jobs=self.options.parallel_jobs,
+                on_update=self.on_job_update
+            )
+            if self.coordinator:
+                # Одновременно - столько задач, сколько мест у исполнителей
+                self.scheduler.set_limit(self.coordinator.slots)
+
+            # Потолок памяти действует всегда, а число задач
+            # подбирается на ходу только в автоматическом режиме
+            self.controller = ConcurrencyController(
+                self.scheduler,
+                memory_ceiling=self.options.memory_ceiling,
+                on_change=self.on_jobs_limit_changed
+            )
+            self.scheduler.admission = self.controller.admit
+            if self.options.parallel_jobs == 0 and self.coordinator is None:
+                self.controller.start()
+            self.ready.set()
+
+            # Для сортировки нужны прогнозы всех файлов сразу; иначе
+            # файлы анализируются в фоне, параллельно с кодированием
+            queue = self.jobs
+            if self.options.queue_order != ORDER_INPUT:
+                self.plan_jobs(self.jobs)
+                queue = order_jobs(self.jobs, self.options.queue_order)
+            else:
+                threading.Thread(target=self.plan_jobs, args=(self.jobs,), daemon=True).start()
+
+            # Пока кодируются текущие файлы, готовим следующие
+            self.prefetcher = Prefetcher(
+                self.probe_job,
+                # Исполнители не видят копий на этом ПК - только метаданные
+                mode=self.options.prefetch if self.coordinator is None else PREFETCH_PROBE,
+                lookahead=self.options.prefetch_count,
+                budget_bytes=self.options.prefetch_budget_mb * 1024 ** 2,
+                scratch_dir=self.options.scratch_dir or None
+            )
+            # В режиме службы очередь заранее неизвестна - без предзагрузки
+            if self.options.prefetch_count > 0 and not keep_open:
+                self.prefetcher.start(queue)
+
+            self.scheduler.run(queue, keep_open=keep_open)
+
+            # Отмененный пакет остается в журнале, чтобы его можно было продолжить
+            if not self.scheduler.cancelled:
+                self.journal.finish_batch()
+        finally:
+            if self.controller:
+                self.controller.stop()
+            if self.prefetcher:
+                self.prefetcher.stop()
+            if self.coordinator:
+                self.coordinator.stop()
+            self.probe_cache.save()
+            self.emit(Event.BATCH_FINISHED, **self.summary())
+        return self.jobs
+
+    def record_metrics(self, job):
+        """Замеры задачи - в историю сразу (не теряются при сбое) и в файл Prometheus"""
+        record = job.metrics.to_dict()
+        with self.metrics_lock:
+            self.metrics_records.append(record)
+            records = list(self.metrics_records)
+        self.metrics_history.append([record])
+        self.emit(Event.JOB_METRICS, index=job.index, metrics=record)
+
+        if self.options.prometheus_file:
+            if self.ffmpeg_version is None:
+                self.ffmpeg_version = get_ffmpeg_version(self.ffmpeg_path)
+            try:
+                write_prometheus(records, self.options.prometheus_file, self.ffmpeg_version)
+            except OSError:
+                pass
+
+    def summary(self):
+        """Итоги пакета"""
+        done = [job for job in self.jobs if job.status == ConversionJob.DONE]
+        return {
+            'total': len(self.jobs),
+            'succeeded': len(done),
+            'failed': sum(1 for job in self.jobs if job.status == ConversionJob.FAILED),
+            'cancelled': bool(self.scheduler and self.scheduler.cancelled),
+            'copied': sum(1 for job in done if job.mode != StreamPlan.TRANSCODE and not job.cached),
+            'cached': sum(1 for job in done if job.cached),
+            'errors': [f"{job.name}: {job.result}" for job in self.jobs
+                       if job.status == ConversionJob.FAILED],
+            'failures': [{'file': job.input_file, 'category': job.error_category,
+                          'message': job.result, 'log': job.log_tail}
+                         for job in self.jobs if job.status == ConversionJob.FAILED],
+            'elapsed': round(time.time() - self.start_time, 2) if self.start_time else 0,
+            'metrics': summarize(list(self.metrics_records))
+        }
+
+    def cancel(self):
+        """Отменяет пакет (останавливает все запущенные задачи)"""
+        if self.scheduler:
+            self.scheduler.cancel()
+
+
+def convert(inputs, options=None, ffmpeg_path=None, **engine_kwargs):
+    """Конвертирует файлы и по мере работы отдает события Event.
+
+    Пример:
+        for event in convert(["a.avi"], ConversionOptions(video_bitrate=3000)):
+            print(event.to_dict())
+
+    Если перестать читать генератор (или закрыть его), пакет отменяется.
+    """
+    events = queue.Queue()
+    engine = ConversionEngine(options or ConversionOptions(), ffmpeg_path,
+                              on_event=events.put, **engine_kwargs)
+    if not engine.ffmpeg_path:
+        raise RuntimeError("FFmpeg не найден")
+
+    thread = threading.Thread(target=engine.run, args=(list(inputs),), daemon=True)
+    thread.start()
+    try:
+        while True:
+            event = events.get()
+            yield event
+            if event.kind == Event.BATCH_FINISHED:
+                break
+    finally:
+        if thread.is_alive():
+            engine.cancel()
+            thread.join()
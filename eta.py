@@ -0,0 +1,144 @@
+import time
+import platform
+import statistics
+
+from batch import ConversionJob
+
+
+# Порядок очереди
+ORDER_INPUT = 'input'        # как выбрали файлы
+ORDER_SHORTEST = 'shortest'  # сначала быстрые: меньше среднее ожидание результата
+ORDER_LONGEST = 'longest'    # сначала долгие: раньше закончится весь пакет
+QUEUE_ORDERS = (ORDER_INPUT, ORDER_SHORTEST, ORDER_LONGEST)
+
+# Сколько последних замеров на ключ помнит модель
+SAMPLES_PER_KEY = 20
+
+# Когда истории нет: 1080p кодируется в реальном времени, копирование - в 50 раз быстрее
+DEFAULT_PIXEL_RATE = {
+    'transcode': 1920 * 1080 * 1.0,
+    'audio': 1920 * 1080 * 20.0,
+    'copy': 1920 * 1080 * 50.0,
+}
+
+# За сколько секунд живая скорость ffmpeg полностью заменяет прогноз
+LIVE_WEIGHT_SECONDS = 60
+
+
+def height_bucket(height):
+    for bucket in (480, 720, 1080):
+        if height <= bucket:
+            return bucket
+    return 2160
+
+
+class SpeedModel:
+    """Скорость кодирования по истории метрик.
+
+    Скорость меряется в "пикселях видео в секунду": ширина * высота *
+    длительность / время кодирования. Так замер одного разрешения
+    пригоден и для соседних, если точного совпадения в истории нет.
+    """
+
+    def __init__(self, host=None):
+        self.host = host or platform.node()
+        self.samples = {}
+
+    @classmethod
+    def from_history(cls, records, host=None):
+        model = cls(host)
+        for record in records:
+            model.learn(record)
+        return model
+
+    def _keys(self, mode, codec, height, preset, host):
+        """Ключи от самого точного к самому общему"""
+        bucket = height_bucket(height)
+        return [
+            (mode, codec, bucket, preset, host),
+            (mode, bucket, preset, host),
+            (mode, preset, host),
+            (mode, host),
+            (mode,),
+        ]
+
+    def learn(self, record):
+        """Добавляет одну запись истории (metrics.JobMetrics.to_dict())"""
+        wall_time = record.get('wall_time') or 0
+        duration = record.get('duration') or 0
+        pixels = (record.get('width') or 0) * (record.get('height') or 0)
+        if (record.get('status') != ConversionJob.DONE or record.get('cached')
+                or wall_time < 0.5 or duration <= 0 or pixels <= 0):
+            return
+
+        # Набор качеств кодирует несколько выходов: считаем на один выход
+        rate = pixels * duration * (record.get('outputs') or 1) / wall_time
+        for key in self._keys(record.get('mode') or 'transcode', record.get('codec'),
+                              record.get('height'), record.get('preset'), record.get('host')):
+            samples = self.samples.setdefault(key, [])
+            samples.append(rate)
+            del samples[:-SAMPLES_PER_KEY]
+
+    def pixel_rate(self, mode, codec, height, preset):
+        for key in self._keys(mode, codec, height, preset, self.host):
+            if key in self.samples:
+                return statistics.median(self.samples[key])
+        return DEFAULT_PIXEL_RATE.get(mode, DEFAULT_PIXEL_RATE['transcode'])
+
+    def predict(self, info, mode='transcode', preset=None):
+        """Сколько секунд займет файл (info - probe.MediaInfo)"""
+        if info is None or info.duration <= 0:
+            return 0.0
+        pixels = info.width * info.height or 1920 * 1080
+        codec = info.video.codec if info.video else None
+        return info.duration * pixels / self.pixel_rate(mode, codec, info.height, preset)
+
+
+def job_remaining(job, now=None):
+    """Оставшееся время задачи: прогноз, уточняемый живой скоростью ffmpeg"""
+    if job.finished:
+        return 0.0
+    if job.status != ConversionJob.RUNNING or not job.start_time:
+        return job.estimate
+
+    predicted = job.estimate * (1 - job.percent / 100)
+    if job.speed <= 0 or job.duration <= 0:
+        return predicted
+
+    live = max(0.0, job.duration - job.current_time) / job.speed
+    if not job.estimate:
+        return live
+    elapsed = (now or time.time()) - job.start_time
+    weight = min(1.0, elapsed / LIVE_WEIGHT_SECONDS)
+    return live * weight + predicted * (1 - weight)
+
+
+def batch_remaining(jobs, parallel=1):
+    """Оставшееся время всего пакета с учетом числа одновременных задач"""
+    now = time.time()
+    known = [job.estimate for job in jobs if job.estimate > 0]
+    # Для еще не проанализированных файлов берем среднее
+    fallback = sum(known) / len(known) if known else 0.0
+
+    remaining = []
+    for job in jobs:
+        if job.finished:
+            continue
+        value = job_remaining(job, now)
+        if value <= 0 and job.status == ConversionJob.PENDING:
+            value = fallback
+        remaining.append(value)
+    if not remaining:
+        return 0.0
+
+    running = [job_remaining(job, now) for job in jobs if job.status == ConversionJob.RUNNING]
+    return max(sum(remaining) / max(1, parallel), max(running, default=0.0))
+
+
+def order_jobs(jobs, order):
+    """Сортирует очередь по прогнозу времени (стабильно, без прогноза - в конец)"""
+    if order == ORDER_SHORTEST:
+        return sorted(jobs, key=lambda job: (job.estimate <= 0, job.estimate))
+    if order == ORDER_LONGEST:
+        return sorted(jobs, key=lambda job: (job.estimate <= 0, -job.estimate))
+    return list(jobs)
@@ -0,0 +1,40 @@
+import queue
+
+
+class EventBus:
+    """Канал событий от рабочих потоков к окну.
+
+    Потоки движка только кладут события в очередь (post), а окно забирает
+    их по своему таймеру (drain). Частые события прогресса одной задачи
+    схлопываются в последнее: сколько бы задач ни отчитывалось, за один
+    такт окно перерисовывает каждую строку не больше одного раза.
+    """
+
+    def __init__(self, coalesce=()):
+        self.queue = queue.Queue()
+        self.coalesce = set(coalesce)
+
+    def post(self, event):
+        """Можно вызывать из любого потока"""
+        self.queue.put(event)
+
+    def drain(self):
+        """Все накопившиеся события (по порядку, прогресс - только последний)"""
+        events = []
+        latest = {}  # (вид, задача) -> позиция в events
+        while True:
+            try:
+                event = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if event.kind in self.coalesce:
+                key = (event.kind, event.data.get('index'))
+                if key in latest:
+                    events[latest[key]] = event
+                    continue
+                latest[key] = len(events)
+            events.append(event)
+        return events
+
+    def clear(self):
+        self.drain()
@@ -0,0 +1,124 @@
+import re
+import threading
+
+
+# Категории ошибок ffmpeg
+MISSING_STREAM = 'missing_stream'
+CORRUPT_INPUT = 'corrupt_input'
+DISK_FULL = 'disk_full'
+PERMISSION_DENIED = 'permission_denied'
+INPUT_NOT_FOUND = 'input_not_found'
+ENCODER_ERROR = 'encoder_error'
+WORKER_LOST = 'worker_lost'
+UNKNOWN = 'unknown'
+
+LABELS = {
+    MISSING_STREAM: "нет нужного потока",
+    CORRUPT_INPUT: "поврежденный исходник",
+    DISK_FULL: "нет места на диске",
+    PERMISSION_DENIED: "нет доступа",
+    INPUT_NOT_FOUND: "файл не найден",
+    ENCODER_ERROR: "ошибка кодировщика",
+    WORKER_LOST: "потеряна связь с исполнителем",
+    UNKNOWN: "ошибка ffmpeg",
+}
+
+# Сразу безнадежно: ffmpeg может еще долго работать, но результата не будет
+FATAL_PATTERNS = (
+    (MISSING_STREAM, re.compile(r"matches no streams|does not contain any stream|"
+                                r"Output file #?\d* ?does not contain", re.I)),
+    (DISK_FULL, re.compile(r"No space left on device|Disk quota exceeded", re.I)),
+    (PERMISSION_DENIED, re.compile(r"Permission denied|Operation not permitted", re.I)),
+    (CORRUPT_INPUT, re.compile(r"moov atom not found", re.I)),
+)
+
+# Ошибки, которые встречаются и в нормальных файлах: фатальны, только если их много
+CORRUPT_PATTERN = re.compile(
+    r"error while decoding|Error submitting packet to decoder|corrupt|Invalid NAL unit|concealing \d+ .*errors|"
+    r"decode_slice_header error|missing picture in access unit|Error splitting the input|"
+    r"non-existing PPS|no frame!|Header missing", re.I)
+
+# Только для итоговой категории (ffmpeg и так завершится сам)
+OTHER_PATTERNS = (
+    (INPUT_NOT_FOUND, re.compile(r"No such file or directory", re.I)),
+    (CORRUPT_INPUT, re.compile(r"Invalid data found when processing input", re.I)),
+    (ENCODER_ERROR, re.compile(r"Error (?:initializing|while opening) (?:output stream|encoder)|"
+                               r"Unknown encoder|Error while encoding", re.I)),
+    (WORKER_LOST, re.compile(r"^Связь с исполнителем потеряна")),
+)
+
+REPEATED = re.compile(r"Last message repeated (\d+) times")
+
+# Сколько ошибок декодирования терпим до остановки задачи
+DEFAULT_CORRUPT_LIMIT = 200
+
+
+class ErrorClassifier:
+    """Разбирает stderr ffmpeg на лету и определяет категорию ошибки.
+
+    feed() возвращает категорию, когда продолжать бессмысленно
+    (задачу пора остановить), иначе None.
+    """
+
+    def __init__(self, corrupt_limit=DEFAULT_CORRUPT_LIMIT):
+        self.corrupt_limit = corrupt_limit
+        self.corrupt_count = 0
+        self.category = None  # первая найденная категория
+        self.fatal = None
+        self.line = None  # строка, по которой определена категория
+        self.last_corrupt = False
+        self.lock = threading.Lock()
+
+    def feed(self, line):
+        # При кодировании по частям строки идут из нескольких потоков чтения stderr
+        with self.lock:
+            return self._feed(line)
+
+    def _feed(self, line):
+        # ffmpeg сворачивает повторы в "Last message repeated N times"
+        repeated = REPEATED.search(line)
+        if repeated:
+            if self.last_corrupt:
+                return self._count_corrupt(int(repeated.group(1)))
+            return None
+
+        self.last_corrupt = False
+        for category, pattern in FATAL_PATTERNS:
+            if pattern.search(line):
+                self.line = self.line if self.fatal else line
+                return self._set_fatal(category)
+
+        if CORRUPT_PATTERN.search(line):
+            self.last_corrupt = True
+            if not self.fatal:
+                self.line = line
+            return self._count_corrupt(1)
+
+        for category, pattern in OTHER_PATTERNS:
+            if pattern.search(line):
+                if self.category is None:
+                    self.category = category
+                    self.line = line
+                break
+        return None
+
+    def _count_corrupt(self, count):
+        self.corrupt_count += count
+        if self.corrupt_count >= self.corrupt_limit:
+            return self._set_fatal(CORRUPT_INPUT)
+        return None
+
+    def _set_fatal(self, category):
+        self.category = self.category or category
+        if self.fatal is None:
+            self.fatal = category
+            return category
+        return None
+
+    def result_category(self):
+        """Итоговая категория для неудачной задачи"""
+        if self.fatal:
+            return self.fatal
+        if self.category:
+            return self.category
+        return CORRUPT_INPUT if self.corrupt_count else UNKNOWN
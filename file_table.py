@@ -0,0 +1,87 @@
+from tkinter import ttk
+
+
+class VirtualTable(ttk.Frame):
+    """Таблица файлов, которая рисует только видимые строки.
+
+    В Treeview всегда столько строк, сколько помещается на экране;
+    прокрутка меняет лишь их содержимое. Поэтому 50 тысяч файлов
+    стоят столько же, сколько десять: данные берутся по запросу
+    через row_count() и row_values(номер).
+    """
+
+    def __init__(self, parent, columns, row_count, row_values, height=8, on_activate=None):
+        super().__init__(parent)
+        self.row_count = row_count
+        self.row_values = row_values
+        self.on_activate = on_activate
+        self.height = height
+        self.top = 0
+
+        self.tree = ttk.Treeview(self, columns=[key for key, _, _ in columns],
+                                 show='headings', height=height, selectmode='none')
+        for key, title, width in columns:
+            self.tree.heading(key, text=title)
+            self.tree.column(key, width=width, stretch=(key == columns[0][0]),
+                             anchor='w' if key == columns[0][0] else 'center')
+        for line in range(height):
+            self.tree.insert('', 'end', iid=str(line), values=())
+
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self.on_scroll)
+        self.tree.pack(side='left', fill='both', expand=True)
+        self.scrollbar.pack(side='right', fill='y')
+
+        # Колесо мыши: Windows/macOS - MouseWheel, X11 - Button-4/5
+        self.tree.bind('<MouseWheel>', self.on_wheel)
+        self.tree.bind('<Button-4>', lambda e: self.scroll_to(self.top - 3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll_to(self.top + 3))
+        self.tree.bind('<Double-1>', self.on_double_click)
+
+    def on_double_click(self, event):
+        """Двойной щелчок по строке - on_activate(номер строки в данных)"""
+        line = self.tree.identify_row(event.y)
+        if not line or self.on_activate is None:
+            return
+        row = self.top + int(line)
+        if row < self.row_count():
+            self.on_activate(row)
+
+    def on_wheel(self, event):
+        step = -3 if event.delta > 0 else 3
+        self.scroll_to(self.top + step)
+
+    def on_scroll(self, action, value, unit=None):
+        """Команда полосы прокрутки: moveto / scroll"""
+        count = self.row_count()
+        if action == 'moveto':
+            self.scroll_to(int(float(value) * count))
+        elif action == 'scroll':
+            step = self.height if unit == 'pages' else 1
+            self.scroll_to(self.top + int(value) * step)
+
+    def scroll_to(self, top):
+        count = self.row_count()
+        self.top = max(0, min(top, count - self.height))
+        self.refresh()
+
+    def refresh(self):
+        """Перерисовывает видимые строки и полосу прокрутки"""
+        count = self.row_count()
+        if self.top > max(0, count - self.height):
+            self.top = max(0, count - self.height)
+
+        for line in range(self.height):
+            row = self.top + line
+            values = self.row_values(row) if row < count else ()
+            self.tree.item(str(line), values=values)
+
+        if count > self.height:
+            self.scrollbar.set(self.top / count, (self.top + self.height) / count)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def refresh_row(self, row):
+        """Обновляет одну строку, если она сейчас на экране"""
+        line = row - self.top
+        if 0 <= line < self.height and row < self.row_count():
+            self.tree.item(str(line), values=self.row_values(row))
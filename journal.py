@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import threading
+
+
+def partial_path(output_file):
+    """Временный файл, в который пишет ffmpeg до атомарного переименования"""
+    folder, name = os.path.split(output_file)
+    base, ext = os.path.splitext(name)
+    # Расширение оставляем, чтобы ffmpeg сам выбрал контейнер
+    return os.path.join(folder, f".{base}.part{ext}")
+
+
+def finalize_output(partial_file, output_file):
+    """Атомарно ставим готовый файл на место"""
+    os.replace(partial_file, output_file)
+
+
+def discard_partial(partial_file):
+    try:
+        os.remove(partial_file)
+    except OSError:
+        pass
+
+
+class BatchJournal:
+    """Журнал пакета (append-only JSONL): переживает закрытие и падение программы.
+
+    Первая строка описывает пакет (файлы и настройки), дальше по строке
+    на каждую смену состояния файла. Хранится только текущий пакет.
+    """
+
+    FINISHED_STATES = ('done', 'failed')
+
+    def __init__(self, journal_file):
+        self.journal_file = journal_file
+        self.lock = threading.Lock()
+
+    def _append(self, record):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self.lock:
+            try:
+                # Если последняя строка оборвалась при сбое, начинаем с новой
+                with open(self.journal_file, 'ab+') as f:
+                    if f.tell() > 0:
+                        f.seek(-1, os.SEEK_END)
+                        if f.read(1) != b'\n':
+                            line = '\n' + line
+                with open(self.journal_file, 'a', encoding='utf-8') as f:
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError:
+                pass
+
+    def start_batch(self, files, settings):
+        """Начинаем новый пакет (старый журнал затирается)"""
+        header = {
+            'event': 'batch',
+            'started': time.time(),
+            'files': list(files),
+            'settings': dict(settings)
+        }
+        tmp_file = self.journal_file + '.tmp'
+        with self.lock:
+            try:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    f.write(json.dumps(header, ensure_ascii=False) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_file, self.journal_file)
+            except OSError:
+                pass
+
+    def set_state(self, index, state, message=None):
+        record = {'event': 'job', 'index': index, 'state': state, 'time': time.time()}
+        if message:
+            record['message'] = message
+        self._append(record)
+
+    def add_file(self, index, path):
+        """Файл добавлен в уже идущий пакет (режим наблюдения за папкой)"""
+        self._append({'event': 'file', 'index': index, 'path': path, 'time': time.time()})
+
+    def finish_batch(self):
+        self._append({'event': 'finished', 'time': time.time()})
+
+    def load(self):
+        """Читаем журнал: (заголовок, {индекс: состояние}, пакет_завершен)"""
+        header = None
+        states = {}
+        finished = False
+        try:
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Строка могла оборваться при падении
+                        continue
+                    event = record.get('event')
+                    if event == 'batch':
+                        header, states, finished = record, {}, False
+                    elif event == 'file' and header is not None:
+                        files = header['files']
+                        files.extend([None] * (record['index'] + 1 - len(files)))
+                        files[record['index']] = record['path']
+                    elif event == 'job':
+                        states[record['index']] = record['state']
+                    elif event == 'finished':
+                        finished = True
+        except OSError:
+            return None, {}, True
+        return header, states, finished
+
+    def unfinished_batch(self):
+        """Незавершенный пакет: (оставшиеся файлы, настройки) или None"""
+        header, states, finished = self.load()
+        if header is None or finished:
+            return None
+
+        remaining = [
+            path for index, path in enumerate(header['files'])
+            if path and states.get(index) not in self.FINISHED_STATES
+        ]
+        if not remaining:
+            return None
+        return remaining, header.get('settings', {})
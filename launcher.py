@@ -0,0 +1,97 @@
+import os
+import shutil
+import signal
+import subprocess
+
+
+# Приоритеты процессов ffmpeg
+PRIORITY_NORMAL = 'normal'
+PRIORITY_LOW = 'low'
+PRIORITY_IDLE = 'idle'
+PRIORITIES = (PRIORITY_NORMAL, PRIORITY_LOW, PRIORITY_IDLE)
+
+IS_WINDOWS = os.name == 'nt'
+
+# Имя исполняемого файла ffmpeg на этой платформе
+FFMPEG_NAME = 'ffmpeg.exe' if IS_WINDOWS else 'ffmpeg'
+
+# POSIX: (nice, класс ionice, уровень ionice)
+_POSIX_PRIORITY = {
+    PRIORITY_LOW: (10, '2', '7'),    # best-effort, самый низкий уровень
+    PRIORITY_IDLE: (19, '3', None),  # диск только когда он простаивает
+}
+
+
+def _windows_kwargs(priority):
+    """Windows: скрываем консольное окно и задаем класс приоритета"""
+    startupinfo = subprocess.STARTUPINFO()
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    startupinfo.wShowWindow = subprocess.SW_HIDE
+
+    flags = subprocess.CREATE_NO_WINDOW
+    if priority == PRIORITY_LOW:
+        flags |= subprocess.BELOW_NORMAL_PRIORITY_CLASS
+    elif priority == PRIORITY_IDLE:
+        flags |= subprocess.IDLE_PRIORITY_CLASS
+    return {'startupinfo': startupinfo, 'creationflags': flags}
+
+
+def _posix_prefix(priority):
+    """POSIX: обертки nice/ionice (exec, поэтому PID остается тем же)"""
+    if priority not in _POSIX_PRIORITY:
+        return []
+
+    nice_value, io_class, io_level = _POSIX_PRIORITY[priority]
+    prefix = []
+    if shutil.which('ionice'):
+        prefix += ['ionice', '-c', io_class]
+        if io_level is not None:
+            prefix += ['-n', io_level]
+    if shutil.which('nice'):
+        prefix += ['nice', '-n', str(nice_value)]
+    return prefix
+
+
+def _prepare(cmd, priority):
+    """Команда и параметры запуска для текущей платформы"""
+    if IS_WINDOWS:
+        return list(cmd), _windows_kwargs(priority)
+
+    # Своя группа процессов: отмена останавливает ffmpeg целиком,
+    # а Ctrl+C в терминале не рассылается дочерним процессам напрямую
+    return _posix_prefix(priority) + list(cmd), {'start_new_session': True}
+
+
+def popen(cmd, priority=PRIORITY_NORMAL, **kwargs):
+    """Запускает процесс (аналог subprocess.Popen)"""
+    cmd, platform_kwargs = _prepare(cmd, priority)
+    kwargs.setdefault('stdin', subprocess.DEVNULL)
+    kwargs.update(platform_kwargs)
+    return subprocess.Popen(cmd, **kwargs)
+
+
+def run(cmd, priority=PRIORITY_NORMAL, **kwargs):
+    """Запускает процесс и ждет завершения (аналог subprocess.run)"""
+    cmd, platform_kwargs = _prepare(cmd, priority)
+    kwargs.setdefault('stdin', subprocess.DEVNULL)
+    kwargs.update(platform_kwargs)
+    return subprocess.run(cmd, **kwargs)
+
+
+def terminate(process):
+    """Останавливает процесс (на POSIX - всю его группу)"""
+    if process is None or process.poll() is not None:
+        return
+
+    try:
+        if not IS_WINDOWS and isinstance(process, subprocess.Popen):
+            os.killpg(process.pid, signal.SIGTERM)
+        else:
+            process.terminate()
+    except (ProcessLookupError, PermissionError):
+        pass
+    except Exception:
+        try:
+            process.terminate()
+        except Exception:
+            pass
@@ -0,0 +1,293 @@
+"""Метрики задач и отчеты: python -m metrics [--csv FILE] [--json FILE] [--prometheus FILE]
+
+Каждая задача пакета сохраняет замеры (время анализа, ожидания в очереди
+и кодирования, fps, скорость, размеры, код возврата) в историю
+metrics_history.jsonl. Из истории строятся отчеты CSV/JSON и снимок
+для textfile-коллектора Prometheus (node_exporter).
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import platform
+import threading
+
+
+# Поля записи в истории (и колонки CSV) в этом порядке
+FIELDS = (
+    'time', 'host', 'file', 'status', 'mode', 'cached',
+    'duration', 'width', 'height', 'codec', 'video_bitrate', 'preset',
+    'probe_time', 'queue_wait', 'wall_time', 'faststart_time', 'fps_avg', 'fps_min', 'speed',
+    'input_bytes', 'output_bytes', 'outputs', 'exit_code', 'error_category'
+)
+
+DEFAULT_MAX_RECORDS = 5000
+
+
+class JobMetrics:
+    """Замеры одной задачи"""
+
+    def __init__(self, input_file):
+        self.file = input_file
+        self.host = platform.node()
+        self.status = None
+        self.mode = None
+        self.cached = None
+        self.duration = 0.0
+        self.width = 0
+        self.height = 0
+        self.codec = None
+        self.video_bitrate = 0
+        self.preset = None
+        self.probe_time = 0.0
+        self.queue_wait = 0.0
+        self.wall_time = 0.0
+        self.faststart_time = 0.0  # второй проход +faststart (входит в wall_time)
+        self.frames = 0
+        self.fps_min = None
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.outputs = 1  # больше 1 для набора качеств
+        self.exit_code = None
+        self.error_category = None
+        self.encode_start = None
+
+    def set_media(self, info):
+        if info is None:
+            return
+        self.duration = info.duration
+        self.width = info.width
+        self.height = info.height
+        self.codec = info.video.codec if info.video else None
+
+    def start_encode(self):
+        self.encode_start = time.perf_counter()
+
+    def record_progress(self, snapshot):
+        """Блок прогресса ffmpeg: кадры и мгновенный fps"""
+        if snapshot.frame:
+            self.frames = snapshot.frame
+        # В первые секунды ffmpeg пишет fps=0, это не минимум
+        if snapshot.fps > 0:
+            self.fps_min = snapshot.fps if self.fps_min is None else min(self.fps_min, snapshot.fps)
+
+    def finish(self, job):
+        """Задача закончилась: добираем то, что известно только в конце"""
+        self.status = job.status
+        self.mode = job.mode
+        self.cached = job.cached
+        self.error_category = job.error_category
+        if self.encode_start is not None:
+            self.wall_time = time.perf_counter() - self.encode_start
+        try:
+            self.input_bytes = os.path.getsize(job.input_file)
+        except OSError:
+            pass
+        outputs = [r.output_file for r in job.renditions] or [job.output_file]
+        self.outputs = len(outputs)
+        if job.status == 'done':
+            self.output_bytes = sum(os.path.getsize(path) for path in outputs
+                                    if os.path.exists(path))
+
+    @property
+    def fps_avg(self):
+        return self.frames / self.wall_time if self.wall_time > 0 and self.frames else 0.0
+
+    @property
+    def speed(self):
+        """Во сколько раз быстрее реального времени"""
+        return self.duration / self.wall_time if self.wall_time > 0 and self.duration else 0.0
+
+    def to_dict(self):
+        return {
+            'time': round(time.time(), 3),
+            'host': self.host,
+            'file': self.file,
+            'status': self.status,
+            'mode': self.mode,
+            'cached': self.cached,
+            'duration': round(self.duration, 3),
+            'width': self.width,
+            'height': self.height,
+            'codec': self.codec,
+            'video_bitrate': self.video_bitrate,
+            'preset': self.preset,
+            'probe_time': round(self.probe_time, 4),
+            'queue_wait': round(self.queue_wait, 3),
+            'wall_time': round(self.wall_time, 3),
+            'faststart_time': round(self.faststart_time, 3),
+            'fps_avg': round(self.fps_avg, 2),
+            'fps_min': round(self.fps_min, 2) if self.fps_min is not None else None,
+            'speed': round(self.speed, 3),
+            'input_bytes': self.input_bytes,
+            'output_bytes': self.output_bytes,
+            'outputs': self.outputs,
+            'exit_code': self.exit_code,
+            'error_category': self.error_category
+        }
+
+
+class MetricsHistory:
+    """История метрик в JSONL; хранит не больше max_records последних записей"""
+
+    def __init__(self, path="metrics_history.jsonl", max_records=DEFAULT_MAX_RECORDS):
+        self.path = path
+        self.max_records = max_records
+        self.lock = threading.Lock()
+
+    def load(self, last=None):
+        records = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue  # недописанная строка
+        except OSError:
+            pass
+        return records[-last:] if last else records
+
+    def append(self, records):
+        if not records:
+            return
+        with self.lock:
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    for record in records:
+                        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            except OSError:
+                return
+            self._trim()
+
+    def _trim(self):
+        # Переписываем файл, только когда он заметно перерос лимит
+        records = self.load()
+        if len(records) <= self.max_records * 1.2:
+            return
+        _write_atomic(self.path, ''.join(json.dumps(record, ensure_ascii=False) + '\n'
+                                         for record in records[-self.max_records:]))
+
+
+def _write_atomic(path, text):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+def export_csv(records, path):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(records)
+    os.replace(temp_path, path)
+
+
+def export_json(records, path):
+    _write_atomic(path, json.dumps(records, ensure_ascii=False, indent=2))
+
+
+def export_report(records, path):
+    """CSV или JSON - по расширению файла"""
+    if path.lower().endswith('.json'):
+        export_json(records, path)
+    else:
+        export_csv(records, path)
+
+
+def summarize(records):
+    """Сводка по набору записей (для отчета и Prometheus)"""
+    encoded = [r for r in records if r.get('status') == 'done' and not r.get('cached')
+               and r.get('wall_time')]
+    wall = sum(r['wall_time'] for r in encoded)
+    return {
+        'jobs': len(records),
+        'done': sum(1 for r in records if r.get('status') == 'done'),
+        'failed': sum(1 for r in records if r.get('status') == 'failed'),
+        'cached': sum(1 for r in records if r.get('cached')),
+        'encode_seconds': round(wall, 3),
+        'media_seconds': round(sum(r.get('duration') or 0 for r in encoded), 3),
+        'fps_avg': round(sum(r['fps_avg'] * r['wall_time'] for r in encoded) / wall, 2) if wall else 0.0,
+        'speed_avg': round(sum(r.get('duration') or 0 for r in encoded) / wall, 3) if wall else 0.0,
+        'input_bytes': sum(r.get('input_bytes') or 0 for r in records),
+        'output_bytes': sum(r.get('output_bytes') or 0 for r in records),
+        'probe_seconds': round(sum(r.get('probe_time') or 0 for r in records), 3),
+        'queue_wait_seconds': round(sum(r.get('queue_wait') or 0 for r in records), 3)
+    }
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def write_prometheus(records, path, ffmpeg_version=""):
+    """Снимок для textfile-коллектора node_exporter (файл *.prom)"""
+    summary = summarize(records)
+    host = _label(platform.node())
+    lines = [
+        '# HELP video_converter_info Версия ffmpeg, которой кодировался пакет.',
+        '# TYPE video_converter_info gauge',
+        f'video_converter_info{{host="{host}",ffmpeg="{_label(ffmpeg_version)}"}} 1',
+        '# HELP video_converter_batch_jobs Задачи последнего пакета по состоянию.',
+        '# TYPE video_converter_batch_jobs gauge',
+    ]
+    for state in ('done', 'failed', 'cached'):
+        lines.append(f'video_converter_batch_jobs{{host="{host}",state="{state}"}} {summary[state]}')
+
+    gauges = (
+        ('encode_seconds', 'Суммарное время кодирования задач, с.'),
+        ('media_seconds', 'Длительность закодированного видео, с.'),
+        ('fps_avg', 'Средняя скорость кодирования, кадров в секунду.'),
+        ('speed_avg', 'Средняя скорость относительно реального времени.'),
+        ('input_bytes', 'Объем исходных файлов, байт.'),
+        ('output_bytes', 'Объем результатов, байт.'),
+        ('probe_seconds', 'Суммарное время анализа файлов, с.'),
+        ('queue_wait_seconds', 'Суммарное ожидание задач в очереди, с.'),
+    )
+    for key, help_text in gauges:
+        name = f'video_converter_batch_{key}'
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge',
+                  f'{name}{{host="{host}"}} {summary[key]}']
+
+    lines += ['# HELP video_converter_batch_timestamp_seconds Время окончания пакета.',
+              '# TYPE video_converter_batch_timestamp_seconds gauge',
+              f'video_converter_batch_timestamp_seconds{{host="{host}"}} {round(time.time(), 3)}']
+
+    # node_exporter читает файл целиком: пишем атомарно
+    _write_atomic(path, '\n'.join(lines) + '\n')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m metrics",
+        description="Отчеты по истории метрик конвертации"
+    )
+    parser.add_argument('--history', default="metrics_history.jsonl", metavar='FILE')
+    parser.add_argument('--last', type=int, metavar='N', help="только последние N задач")
+    parser.add_argument('--csv', metavar='FILE')
+    parser.add_argument('--json', metavar='FILE')
+    parser.add_argument('--prometheus', metavar='FILE', help="снимок для textfile-коллектора")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    records = MetricsHistory(args.history).load(args.last)
+
+    if args.csv:
+        export_csv(records, args.csv)
+    if args.json:
+        export_json(records, args.json)
+    if args.prometheus:
+        write_prometheus(records, args.prometheus)
+
+    print(json.dumps(summarize(records), ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
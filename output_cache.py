@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+
+# Аргументы, которые не влияют на содержимое результата
+IGNORED_ARGS_WITH_VALUE = ('-i', '-progress', '-loglevel', '-threads')
+IGNORED_FLAGS = ('-y', '-n', '-nostdin', '-nostats', '-hide_banner')
+
+
+def quick_hash(path, samples=16, chunk_size=1024 * 1024):
+    """Быстрый хэш содержимого: размер + начало, конец и равномерные выборки.
+
+    Читает не больше (samples + 2) * chunk_size байт, поэтому работает
+    одинаково быстро и для клипа, и для многочасовой записи.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(str(size).encode())
+
+    with open(path, 'rb') as f:
+        if size <= (samples + 2) * chunk_size:
+            for block in iter(lambda: f.read(chunk_size), b''):
+                digest.update(block)
+        else:
+            step = (size - chunk_size) // (samples + 1)
+            for i in range(samples + 2):
+                f.seek(i * step)
+                digest.update(f.read(chunk_size))
+    return digest.hexdigest()
+
+
+def normalize_args(args):
+    """Убираем из команды пути и служебные ключи, оставляя параметры кодирования"""
+    # Первый аргумент - путь к ffmpeg, последний - выходной файл
+    # (от него важно только расширение, т.е. контейнер)
+    args = list(args[1:-1]) + [os.path.splitext(args[-1])[1].lower()]
+    result = []
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+            continue
+        if arg in IGNORED_ARGS_WITH_VALUE:
+            skip = True
+            continue
+        if arg in IGNORED_FLAGS:
+            continue
+        result.append(arg)
+    return result
+
+
+def job_fingerprint(input_file, args, extra=None):
+    """Отпечаток задачи: содержимое входного файла + эффективные параметры ffmpeg"""
+    payload = {
+        'input': quick_hash(input_file),
+        'args': normalize_args(args),
+        'extra': extra
+    }
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def link_or_copy(source, target):
+    """Жесткая ссылка (мгновенно) или копия, если ссылка невозможна"""
+    # Свое временное имя у каждого потока: копии могут идти параллельно
+    tmp_target = f"{target}.{threading.get_ident()}.tmp"
+    if os.path.exists(tmp_target):
+        os.remove(tmp_target)
+    try:
+        os.link(source, tmp_target)
+    except OSError:
+        shutil.copy2(source, tmp_target)
+    os.replace(tmp_target, target)
+
+
+class OutputCache:
+    """Кэш готовых файлов по отпечатку задачи с ограничением размера (LRU)"""
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_file = os.path.join(cache_dir, 'index.json')
+        self.lock = threading.Lock()
+
+        # entries: отпечаток -> файл в кэше; outputs: выходной файл -> отпечаток
+        self.entries = {}
+        self.outputs = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.entries = data.get('entries', {})
+            self.outputs = data.get('outputs', {})
+        except Exception:
+            self.entries = {}
+            self.outputs = {}
+
+    def save(self):
+        """Атомарно сохраняем индекс (вызывать под self.lock)"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_file = self.index_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'entries': self.entries, 'outputs': self.outputs}, f, ensure_ascii=False)
+            os.replace(tmp_file, self.index_file)
+        except Exception:
+            pass
+
+    def _remember_output(self, output_file, fingerprint):
+        stat = os.stat(output_file)
+        self.outputs[os.path.abspath(output_file)] = {
+            'fingerprint': fingerprint,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns
+        }
+
+    def is_up_to_date(self, output_file, fingerprint):
+        """Выходной файл уже получен с тем же отпечатком и не менялся"""
+        with self.lock:
+            record = self.outputs.get(os.path.abspath(output_file))
+        if not record or record['fingerprint'] != fingerprint:
+            return False
+        try:
+            stat = os.stat(output_file)
+        except OSError:
+            return False
+        return stat.st_size == record['size'] and stat.st_mtime_ns == record['mtime_ns']
+
+    def fetch(self, fingerprint, output_file):
+        """Берем результат из кэша; True если нашли"""
+        with self.lock:
+            entry = self.entries.get(fingerprint)
+            if not entry:
+                return False
+            cached_file = os.path.join(self.cache_dir, entry['file'])
+            if not os.path.exists(cached_file):
+                del self.entries[fingerprint]
+                self.save()
+                return False
+
+            try:
+                link_or_copy(cached_file, output_file)
+            except OSError:
+                return False
+
+            entry['last_used'] = time.time()
+            self._remember_output(output_file, fingerprint)
+            self.save()
+        return True
+
+    def store(self, fingerprint, output_file):
+        """Кладем готовый файл в кэш и вытесняем давно не используемые"""
+        try:
+            size = os.path.getsize(output_file)
+        except OSError:
+            return
+        name = fingerprint + os.path.splitext(output_file)[1]
+
+        # Файл больше всего кэша сразу вытеснил бы и остальные записи, и себя
+        cached = size <= self.max_bytes
+        if cached:
+            try:
+                # Если ссылка невозможна (другой диск), копия идет долго -
+                # делаем ее без блокировки, чтобы не держать остальные задачи
+                os.makedirs(self.cache_dir, exist_ok=True)
+                link_or_copy(output_file, os.path.join(self.cache_dir, name))
+            except OSError:
+                cached = False
+
+        with self.lock:
+            if cached:
+                self.entries[fingerprint] = {
+                    'file': name,
+                    'size': size,
+                    'last_used': time.time()
+                }
+            try:
+                self._remember_output(output_file, fingerprint)
+            except OSError:
+                pass
+            self.evict()
+            self.save()
+
+    def evict(self):
+        """LRU: удаляем самые давние записи, пока кэш больше лимита"""
+        total = sum(entry['size'] for entry in self.entries.values())
+        by_age = sorted(self.entries.items(), key=lambda item: item[1]['last_used'])
+        for fingerprint, entry in by_age:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, entry['file']))
+            except OSError:
+                pass
+            total -= entry['size']
+            del self.entries[fingerprint]
@@ -0,0 +1,102 @@
+# Какие профили H.264 источника подходят под выбранный профиль
+COMPATIBLE_PROFILES = {
+    'baseline': ('baseline', 'constrained baseline'),
+    'main': ('baseline', 'constrained baseline', 'main'),
+}
+
+# Превышение битрейта, которое еще считаем "в пределах" (оценки неточные)
+BITRATE_TOLERANCE = 1.05
+
+
+class StreamPlan:
+    """Что делать с потоками файла: копировать или кодировать"""
+
+    COPY = 'copy'            # -c copy, только перепаковка
+    AUDIO = 'audio'          # видео копируем, аудио кодируем
+    TRANSCODE = 'transcode'  # полное перекодирование
+
+    LABELS = {
+        COPY: "копирование",
+        AUDIO: "только аудио",
+        TRANSCODE: "кодирование",
+    }
+
+    def __init__(self, video_copy=False, audio_copy=False, reason=""):
+        self.video_copy = video_copy
+        self.audio_copy = audio_copy
+        self.reason = reason
+
+    @property
+    def mode(self):
+        if self.video_copy and self.audio_copy:
+            return self.COPY
+        if self.video_copy:
+            return self.AUDIO
+        return self.TRANSCODE
+
+    @property
+    def label(self):
+        return self.LABELS[self.mode]
+
+
+def _video_bitrate(info):
+    """Битрейт видео в kbps; если поток его не сообщает - оцениваем по контейнеру"""
+    if info.video.bitrate:
+        return info.video.bitrate
+    if info.bitrate:
+        audio = info.audio.bitrate if info.audio else 0
+        return max(0, info.bitrate - audio)
+    return 0
+
+
+def can_copy_video(info, video_kbps, profile):
+    """Можно ли взять видеопоток без перекодирования; (да/нет, причина)"""
+    video = info.video
+    if video is None:
+        return False, "нет видеопотока"
+    if video.codec != 'h264':
+        return False, f"видео {video.codec}"
+
+    source_profile = (video.profile or '').lower()
+    if source_profile not in COMPATIBLE_PROFILES.get(profile, ()):
+        return False, f"профиль {video.profile or '?'}"
+
+    if video.pix_fmt and video.pix_fmt not in ('yuv420p', 'yuvj420p'):
+        return False, f"формат пикселей {video.pix_fmt}"
+
+    bitrate = _video_bitrate(info)
+    if not bitrate:
+        return False, "битрейт видео неизвестен"
+    if bitrate > video_kbps * BITRATE_TOLERANCE:
+        return False, f"битрейт видео {bitrate}k > {video_kbps}k"
+
+    return True, "H.264 в пределах настроек"
+
+
+def can_copy_audio(info, audio_kbps):
+    """Можно ли взять аудиопоток без перекодирования"""
+    audio = info.audio
+    if audio is None:
+        # Аудио нет - кодировать нечего
+        return True, "нет аудио"
+    if audio.codec != 'aac':
+        return False, f"аудио {audio.codec}"
+    if not audio.bitrate:
+        return False, "битрейт аудио неизвестен"
+    if audio.bitrate > audio_kbps * BITRATE_TOLERANCE:
+        return False, f"битрейт аудио {audio.bitrate}k > {audio_kbps}k"
+    return True, "AAC в пределах настроек"
+
+
+def choose_stream_plan(info, video_kbps, audio_kbps, profile):
+    """Выбираем для файла копирование, кодирование аудио или полное кодирование"""
+    if info is None:
+        return StreamPlan(reason="метаданные недоступны")
+
+    video_copy, video_reason = can_copy_video(info, video_kbps, profile)
+    audio_copy, audio_reason = can_copy_audio(info, audio_kbps)
+
+    if not video_copy:
+        # Раз видео все равно кодируется, аудио тоже приводим к настройкам
+        return StreamPlan(reason=video_reason)
+    return StreamPlan(video_copy=True, audio_copy=audio_copy, reason=audio_reason)
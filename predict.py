@@ -0,0 +1,273 @@
+"""Прогноз пакета до запуска: размер результатов, место на дисках, время.
+
+Из каждого файла кодируется несколько коротких отрывков, равномерно
+разнесенных по длительности, с текущими настройками (той же командой,
+что и при настоящей конвертации). Отрывки кодируются параллельно,
+по столько же задач, сколько будет идти одновременно в пакете, поэтому
+скорость замеряется в тех же условиях. Целиком файлы не читаются:
+ffmpeg сразу переходит к нужному месту (-ss перед -i).
+"""
+import os
+import time
+import shutil
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import launcher
+from batch import ConversionJob, default_job_count, split_threads
+from eta import batch_remaining
+from passthrough import StreamPlan
+from progress import ProgressParser
+from renditions import RenditionOutput
+
+
+# Отрывков на файл и длина отрывка, с
+SAMPLE_COUNT = 3
+SAMPLE_SECONDS = 2.0
+
+# Больше файлов не пробуем: остальные оцениваются по попробованным
+MAX_SAMPLED_FILES = 24
+
+# Сколько ждем один отрывок, с
+SAMPLE_TIMEOUT = 60
+
+# Запас к прогнозу размера: несколько секунд - не весь файл
+SIZE_MARGIN = 1.15
+
+# Сколько места на диске должно остаться после пакета
+DISK_RESERVE = 256 * 1024 ** 2
+
+
+def sample_windows(start, duration, count=SAMPLE_COUNT, length=SAMPLE_SECONDS):
+    """Отрывки [(начало, конец)], равномерно разнесенные по [start, start + duration]"""
+    if duration <= 0:
+        return []
+    if duration <= count * length:
+        return [(start, start + duration)]
+    step = duration / count
+    return [(start + step * (i + 0.5) - length / 2, start + step * (i + 0.5) + length / 2)
+            for i in range(count)]
+
+
+def spread(items, limit):
+    """Не больше limit элементов, равномерно по всему списку"""
+    if len(items) <= limit:
+        return list(items)
+    return [items[i * len(items) // limit] for i in range(limit)]
+
+
+def existing_dir(path):
+    """Ближайшая существующая папка (папки результатов еще могут быть не созданы)"""
+    path = os.path.abspath(path)
+    while not os.path.isdir(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def run_sample(cmd, outputs, length, priority=launcher.PRIORITY_NORMAL):
+    """Кодирует отрывок; (секунд видео, байт, секунд работы) или None при ошибке"""
+    start = time.perf_counter()
+    try:
+        result = launcher.run(cmd, priority=priority, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, timeout=SAMPLE_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    wall_time = time.perf_counter() - start
+    if result.returncode != 0:
+        return None
+
+    parser = ProgressParser()
+    last = None
+    for line in result.stdout.splitlines():
+        snapshot = parser.feed(line)
+        if snapshot is not None:
+            last = snapshot
+    media = last.out_time if last is not None and last.out_time else length
+    size = sum(os.path.getsize(path) for path in outputs if os.path.exists(path))
+    # Скорость по ffmpeg - без времени его запуска
+    speed = last.speed if last is not None and last.speed > 0 else media / max(wall_time, 0.001)
+    return media, size, media / speed
+
+
+class FilePrediction:
+    """Прогноз одного файла"""
+
+    def __init__(self, job, info, mode):
+        self.job = job
+        self.info = info
+        self.mode = mode
+        self.output_bytes = 0
+        self.encode_seconds = 0.0
+        self.sampled = False
+
+    @property
+    def outputs(self):
+        return [r.output_file for r in self.job.renditions] or [self.job.output_file]
+
+    def to_dict(self):
+        return {
+            'file': self.job.input_file,
+            'output': self.outputs if self.job.renditions else self.job.output_file,
+            'duration': round(self.job.duration, 3),
+            'mode': self.mode,
+            'output_bytes': int(self.output_bytes),
+            'encode_seconds': round(self.encode_seconds, 1),
+            'sampled': self.sampled
+        }
+
+
+class BatchPrediction:
+    """Итог прогноза: размер, место по дискам, время пакета"""
+
+    def __init__(self, files, unknown, parallel, elapsed):
+        self.files = files
+        self.unknown = unknown  # файлы, которые не удалось прочитать
+        self.parallel = parallel
+        self.elapsed = elapsed
+        self.output_bytes = int(sum(f.output_bytes for f in files))
+        self.encode_seconds = sum(f.encode_seconds for f in files)
+
+        jobs = []
+        for prediction in files:
+            job = ConversionJob(prediction.job.index, prediction.job.input_file, prediction.job.output_file)
+            job.estimate = prediction.encode_seconds
+            jobs.append(job)
+        self.batch_seconds = batch_remaining(jobs, parallel)
+        self.volumes = self._volumes()
+
+    def _volumes(self):
+        """Нужное и свободное место по дискам, на которые пишутся результаты"""
+        volumes = {}
+        for prediction in self.files:
+            folder = existing_dir(os.path.dirname(prediction.outputs[0]))
+            try:
+                device = os.stat(folder).st_dev
+            except OSError:
+                continue
+            volume = volumes.setdefault(device, {'path': folder, 'needed': 0})
+            volume['needed'] += prediction.output_bytes * SIZE_MARGIN
+
+        result = []
+        for volume in volumes.values():
+            try:
+                free = shutil.disk_usage(volume['path']).free
+            except OSError:
+                free = None
+            needed = int(volume['needed'])
+            result.append({'path': volume['path'], 'needed_bytes': needed, 'free_bytes': free,
+                           'enough': free is None or free - needed >= DISK_RESERVE})
+        return result
+
+    @property
+    def enough_space(self):
+        return all(volume['enough'] for volume in self.volumes)
+
+    def to_dict(self):
+        return {
+            'files': len(self.files),
+            'sampled': sum(1 for f in self.files if f.sampled),
+            'unknown': self.unknown,
+            'parallel': self.parallel,
+            'output_bytes': self.output_bytes,
+            'encode_seconds': round(self.encode_seconds, 1),
+            'batch_seconds': round(self.batch_seconds, 1),
+            'enough_space': self.enough_space,
+            'volumes': self.volumes,
+            'elapsed': round(self.elapsed, 2),
+            'jobs': [f.to_dict() for f in self.files]
+        }
+
+
+def _sample_job(job, number, start, end, work_dir):
+    """Задача-отрывок: те же настройки, результат - во временной папке"""
+    name = f"{job.index}_{number}"
+    sample = ConversionJob(job.index, job.input_file, os.path.join(work_dir, f"{name}.mp4"))
+    sample.clip_start, sample.clip_end = start, end
+    sample.renditions = [RenditionOutput(r.rendition, os.path.join(work_dir, f"{name}_{r.name}.mp4"))
+                         for r in job.renditions]
+    return sample
+
+
+def predict_batch(engine, inputs, parallel=None):
+    """Прогноз пакета для движка (его настройки, кодировщик и команды ffmpeg)"""
+    started = time.perf_counter()
+    parallel = parallel or engine.options.parallel_jobs or default_job_count()
+    jobs = engine.create_jobs(inputs, make_dirs=False)
+
+    # Метаданные (только заголовки, с кэшем) - параллельно
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        infos = list(pool.map(lambda job: engine.probe_file(job.input_file), jobs))
+
+    files = []
+    for job, info in zip(jobs, infos):
+        if info is None or info.duration <= 0:
+            continue
+        job.duration = engine.clip_length(job, info)
+        plan = engine.stream_plan(job, info)
+        files.append((FilePrediction(job, info, plan.mode if plan else StreamPlan.TRANSCODE), plan))
+    unknown = len(jobs) - len(files)
+
+    work_dir = tempfile.mkdtemp(prefix='predict_')
+    try:
+        # Отрывки всех пробуемых файлов - одной очередью на parallel исполнителей
+        threads = split_threads(0, parallel)
+        samples = []
+        for prediction, plan in spread(files, MAX_SAMPLED_FILES):
+            job = prediction.job
+            for number, (start, end) in enumerate(sample_windows(job.clip_start or 0.0, job.duration)):
+                sample = _sample_job(job, number, start, end, work_dir)
+                sample.threads = threads
+                outputs = [r.partial_file for r in sample.renditions] or [sample.partial_file]
+                samples.append((prediction, engine.job_command(sample, plan), outputs, end - start))
+
+        with ThreadPoolExecutor(max_workers=parallel) as pool:
+            results = list(pool.map(
+                lambda item: run_sample(item[1], item[2], item[3], engine.options.priority), samples))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    # Попробованные файлы: размер и скорость по своим отрывкам
+    measured = {}
+    for (prediction, _, _, _), result in zip(samples, results):
+        if result is not None:
+            measured.setdefault(id(prediction), []).append(result)
+    rates = {}  # режим -> [(байт в секунду, пикселей в секунду работы)]
+    for prediction, _ in files:
+        results = measured.get(id(prediction))
+        if not results:
+            continue
+        media = sum(r[0] for r in results)
+        work = sum(r[2] for r in results)
+        prediction.sampled = True
+        prediction.output_bytes = sum(r[1] for r in results) / media * prediction.job.duration
+        prediction.encode_seconds = work / media * prediction.job.duration
+        pixels = (prediction.info.width or 1) * (prediction.info.height or 1)
+        rates.setdefault(prediction.mode, []).append((sum(r[1] for r in results) / media,
+                                                      media * pixels / max(work, 0.001)))
+
+    # Остальные - по попробованным файлам того же режима (копирование - по размеру исходника)
+    everything = [rate for values in rates.values() for rate in values]
+    for prediction, _ in files:
+        if prediction.sampled:
+            continue
+        known = rates.get(prediction.mode) or everything
+        duration = prediction.job.duration
+        if prediction.mode == StreamPlan.COPY or not known:
+            try:
+                size = os.path.getsize(prediction.job.input_file)
+            except OSError:
+                size = 0
+            prediction.output_bytes = size * min(1.0, duration / prediction.info.duration)
+        else:
+            prediction.output_bytes = sum(rate[0] for rate in known) / len(known) * duration
+        if known:
+            pixel_rate = sum(rate[1] for rate in known) / len(known)
+            pixels = (prediction.info.width or 1) * (prediction.info.height or 1)
+            prediction.encode_seconds = duration * pixels / pixel_rate
+
+    return BatchPrediction([prediction for prediction, _ in files], unknown, parallel,
+                           time.perf_counter() - started)
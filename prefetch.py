@@ -0,0 +1,188 @@
+import os
+import shutil
+import tempfile
+import threading
+
+
+PREFETCH_PROBE = 'probe'          # только читаем метаданные заранее
+PREFETCH_READAHEAD = 'readahead'  # читаем файл заранее (прогрев кэша ОС)
+PREFETCH_STAGE = 'stage'          # копируем файл на локальный диск
+PREFETCH_MODES = (PREFETCH_PROBE, PREFETCH_READAHEAD, PREFETCH_STAGE)
+
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def default_scratch_dir():
+    return os.path.join(tempfile.gettempdir(), 'video_converter_scratch')
+
+
+class Prefetcher:
+    """Готовит следующие файлы пакета, пока кодируются текущие.
+
+    Пока кодируется файл k, для файлов k+1..k+lookahead заранее читаются
+    метаданные, а в режимах readahead/stage - и сами данные (например,
+    с NAS). Объем заранее прочитанных/скопированных данных ограничен
+    budget_bytes. probe(job) читает метаданные файла задачи.
+    """
+
+    def __init__(self, probe, mode=PREFETCH_PROBE, lookahead=3,
+                 budget_bytes=4 * 1024 ** 3, scratch_dir=None):
+        self.probe = probe
+        self.mode = mode if mode in PREFETCH_MODES else PREFETCH_PROBE
+        self.lookahead = max(1, lookahead)
+        self.budget_bytes = budget_bytes
+        self.scratch_dir = scratch_dir or default_scratch_dir()
+
+        self.condition = threading.Condition()
+        self.jobs = []
+        self.positions = {}      # индекс задачи -> место в очереди
+        self.started_upto = -1   # место в очереди последней взятой в работу задачи
+        self.claimed = set()     # задачи, которые уже кодируются
+        self.staged = {}         # индекс -> (локальная копия, размер)
+        self.read_ahead = {}     # индекс -> сколько байт прочитано заранее (readahead)
+        self.used_bytes = 0
+        self.stopped = False
+        self.thread = None
+
+    def start(self, jobs):
+        self.jobs = list(jobs)
+        self.positions = {job.index: position for position, job in enumerate(self.jobs)}
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Останавливает предзагрузку и удаляет локальные копии"""
+        with self.condition:
+            self.stopped = True
+            staged = list(self.staged.values())
+            self.staged.clear()
+            self.read_ahead.clear()
+            self.used_bytes = 0
+            self.condition.notify_all()
+        for path, _ in staged:
+            self._remove(path)
+
+    def claim(self, job):
+        """Задача начинает кодироваться: путь к локальной копии или None"""
+        with self.condition:
+            self.claimed.add(job.index)
+            self.started_upto = max(self.started_upto, self.positions.get(job.index, -1))
+            self.condition.notify_all()
+            staged = self.staged.get(job.index)
+        return staged[0] if staged else None
+
+    def release(self, job):
+        """Задача закончилась: локальная копия больше не нужна"""
+        with self.condition:
+            staged = self.staged.pop(job.index, None)
+            if staged:
+                self.used_bytes -= staged[1]
+            self.used_bytes -= self.read_ahead.pop(job.index, 0)
+            self.condition.notify_all()
+        if staged:
+            self._remove(staged[0])
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _should_skip(self, job):
+        return self.stopped or job.index in self.claimed
+
+    def _loop(self):
+        for position, job in enumerate(self.jobs):
+            with self.condition:
+                # Не забегаем дальше, чем на lookahead файлов вперед
+                while not self.stopped and position > self.started_upto + self.lookahead:
+                    self.condition.wait(0.5)
+                if self.stopped:
+                    return
+                if job.index in self.claimed:
+                    continue
+
+            try:
+                self.probe(job)
+                if self.mode == PREFETCH_READAHEAD:
+                    self._read_ahead(job)
+                elif self.mode == PREFETCH_STAGE:
+                    self._stage(job)
+            except Exception:
+                # Предзагрузка - только ускорение: при ошибке задача
+                # просто прочитает исходный файл сама
+                pass
+
+    def _reserve(self, job, size):
+        """Ждем, пока в бюджете появится место; False если ждать нечего"""
+        if size > self.budget_bytes:
+            return False
+        with self.condition:
+            while not self._should_skip(job) and self.used_bytes + size > self.budget_bytes:
+                self.condition.wait(0.5)
+            if self._should_skip(job):
+                return False
+            self.used_bytes += size
+            return True
+
+    def _unreserve(self, size):
+        with self.condition:
+            self.used_bytes -= size
+            self.condition.notify_all()
+
+    def _read_ahead(self, job):
+        """Читаем начало файла (в пределах бюджета), чтобы оно осело в кэше ОС.
+        Прочитанное занимает бюджет, пока задача не закончится (release)"""
+        size = min(os.path.getsize(job.input_file), self.budget_bytes)
+        if not self._reserve(job, size):
+            return
+        with self.condition:
+            keep = not self._should_skip(job)
+            if keep:
+                self.read_ahead[job.index] = size
+        if not keep:
+            self._unreserve(size)
+            return
+
+        with open(job.input_file, 'rb') as f:
+            remaining = size
+            while remaining > 0 and not self._should_skip(job):
+                block = f.read(min(CHUNK_SIZE, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+
+    def _stage(self, job):
+        """Копируем файл в локальную временную папку"""
+        size = os.path.getsize(job.input_file)
+        if not self._reserve(job, size):
+            return
+
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        target = os.path.join(self.scratch_dir, f"{os.getpid()}_{job.index}_{job.name}")
+        partial = target + '.part'
+        try:
+            with open(job.input_file, 'rb') as src, open(partial, 'wb') as dst:
+                while True:
+                    if self._should_skip(job):
+                        raise InterruptedError
+                    block = src.read(CHUNK_SIZE)
+                    if not block:
+                        break
+                    dst.write(block)
+            shutil.copystat(job.input_file, partial)
+            os.replace(partial, target)
+        except (OSError, InterruptedError):
+            self._remove(partial)
+            self._unreserve(size)
+            return
+
+        with self.condition:
+            if self._should_skip(job):
+                keep = False
+            else:
+                self.staged[job.index] = (target, size)
+                keep = True
+        if not keep:
+            self._remove(target)
+            self._unreserve(size)
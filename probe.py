@@ -0,0 +1,401 @@
+import os
+import re
+import json
+import shutil
+import time
+import subprocess
+import threading
+
+import launcher
+
+
+class StreamInfo:
+    """Описание одного потока контейнера"""
+
+    def __init__(self, index, kind, codec, profile=None, bitrate=0,
+                 width=0, height=0, fps=0.0, sample_rate=0, channels=0, pix_fmt=None):
+        self.index = index
+        self.kind = kind          # video / audio / subtitle / data
+        self.codec = codec
+        self.profile = profile
+        self.bitrate = bitrate    # kbps, 0 если неизвестен
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.pix_fmt = pix_fmt
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def __repr__(self):
+        return f"StreamInfo({self.index}, {self.kind}, {self.codec})"
+
+
+class MediaInfo:
+    """Метаданные файла: длительность, битрейт и потоки"""
+
+    def __init__(self, path, duration=0.0, bitrate=0, container='', streams=None):
+        self.path = path
+        self.duration = duration
+        self.bitrate = bitrate
+        self.container = container
+        self.streams = streams or []
+        self.probe_time = 0.0  # сколько читался заголовок, с (0 - взято из кэша)
+
+    @property
+    def video(self):
+        """Первый видеопоток или None"""
+        for stream in self.streams:
+            if stream.kind == 'video':
+                return stream
+        return None
+
+    @property
+    def audio(self):
+        """Первый аудиопоток или None"""
+        for stream in self.streams:
+            if stream.kind == 'audio':
+                return stream
+        return None
+
+    @property
+    def width(self):
+        return self.video.width if self.video else 0
+
+    @property
+    def height(self):
+        return self.video.height if self.video else 0
+
+    @property
+    def fps(self):
+        return self.video.fps if self.video else 0.0
+
+    def to_dict(self):
+        return {
+            'path': self.path,
+            'duration': self.duration,
+            'bitrate': self.bitrate,
+            'container': self.container,
+            'streams': [stream.to_dict() for stream in self.streams]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['path'],
+            duration=data.get('duration', 0.0),
+            bitrate=data.get('bitrate', 0),
+            container=data.get('container', ''),
+            streams=[StreamInfo.from_dict(s) for s in data.get('streams', [])]
+        )
+
+
+# Пока идет анализ, кэш пишется на диск не чаще раза в столько секунд
+SAVE_INTERVAL = 30
+
+
+class ProbeCache:
+    """Кэш результатов probe на диске (ключ: путь, размер, mtime).
+
+    Новые записи копятся в памяти; файл переписывается не чаще раза
+    в SAVE_INTERVAL секунд и в конце пакета (save()). Размер ограничен
+    max_entries, но не меньше самого большого пакета (reserve()), иначе
+    при повторном запуске большой папки ее файлы читались бы заново.
+    """
+
+    def __init__(self, cache_file, max_entries=5000):
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.paths = {}  # путь -> текущий ключ, чтобы заменять запись без перебора
+        self.dirty = False
+        self.saved_at = time.monotonic()
+        self.load()
+
+    @staticmethod
+    def make_key(path):
+        """Ключ кэша; None если файл недоступен"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+    @staticmethod
+    def key_path(key):
+        return key.rsplit('|', 2)[0]
+
+    def load(self):
+        try:
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+        except Exception:
+            self.entries = {}
+        self.paths = {self.key_path(key): key for key in self.entries}
+
+    def reserve(self, count):
+        """В кэш должны поместиться все count файлов пакета"""
+        with self.lock:
+            self.max_entries = max(self.max_entries, count)
+
+    def save(self):
+        """Атомарно записываем кэш (через временный файл), если были новые записи"""
+        tmp_file = self.cache_file + '.tmp'
+        with self.lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            self.saved_at = time.monotonic()
+            try:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(self.entries, f, ensure_ascii=False)
+                os.replace(tmp_file, self.cache_file)
+            except Exception:
+                pass
+
+    def get(self, path):
+        key = self.make_key(path)
+        if key is None:
+            return None
+        with self.lock:
+            data = self.entries.pop(key, None)
+            if data is not None:
+                # В конец: вытесняются давно не нужные записи, а не свежие
+                self.entries[key] = data
+        if data is None:
+            return None
+        try:
+            return MediaInfo.from_dict(data)
+        except Exception:
+            return None
+
+    def put(self, path, info):
+        key = self.make_key(path)
+        if key is None:
+            return
+        path = self.key_path(key)
+        with self.lock:
+            # Старая запись для этого же пути (файл изменился) больше не нужна
+            old_key = self.paths.get(path)
+            if old_key is not None:
+                self.entries.pop(old_key, None)
+            self.entries[key] = info.to_dict()
+            self.paths[path] = key
+
+            # Ограничиваем размер: выбрасываем самые старые записи
+            while len(self.entries) > self.max_entries:
+                old_key = next(iter(self.entries))
+                del self.entries[old_key]
+                if self.paths.get(self.key_path(old_key)) == old_key:
+                    del self.paths[self.key_path(old_key)]
+            self.dirty = True
+            due = time.monotonic() - self.saved_at >= SAVE_INTERVAL
+        if due:
+            self.save()
+
+
+def find_ffprobe(ffmpeg_path):
+    """Ищем ffprobe рядом с ffmpeg или в PATH"""
+    if not ffmpeg_path:
+        return None
+
+    folder, name = os.path.split(ffmpeg_path)
+    probe_name = name.replace('ffmpeg', 'ffprobe')
+    if probe_name == name:
+        return None
+    if folder:
+        candidate = os.path.join(folder, probe_name)
+        if os.path.isfile(candidate):
+            return candidate
+    return shutil.which(probe_name)
+
+
+def _parse_rate(value):
+    """'30000/1001' -> 29.97"""
+    try:
+        if '/' in value:
+            num, den = value.split('/')
+            return float(num) / float(den) if float(den) else 0.0
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _to_int(value, divider=1):
+    try:
+        return int(value) // divider
+    except (TypeError, ValueError):
+        return 0
+
+
+def probe_with_ffprobe(ffprobe_path, input_file, timeout=30):
+    """Читаем метаданные через ffprobe (JSON)"""
+    cmd = [
+        ffprobe_path,
+        '-v', 'error',
+        '-print_format', 'json',
+        '-show_format',
+        '-show_streams',
+        input_file
+    ]
+    result = launcher.run(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding='utf-8',
+        errors='ignore',
+        timeout=timeout
+    )
+    if result.returncode != 0:
+        return None
+
+    data = json.loads(result.stdout or '{}')
+    fmt = data.get('format', {})
+    streams = []
+    for raw in data.get('streams', []):
+        streams.append(StreamInfo(
+            index=raw.get('index', len(streams)),
+            kind=raw.get('codec_type', 'data'),
+            codec=raw.get('codec_name', ''),
+            profile=raw.get('profile'),
+            bitrate=_to_int(raw.get('bit_rate'), 1000),
+            width=raw.get('width', 0),
+            height=raw.get('height', 0),
+            fps=_parse_rate(raw.get('avg_frame_rate') or raw.get('r_frame_rate')),
+            sample_rate=_to_int(raw.get('sample_rate')),
+            channels=raw.get('channels', 0),
+            pix_fmt=raw.get('pix_fmt')
+        ))
+
+    try:
+        duration = float(fmt.get('duration', 0))
+    except (TypeError, ValueError):
+        duration = 0.0
+
+    return MediaInfo(
+        input_file,
+        duration=duration,
+        bitrate=_to_int(fmt.get('bit_rate'), 1000),
+        container=fmt.get('format_name', ''),
+        streams=streams
+    )
+
+
+_INPUT_RE = re.compile(r'^Input #0, ([^ ]+), from')
+_DURATION_RE = re.compile(r'Duration: (\d+):(\d+):([\d.]+)')
+_BITRATE_RE = re.compile(r'bitrate: (\d+) kb/s')
+_STREAM_RE = re.compile(r'Stream #0:(\d+)[^:]*: (Video|Audio|Subtitle|Data): (\w+)(?: \(([^)]*)\))?(.*)$')
+_PIX_FMT_RE = re.compile(r'^[^,]*, (yuv\w+|yuvj\w+|nv\w+|rgb\w+|bgr\w+|gray\w*)')
+_SIZE_RE = re.compile(r'(\d{2,5})x(\d{2,5})')
+_FPS_RE = re.compile(r'([\d.]+) (?:fps|tbr)')
+_STREAM_BITRATE_RE = re.compile(r'(\d+) kb/s')
+_SAMPLE_RATE_RE = re.compile(r'(\d+) Hz, ([^,]+)')
+_CHANNELS = {'mono': 1, 'stereo': 2, '2.1': 3, 'quad': 4, '5.0': 5, '5.1': 6, '6.1': 7, '7.1': 8}
+
+
+def parse_ffmpeg_banner(input_file, text):
+    """Разбираем вывод 'ffmpeg -i file' (заголовок входного файла)"""
+    info = MediaInfo(input_file)
+
+    for line in text.splitlines():
+        line = line.strip()
+
+        match = _INPUT_RE.match(line)
+        if match:
+            info.container = match.group(1).rstrip(',')
+            continue
+
+        if line.startswith('Duration:'):
+            match = _DURATION_RE.search(line)
+            if match:
+                hours, minutes, seconds = match.groups()
+                info.duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+            match = _BITRATE_RE.search(line)
+            if match:
+                info.bitrate = int(match.group(1))
+            continue
+
+        match = _STREAM_RE.search(line)
+        if not match:
+            continue
+
+        index, kind, codec, paren, rest = match.groups()
+        # В первых скобках либо профиль "(Main)", либо тег "(avc1 / 0x...)"
+        profile = paren if paren and '/ 0x' not in paren else None
+        stream = StreamInfo(int(index), kind.lower(), codec, profile=profile)
+
+        bitrate = _STREAM_BITRATE_RE.search(rest)
+        if bitrate:
+            stream.bitrate = int(bitrate.group(1))
+
+        if stream.kind == 'video':
+            size = _SIZE_RE.search(rest)
+            if size:
+                stream.width, stream.height = int(size.group(1)), int(size.group(2))
+            fps = _FPS_RE.search(rest)
+            if fps:
+                stream.fps = float(fps.group(1))
+            pix_fmt = _PIX_FMT_RE.search(rest)
+            if pix_fmt:
+                stream.pix_fmt = pix_fmt.group(1)
+        elif stream.kind == 'audio':
+            sample = _SAMPLE_RATE_RE.search(rest)
+            if sample:
+                stream.sample_rate = int(sample.group(1))
+                layout = sample.group(2).split('(')[0].strip()
+                stream.channels = _CHANNELS.get(layout, 0)
+
+        info.streams.append(stream)
+
+    return info
+
+
+def probe_with_ffmpeg(ffmpeg_path, input_file, timeout=30):
+    """Читаем только заголовок через 'ffmpeg -i' без декодирования"""
+    cmd = [ffmpeg_path, '-hide_banner', '-i', input_file]
+    result = launcher.run(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding='utf-8',
+        errors='ignore',
+        timeout=timeout
+    )
+    # Без выходного файла ffmpeg всегда завершается с ошибкой,
+    # поэтому смотрим только на то, удалось ли прочитать заголовок
+    if 'Input #0' not in result.stderr:
+        return None
+    return parse_ffmpeg_banner(input_file, result.stderr)
+
+
+def probe_media(ffmpeg_path, input_file, cache=None, ffprobe_path=None):
+    """Возвращаем MediaInfo для файла (из кэша или через probe)"""
+    if cache is not None:
+        info = cache.get(input_file)
+        if info is not None:
+            return info
+
+    info = None
+    start = time.perf_counter()
+    try:
+        if ffprobe_path:
+            info = probe_with_ffprobe(ffprobe_path, input_file)
+        if info is None:
+            info = probe_with_ffmpeg(ffmpeg_path, input_file)
+    except Exception:
+        info = None
+
+    if info is not None:
+        info.probe_time = time.perf_counter() - start
+    if info is not None and cache is not None:
+        cache.put(input_file, info)
+    return info
+
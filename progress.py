@@ -0,0 +1,155 @@
+import re
+import time
+import threading
+from collections import deque
+
+
+# Как часто отдаем прогресс наружу (10 раз в секунду)
+PROGRESS_INTERVAL = 0.1
+
+
+class ProgressSnapshot:
+    """Состояние кодирования из одного блока '-progress'"""
+
+    def __init__(self, values):
+        self.out_time = _microseconds(values.get('out_time_us') or values.get('out_time_ms'))
+        self.frame = _int(values.get('frame'))
+        self.fps = _float(values.get('fps'))
+        self.speed = _float(values.get('speed', '').rstrip('x'))
+        self.total_size = _int(values.get('total_size'))
+        self.bitrate = values.get('bitrate', '').strip()
+        self.done = values.get('progress') == 'end'
+
+    def to_dict(self):
+        return {
+            'time': round(self.out_time, 2) if self.out_time is not None else None,
+            'frame': self.frame,
+            'fps': self.fps,
+            'speed': self.speed,
+            'size': self.total_size
+        }
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _microseconds(value):
+    """Секунды или None, если ffmpeg пишет N/A (например, в конце файла)"""
+    # В ffmpeg out_time_ms исторически тоже в микросекундах
+    try:
+        return max(0, int(value)) / 1000000
+    except (TypeError, ValueError):
+        return None
+
+
+class ProgressParser:
+    """Разбор вывода 'ffmpeg -progress pipe:1'.
+
+    ffmpeg пишет блоки строк key=value, каждый блок заканчивается
+    строкой progress=continue или progress=end.
+    """
+
+    def __init__(self):
+        self.values = {}
+
+    def feed(self, line):
+        """Принимает строку; возвращает ProgressSnapshot в конце блока"""
+        if isinstance(line, bytes):
+            line = line.decode('ascii', 'ignore')
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            return None
+
+        self.values[key] = value
+        if key != 'progress':
+            return None
+
+        snapshot = ProgressSnapshot(self.values)
+        self.values = {}
+        return snapshot
+
+
+# Метка уровня при '-loglevel level+...': "[mp4 @ 0x...] [info] текст"
+_LEVEL_TAG = re.compile(r'^((?:\[[^\]]* @ [^\]]*\] )*)\[(\w+)\] ')
+
+# Уровни, строки которых не хранятся (идут в on_info)
+INFO_LEVELS = ('info', 'verbose', 'debug', 'trace')
+
+
+class StderrBuffer:
+    """Читает stderr процесса в отдельном потоке и хранит последние строки.
+
+    Если ffmpeg запущен с '-loglevel level+info', строки уровня info
+    не засоряют буфер, а передаются в on_info (например, для этапов работы).
+    Остальные строки проверяет classifier (ffmpeg_errors.ErrorClassifier):
+    на безнадежной ошибке вызывается on_fatal(категория).
+    """
+
+    def __init__(self, stream, max_lines=200, on_info=None, classifier=None, on_fatal=None):
+        self.stream = stream
+        self.lines = deque(maxlen=max_lines)
+        self.on_info = on_info
+        self.classifier = classifier
+        self.on_fatal = on_fatal
+        self.thread = threading.Thread(target=self._read, daemon=True)
+        self.thread.start()
+
+    def _read(self):
+        try:
+            for raw in iter(self.stream.readline, b''):
+                line = raw.decode('utf-8', 'ignore').rstrip()
+                if line:
+                    self.on_line(line)
+        except (OSError, ValueError):
+            pass
+
+    def on_line(self, line):
+        match = _LEVEL_TAG.match(line)
+        if match:
+            # Метку уровня убираем, префикс "[mp4 @ 0x...]" оставляем
+            line = match.group(1) + line[match.end():]
+            if match.group(2) in INFO_LEVELS:
+                if self.on_info:
+                    self.on_info(line)
+                return
+        self.lines.append(line)
+
+        if self.classifier is not None:
+            category = self.classifier.feed(line)
+            if category and self.on_fatal:
+                self.on_fatal(category)
+
+    def join(self, timeout=5):
+        self.thread.join(timeout)
+
+    def tail(self, count=10):
+        return list(self.lines)[-count:]
+
+    def last_line(self):
+        return self.lines[-1] if self.lines else ""
+
+
+class Throttle:
+    """Пропускает не чаще одного события за interval секунд"""
+
+    def __init__(self, interval=PROGRESS_INTERVAL):
+        self.interval = interval
+        self.last = 0.0
+
+    def ready(self):
+        now = time.monotonic()
+        if now - self.last >= self.interval:
+            self.last = now
+            return True
+        return False
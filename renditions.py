@@ -0,0 +1,143 @@
+import os
+
+from journal import partial_path, finalize_output, discard_partial
+from encoders import EncoderChoice
+
+
+class Rendition:
+    """Один вариант качества: разрешение и битрейты"""
+
+    def __init__(self, name, height, video_bitrate, audio_bitrate=128, profile='main'):
+        self.name = name
+        self.height = int(height)
+        self.video_bitrate = int(video_bitrate)
+        self.audio_bitrate = int(audio_bitrate)
+        self.profile = profile
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['height'], data['video_bitrate'],
+                   data.get('audio_bitrate', 128), data.get('profile', 'main'))
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'height': self.height,
+            'video_bitrate': self.video_bitrate,
+            'audio_bitrate': self.audio_bitrate,
+            'profile': self.profile
+        }
+
+
+# Готовые наборы качеств (можно дополнить через "ladders" в настройках)
+LADDERS = {
+    'web': [
+        Rendition('480p', 480, 1200, 96),
+        Rendition('720p', 720, 2500, 128),
+        Rendition('1080p', 1080, 5000, 160),
+    ],
+    'mobile': [
+        Rendition('360p', 360, 700, 64, 'baseline'),
+        Rendition('480p', 480, 1200, 96, 'baseline'),
+    ],
+}
+
+
+def get_ladder(name, custom=None):
+    """Набор качеств по имени: сначала из настроек, потом встроенные"""
+    if custom and name in custom:
+        return [Rendition.from_dict(item) for item in custom[name]]
+    return LADDERS.get(name)
+
+
+class RenditionOutput:
+    """Выходной файл одного качества внутри задачи"""
+
+    def __init__(self, rendition, output_file):
+        self.rendition = rendition
+        self.name = rendition.name
+        self.output_file = output_file
+        self.partial_file = partial_path(output_file)
+        self.size = 0
+        self.done = False
+
+    def current_size(self):
+        try:
+            return os.path.getsize(self.partial_file)
+        except OSError:
+            return 0
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'output': self.output_file,
+            'size': self.size,
+            'done': self.done
+        }
+
+
+def rendition_outputs(ladder, output_dir, base_name):
+    """Файлы результатов: имя_480p.mp4, имя_720p.mp4, ..."""
+    return [RenditionOutput(rendition, os.path.join(output_dir, f"{base_name}_{rendition.name}.mp4"))
+            for rendition in ladder]
+
+
+def ladder_filter(outputs):
+    """Граф фильтров: декодируем один раз, split на все качества и scale"""
+    labels = ''.join(f"[v{i}]" for i in range(len(outputs)))
+    chains = [f"[0:v]split={len(outputs)}{labels}"]
+    for i, output in enumerate(outputs):
+        # Не увеличиваем разрешение сверх исходного; высота и ширина четные
+        height = f"trunc(min(ih\\,{output.rendition.height})/2)*2"
+        chains.append(f"[v{i}]scale=-2:{height}[out{i}]")
+    return ';'.join(chains)
+
+
+def ladder_command(ffmpeg_path, input_file, outputs, threads=0, encoder=None,
+                   movflags='+faststart', loglevel='warning', input_args=()):
+    """Команда ffmpeg для всех качеств сразу (один процесс, одно декодирование)"""
+    encoder = encoder or EncoderChoice('libx264', 'medium')
+    cmd = [
+        ffmpeg_path,
+        *input_args,
+        '-i', input_file,
+        '-filter_complex', ladder_filter(outputs),
+        '-threads', str(threads or 0),
+        '-nostats',
+        '-progress', 'pipe:1',
+        '-loglevel', loglevel,
+        '-y'
+    ]
+    for i, output in enumerate(outputs):
+        rendition = output.rendition
+        video_bitrate = f"{rendition.video_bitrate}k"
+        cmd += [
+            '-map', f"[out{i}]",
+            '-map', '0:a:0?',  # аудио, если есть
+            *encoder.video_args(rendition.profile),
+            '-b:v', video_bitrate,
+            '-maxrate', video_bitrate,
+            '-bufsize', f"{rendition.video_bitrate * 2}k",
+            '-c:a', 'aac',
+            '-b:a', f"{rendition.audio_bitrate}k",
+            '-movflags', movflags,
+            output.partial_file
+        ]
+    return cmd
+
+
+def finalize_outputs(outputs):
+    """Ставит все готовые качества на место; (успех, сообщение)"""
+    for output in outputs:
+        try:
+            output.size = output.current_size()
+            finalize_output(output.partial_file, output.output_file)
+            output.done = True
+        except OSError as e:
+            return False, f"Не удалось сохранить {output.name}: {str(e)}"
+    return True, ', '.join(output.output_file for output in outputs)
+
+
+def discard_outputs(outputs):
+    for output in outputs:
+        discard_partial(output.partial_file)
@@ -0,0 +1,274 @@
+import os
+import re
+import math
+import shutil
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import launcher
+from split_encode import SplitEncoder
+
+
+# Фрагмент файла задается как в Media Fragments URI: "видео.mp4#t=начало,конец"
+CLIP_MARK = '#t='
+
+# В каком окне после начала (и до конца) фрагмента ищем ключевой кадр, с
+KEYFRAME_SEARCH = 30
+
+# Контейнер частей: в MPEG-TS параметры H.264 идут вместе с кадрами
+PART_EXT = '.ts'
+
+# profile_idc из SPS исходника -> профиль libx264 (остальные повторить нельзя)
+X264_PROFILES = {66: 'baseline', 77: 'main', 100: 'high', 110: 'high10',
+                 122: 'high422', 244: 'high444'}
+
+
+def parse_time(text):
+    """'90', '1:30', '01:02:03.5' -> секунды; пустая строка -> None"""
+    text = text.strip()
+    if not text:
+        return None
+    seconds = 0.0
+    for part in text.split(':'):
+        seconds = seconds * 60 + float(part)
+    if seconds < 0:
+        raise ValueError(text)
+    return seconds
+
+
+def format_time(seconds):
+    """Секунды -> 'ЧЧ:ММ:СС' (с долями, если есть)"""
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{secs:06.3f}".rstrip('0').rstrip('.')
+
+
+def split_clip(spec):
+    """'путь#t=начало,конец' -> (путь, начало или None, конец или None)"""
+    path, mark, clip = spec.rpartition(CLIP_MARK)
+    if not mark:
+        return spec, None, None
+    try:
+        start, _, end = clip.partition(',')
+        start, end = parse_time(start), parse_time(end)
+    except ValueError:
+        return spec, None, None  # это просто имя файла с "#t="
+    if end is not None and start is not None and end <= start:
+        return spec, None, None
+    return path, start, end
+
+
+def with_clip(path, start=None, end=None):
+    """Обратно в строку для очереди и журнала"""
+    if start is None and end is None:
+        return path
+    start_text = format_time(start) if start is not None else ''
+    end_text = format_time(end) if end is not None else ''
+    return f"{path}{CLIP_MARK}{start_text},{end_text}"
+
+
+def clip_suffix(start, end):
+    """Добавка к имени результата, чтобы фрагменты не затирали друг друга и целый файл"""
+    def short(seconds):
+        hours, rest = divmod(int(seconds or 0), 3600)
+        minutes, secs = divmod(rest, 60)
+        return f"{hours:02d}{minutes:02d}{secs:02d}"
+    return f"_{short(start)}-{short(end) if end is not None else 'end'}"
+
+
+def seek_args(start, end):
+    """Поиск на стороне входа: ffmpeg читает файл сразу с нужного места"""
+    args = []
+    if start:
+        args += ['-ss', f"{start:.3f}"]
+    if end is not None:
+        args += ['-to', f"{end:.3f}"]
+    return args
+
+
+def ms_up(seconds):
+    """Вверх до миллисекунды: -ss не окажется раньше ключевого кадра"""
+    return math.ceil(seconds * 1000) / 1000
+
+
+def ms_down(seconds):
+    """Вниз до миллисекунды: -to не захватит сам ключевой кадр"""
+    return math.floor(seconds * 1000) / 1000
+
+
+_PTS = re.compile(r'pts_time:(-?[\d.]+)')
+_START = re.compile(r'Duration: .*?, start: (-?[\d.]+)')
+
+
+def find_keyframes(ffmpeg_path, input_file, start, end):
+    """Позиции ключевых кадров видео между start и end (в тех же единицах, что -ss).
+
+    Декодируются только ключевые кадры (-skip_frame nokey), поэтому это быстро.
+    """
+    cmd = [
+        ffmpeg_path, '-hide_banner', '-nostdin', '-nostats',
+        '-skip_frame', 'nokey', *seek_args(start, end), '-copyts', '-i', input_file,
+        '-map', '0:v:0', '-vf', 'showinfo', '-f', 'null', '-'
+    ]
+    try:
+        result = launcher.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              encoding='utf-8', errors='ignore', timeout=120)
+    except Exception:
+        return []
+    if result.returncode != 0:
+        return []
+
+    # С -copyts время кадров - как в файле; -ss считается от начала файла
+    match = _START.search(result.stderr)
+    offset = float(match.group(1)) if match else 0.0
+    keyframes = [float(value) - offset for value in _PTS.findall(result.stderr)]
+    return sorted(t for t in keyframes if start - 0.001 <= t <= end + 0.001)
+
+
+_SPS_FIELD = re.compile(r'\s(profile_idc|constraint_set3_flag|level_idc)\s+\S+ = (\d+)')
+
+
+def read_sps(ffmpeg_path, input_file):
+    """Поля SPS первого кадра видео: {'profile_idc', 'level_idc', ...} или None.
+
+    ffmpeg разбирает только заголовки первого пакета (trace_headers), без декодирования.
+    """
+    cmd = [
+        ffmpeg_path, '-hide_banner', '-nostdin', '-nostats', '-i', input_file,
+        '-map', '0:v:0', '-c:v', 'copy', '-bsf:v', 'trace_headers', '-frames:v', '1',
+        '-f', 'null', '-'
+    ]
+    try:
+        result = launcher.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              encoding='utf-8', errors='ignore', timeout=60)
+    except Exception:
+        return None
+    sps = {}
+    for name, value in _SPS_FIELD.findall(result.stderr):
+        sps.setdefault(name, int(value))  # первый SPS
+    if 'profile_idc' not in sps or 'level_idc' not in sps:
+        return None
+    return sps
+
+
+def edge_video_args(sps, video, preset='medium', available=None):
+    """Параметры libx264 для краев под SPS исходника: тот же профиль, уровень,
+    формат пикселей и размер кадра. Иначе у склеенного MP4 (одна запись avcC)
+    окажутся разные наборы параметров. None - повторить исходник нельзя"""
+    if sps is None or video is None or not video.pix_fmt or not video.width or not video.height:
+        return None
+    if available is not None and 'libx264' not in available:
+        return None
+    profile = X264_PROFILES.get(sps['profile_idc'])
+    if profile is None:
+        return None
+    level = sps['level_idc']
+    if level == 9 or (level == 11 and profile == 'baseline' and sps.get('constraint_set3_flag')):
+        level = '1b'
+    else:
+        level = f"{level // 10}.{level % 10}"
+    return ['-c:v', 'libx264', '-preset', preset or 'medium', '-profile:v', profile,
+            '-level:v', level, '-pix_fmt', video.pix_fmt, '-s', f"{video.width}x{video.height}"]
+
+
+class SmartCutter(SplitEncoder):
+    """Быстрая нарезка: между ключевыми кадрами видео копируется,
+    перекодируются только края фрагмента (до первого и после последнего
+    ключевого кадра). Аудио фрагмента кодируется целиком - это дешево.
+
+    Части склеиваются через MPEG-TS: там параметры H.264 идут вместе
+    с кадрами. Края кодируются libx264 с профилем, уровнем, форматом
+    пикселей и размером исходника (edge_video_args), поэтому они
+    совместимы со скопированной серединой. Только для исходников в H.264.
+    """
+
+    def cut_points(self, input_file, start, end):
+        """(первый ключевой кадр, последний ключевой кадр) внутри фрагмента или None"""
+        head = find_keyframes(self.ffmpeg_path, input_file, start,
+                              min(end, start + KEYFRAME_SEARCH))
+        if not head:
+            return None
+        tail = find_keyframes(self.ffmpeg_path, input_file,
+                              max(head[0], end - KEYFRAME_SEARCH), end)
+        if not tail or tail[-1] <= head[0]:
+            return None
+        return head[0], tail[-1]
+
+    # Границы частей - времена ключевых кадров; seek_args округляет до мс, и
+    # округление в обе стороны здесь ломает стык: -ss чуть раньше кадра при
+    # копировании берет весь предыдущий GOP (повтор видео и рассинхрон со
+    # звуком), -to чуть позже кадра при кодировании дублирует его
+
+    def encode_part(self, input_file, start, end, target, on_time):
+        cmd = self._base_cmd() + seek_args(ms_down(start), ms_down(end)) + [
+            '-i', input_file, '-map', '0:v:0']
+        cmd += self.video_args
+        if self.threads_per_worker:
+            cmd += ['-threads', str(self.threads_per_worker)]
+        cmd += ['-an', '-progress', 'pipe:1', '-y', target]
+        return self._run(cmd, on_time)
+
+    def copy_part(self, input_file, start, end, target, on_time):
+        cmd = self._base_cmd() + seek_args(ms_up(start), ms_down(end)) + [
+            '-i', input_file, '-map', '0:v:0', '-c:v', 'copy', '-an',
+            '-progress', 'pipe:1', '-y', target
+        ]
+        return self._run(cmd, on_time)
+
+    def encode_audio_clip(self, input_file, start, end, audio_file):
+        cmd = self._base_cmd() + seek_args(start, end) + [
+            '-i', input_file, '-map', '0:a:0', '-vn'
+        ] + self.audio_args + ['-y', audio_file]
+        return self._run(cmd)
+
+    def cut(self, input_file, output_file, start, end, has_audio=True, on_progress=None):
+        """Нарезает [start, end]; (успех, сообщение). None - нарезка без
+        перекодирования невозможна (нет ключевых кадров внутри фрагмента)"""
+        points = self.cut_points(input_file, start, end)
+        if points is None:
+            self.finished = True
+            return None
+        first_key, last_key = points
+
+        work_dir = tempfile.mkdtemp(prefix='.cut_', dir=os.path.dirname(os.path.abspath(output_file)))
+        try:
+            # (начало, конец, копировать?) - края короче кадра не нужны
+            parts = [(s, e, copy) for s, e, copy in ((start, first_key, False),
+                                                       (first_key, last_key, True),
+                                                       (last_key, end, False))
+                     if e - s > 0.01]
+            files = [os.path.join(work_dir, f"part_{i}{PART_EXT}") for i in range(len(parts))]
+            done = [0.0] * len(parts)
+
+            def make_callback(i):
+                def callback(current_time):
+                    done[i] = min(current_time, parts[i][1] - parts[i][0])
+                    if on_progress:
+                        on_progress(sum(done))
+                return callback
+
+            audio_file = os.path.join(work_dir, 'audio.m4a') if has_audio else None
+            with ThreadPoolExecutor(max_workers=len(parts) + 1) as pool:
+                audio_future = (pool.submit(self.encode_audio_clip, input_file, start, end, audio_file)
+                                if has_audio else None)
+                futures = [
+                    pool.submit(self.copy_part if copy else self.encode_part,
+                                input_file, s, e, files[i], make_callback(i))
+                    for i, (s, e, copy) in enumerate(parts)
+                ]
+                results = [future.result() for future in futures]
+                audio_ok = audio_future.result() if audio_future else True
+
+            if self.cancelled:
+                return False, "Отменено"
+            if not all(results):
+                return False, self.error_message("Ошибка нарезки")
+            if not audio_ok:
+                return False, self.error_message("Ошибка кодирования аудио")
+            if not self.concat(files, audio_file, output_file, work_dir):
+                return False, self.error_message("Ошибка склейки фрагмента")
+            return True, output_file
+        finally:
+            self.finished = True
+            shutil.rmtree(work_dir, ignore_errors=True)
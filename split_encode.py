@@ -0,0 +1,222 @@
+import os
+import csv
+import shutil
+import tempfile
+import threading
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import launcher
+from progress import ProgressParser, StderrBuffer
+
+
+# Короче этого сегменты не делаем: накладные расходы на запуск ffmpeg
+# и на ключевой кадр в начале каждого сегмента перестают окупаться
+MIN_SEGMENT_SECONDS = 30
+
+# Файлы короче этого кодируются обычным способом
+SPLIT_MIN_DURATION = 10 * 60
+
+
+def choose_segment_time(duration, workers):
+    """Длина сегмента: ~3 сегмента на воркер для равномерной загрузки"""
+    if duration <= 0:
+        return MIN_SEGMENT_SECONDS * 4
+    return max(MIN_SEGMENT_SECONDS, duration / (max(1, workers) * 3))
+
+
+class SplitEncoder:
+    """Параллельное кодирование одного длинного файла по сегментам.
+
+    Видео режется без перекодирования по ключевым кадрам (segment muxer),
+    сегменты кодируются параллельно с одинаковыми настройками, затем
+    склеиваются concat demuxer'ом без перекодирования. Аудио кодируется
+    одним проходом, чтобы на стыках не было щелчков.
+
+    Для ConversionJob объект ведет себя как процесс (poll/terminate).
+    stderr всех ffmpeg проверяет classifier (ffmpeg_errors.ErrorClassifier):
+    на безнадежной ошибке вызывается on_fatal(категория).
+    """
+
+    def __init__(self, ffmpeg_path, video_args, audio_args, workers=2,
+                 threads_per_worker=0, segment_time=None, movflags='+faststart',
+                 priority=launcher.PRIORITY_NORMAL, classifier=None, on_fatal=None):
+        self.ffmpeg_path = ffmpeg_path
+        self.video_args = list(video_args)
+        self.audio_args = list(audio_args)
+        self.workers = max(1, workers)
+        self.threads_per_worker = threads_per_worker
+        self.segment_time = segment_time
+        self.movflags = movflags
+        self.priority = priority
+        self.classifier = classifier
+        self.on_fatal = on_fatal
+
+        self.lock = threading.Lock()
+        self.processes = []
+        self.cancelled = False
+        self.finished = False
+        self.errors = deque(maxlen=20)
+
+    # --- интерфейс "процесса" для ConversionJob ---
+
+    def poll(self):
+        return 0 if self.finished else None
+
+    def terminate(self):
+        """Останавливает все запущенные ffmpeg"""
+        with self.lock:
+            self.cancelled = True
+            processes = list(self.processes)
+        for process in processes:
+            launcher.terminate(process)
+
+    # --- запуск ffmpeg ---
+
+    def _run(self, cmd, on_time=None):
+        """Запускает ffmpeg и ждет завершения; True при успехе"""
+        with self.lock:
+            if self.cancelled:
+                return False
+            process = launcher.popen(
+                cmd,
+                priority=self.priority,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+            self.processes.append(process)
+
+        try:
+            stderr = StderrBuffer(process.stderr, max_lines=20,
+                                  classifier=self.classifier, on_fatal=self.on_fatal)
+            parser = ProgressParser()
+            for line in iter(process.stdout.readline, b''):
+                snapshot = parser.feed(line)
+                if snapshot is not None and snapshot.out_time is not None and on_time:
+                    on_time(snapshot.out_time)
+            process.wait()
+            stderr.join()
+            self.errors.extend(stderr.tail())
+        finally:
+            with self.lock:
+                self.processes.remove(process)
+
+        return process.returncode == 0 and not self.cancelled
+
+    def _base_cmd(self):
+        return [self.ffmpeg_path, '-hide_banner', '-nostdin', '-nostats', '-loglevel', 'error']
+
+    def split(self, input_file, work_dir, segment_time):
+        """Режем видеопоток на сегменты по ключевым кадрам (без перекодирования)"""
+        list_file = os.path.join(work_dir, 'segments.csv')
+        cmd = self._base_cmd() + [
+            '-i', input_file,
+            '-map', '0:v:0',
+            '-c', 'copy',
+            '-f', 'segment',
+            '-segment_time', f"{segment_time:.3f}",
+            '-segment_list', list_file,
+            '-segment_list_type', 'csv',
+            '-reset_timestamps', '1',
+            '-y',
+            os.path.join(work_dir, 'src_%05d.mkv')
+        ]
+        if not self._run(cmd):
+            return None
+
+        # Строки списка: имя файла, начало, конец
+        segments = []
+        with open(list_file, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.reader(f):
+                if len(row) >= 3:
+                    name, start, end = row[0], float(row[1]), float(row[2])
+                    segments.append((os.path.join(work_dir, name), end - start))
+        return segments
+
+    def encode_audio(self, input_file, audio_file, on_time):
+        cmd = self._base_cmd() + [
+            '-i', input_file,
+            '-map', '0:a:0',
+            '-vn',
+        ] + self.audio_args + [
+            '-progress', 'pipe:1',
+            '-y',
+            audio_file
+        ]
+        return self._run(cmd, on_time)
+
+    def encode_segment(self, source, target, on_time):
+        cmd = self._base_cmd() + ['-i', source] + self.video_args
+        if self.threads_per_worker:
+            cmd += ['-threads', str(self.threads_per_worker)]
+        cmd += ['-an', '-progress', 'pipe:1', '-y', target]
+        return self._run(cmd, on_time)
+
+    def concat(self, encoded, audio_file, output_file, work_dir):
+        """Склеиваем сегменты concat demuxer'ом и добавляем аудио (-c copy)"""
+        concat_list = os.path.join(work_dir, 'concat.txt')
+        with open(concat_list, 'w', encoding='utf-8') as f:
+            for path in encoded:
+                escaped = path.replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+
+        cmd = self._base_cmd() + ['-f', 'concat', '-safe', '0', '-i', concat_list]
+        if audio_file:
+            cmd += ['-i', audio_file, '-map', '0:v:0', '-map', '1:a:0']
+        cmd += ['-c', 'copy']
+        if self.movflags:
+            cmd += ['-movflags', self.movflags]
+        cmd += ['-y', output_file]
+        return self._run(cmd)
+
+    def encode(self, input_file, output_file, duration, has_audio=True, on_progress=None):
+        """Кодирует файл; on_progress(секунды) получает суммарный прогресс"""
+        work_dir = tempfile.mkdtemp(prefix='.split_', dir=os.path.dirname(os.path.abspath(output_file)))
+        try:
+            segment_time = self.segment_time or choose_segment_time(duration, self.workers)
+            segments = self.split(input_file, work_dir, segment_time)
+            if not segments:
+                return False, self.error_message("Не удалось разрезать файл на сегменты")
+
+            # Прогресс: сумма закодированных секунд по всем сегментам
+            done = [0.0] * len(segments)
+
+            def make_callback(i):
+                def callback(current_time):
+                    done[i] = min(current_time, segments[i][1])
+                    if on_progress:
+                        on_progress(sum(done))
+                return callback
+
+            audio_file = os.path.join(work_dir, 'audio.m4a') if has_audio else None
+            encoded = [os.path.join(work_dir, f"enc_{i:05d}.mkv") for i in range(len(segments))]
+
+            with ThreadPoolExecutor(max_workers=self.workers + (1 if has_audio else 0)) as pool:
+                audio_future = pool.submit(self.encode_audio, input_file, audio_file, None) if has_audio else None
+                futures = [
+                    pool.submit(self.encode_segment, source, encoded[i], make_callback(i))
+                    for i, (source, _) in enumerate(segments)
+                ]
+                results = [future.result() for future in futures]
+                audio_ok = audio_future.result() if audio_future else True
+
+            if self.cancelled:
+                return False, "Отменено"
+            if not all(results):
+                return False, self.error_message("Ошибка кодирования сегмента")
+            if not audio_ok:
+                return False, self.error_message("Ошибка кодирования аудио")
+
+            if not self.concat(encoded, audio_file, output_file, work_dir):
+                return False, self.error_message("Ошибка склейки сегментов")
+
+            return True, output_file
+        finally:
+            self.finished = True
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def error_message(self, text):
+        if self.errors:
+            return f"{text}: {self.errors[-1]}"
+        return text
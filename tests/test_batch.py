@@ -0,0 +1,144 @@
+import threading
+import time
+
+from batch import BatchScheduler, ConversionJob, batch_percent, default_job_count, split_threads
+
+
+def test_default_job_count():
+    assert default_job_count(4) == 1
+    assert default_job_count(16) == 2
+    assert default_job_count(64) == 8
+
+
+def test_split_threads():
+    assert split_threads(16, 4) == 4
+    assert split_threads(4, 8) == 1
+    assert split_threads(6, 0) == 6
+
+
+def make_jobs(count):
+    return [ConversionJob(i, f"{i}.avi", f"{i}.mp4") for i in range(count)]
+
+
+class Counter:
+    """run_job, который помнит, сколько задач шло одновременно"""
+
+    def __init__(self, seconds=0.05, fail=()):
+        self.seconds = seconds
+        self.fail = fail
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def __call__(self, job):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.seconds)
+        with self.lock:
+            self.running -= 1
+        if job.index in self.fail:
+            raise RuntimeError("сбой")
+        return True, job.output_file
+
+
+def test_runs_all_jobs_within_limit():
+    counter = Counter()
+    jobs = make_jobs(6)
+    BatchScheduler(counter, max_jobs=2, total_threads=8).run(jobs)
+    assert counter.peak == 2
+    assert all(job.status == ConversionJob.DONE for job in jobs)
+    assert all(job.threads == 4 for job in jobs)
+
+
+def test_failures_and_exceptions():
+    jobs = make_jobs(3)
+    BatchScheduler(Counter(fail=(1,)), max_jobs=3).run(jobs)
+    assert [job.status for job in jobs] == [ConversionJob.DONE, ConversionJob.FAILED, ConversionJob.DONE]
+    assert "сбой" in jobs[1].result
+
+
+class FakeProcess:
+    """ffmpeg, который работает до terminate()"""
+
+    def __init__(self):
+        self.stopped = threading.Event()
+
+    def poll(self):
+        return 0 if self.stopped.is_set() else None
+
+    def terminate(self):
+        self.stopped.set()
+
+
+def test_cancel_stops_running_and_pending_jobs():
+    started = threading.Semaphore(0)
+
+    def run_job(job):
+        job.process = FakeProcess()
+        started.release()
+        job.process.stopped.wait(5)
+        return False, "остановлено"
+
+    scheduler = BatchScheduler(run_job, max_jobs=2)
+    jobs = make_jobs(5)
+    thread = threading.Thread(target=scheduler.run, args=(jobs,))
+    thread.start()
+    started.acquire(timeout=5)
+    started.acquire(timeout=5)
+    scheduler.cancel()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert all(job.status == ConversionJob.CANCELLED for job in jobs)
+    assert all(job.process is None for job in jobs[2:])  # не запускались
+
+
+def test_batch_percent_weighted_by_duration():
+    jobs = make_jobs(2)
+    jobs[0].duration, jobs[0].status = 30, ConversionJob.DONE
+    jobs[1].duration, jobs[1].current_time = 90, 45
+    assert batch_percent(jobs) == 62.5
+
+
+def test_admission_holds_new_jobs_but_one_always_runs():
+    counter = Counter()
+    jobs = make_jobs(4)
+    BatchScheduler(counter, max_jobs=4, admission=lambda: False).run(jobs)
+    assert counter.peak == 1
+    assert all(job.status == ConversionJob.DONE for job in jobs)
+
+
+def test_broken_admission_does_not_stop_batch():
+    def admission():
+        raise OSError("нет данных о памяти")
+
+    counter = Counter()
+    BatchScheduler(counter, max_jobs=3, admission=admission).run(make_jobs(3))
+    assert counter.peak == 3
+
+
+def test_set_limit():
+    counter = Counter()
+    scheduler = BatchScheduler(counter, max_jobs=4)
+    scheduler.set_limit(2)
+    scheduler.run(make_jobs(6))
+    assert counter.peak == 2
+    scheduler.set_limit(0)
+    assert scheduler.limit == 1
+
+
+def test_keep_open_takes_jobs_until_closed():
+    counter = Counter(seconds=0.01)
+    scheduler = BatchScheduler(counter, max_jobs=2)
+    thread = threading.Thread(target=scheduler.run, args=([],), kwargs={'keep_open': True})
+    thread.start()
+    jobs = make_jobs(3)
+    for job in jobs:
+        scheduler.submit(job)
+    time.sleep(0.2)
+    assert thread.is_alive()  # ждет новых задач
+    scheduler.close()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert all(job.status == ConversionJob.DONE for job in jobs)
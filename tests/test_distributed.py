@@ -0,0 +1,46 @@
+import pytest
+
+from distributed import Agent, check_token, is_loopback, parse_address, sign
+
+
+def test_parse_address():
+    assert parse_address('192.168.1.10:9000') == ('192.168.1.10', 9000)
+    assert parse_address('9000') == ('127.0.0.1', 9000)
+    assert parse_address('server') == ('server', 8765)
+
+
+def test_token_required_off_loopback():
+    assert is_loopback('127.0.0.1') and is_loopback('localhost') and is_loopback('::1')
+    assert not is_loopback('0.0.0.0')
+    check_token('127.0.0.1', '')
+    check_token('0.0.0.0', 'секрет')
+    with pytest.raises(ValueError):
+        check_token('0.0.0.0', '')
+
+
+def test_sign_depends_on_role_key_and_nonces():
+    proof = sign('key', 'agent', 'a', 'b')
+    assert proof == sign('key', 'agent', 'a', 'b')
+    assert proof != sign('key', 'coordinator', 'a', 'b')
+    assert proof != sign('other', 'agent', 'a', 'b')
+    assert proof != sign('key', 'agent', 'b', 'a')
+
+
+def test_agent_prepares_command():
+    agent = Agent(('127.0.0.1', 8765), '/opt/ffmpeg', slots=2,
+                  path_map=[('\\\\server\\video', '/mnt/video')])
+    agent.threads = 3
+    agent.encoders = ['libx264', 'aac']
+    cmd = agent.prepare(['C:\\ffmpeg.exe', '-i', '\\\\server\\video\\a.mkv', '-threads', '8',
+                         '-c:v', 'libopenh264', '-profile:v', 'constrained_baseline',
+                         '-c:a', 'aac', '\\\\server\\video\\out\\a.mp4'])
+    assert cmd == ['/opt/ffmpeg', '-i', '/mnt/video/a.mkv', '-threads', '3',
+                   '-c:v', 'libx264', '-profile:v', 'baseline',
+                   '-c:a', 'aac', '/mnt/video/out/a.mp4']
+
+
+def test_agent_keeps_available_encoder():
+    agent = Agent(('127.0.0.1', 8765), 'ffmpeg')
+    agent.encoders = ['libx264', 'libopenh264']
+    cmd = agent.prepare(['ffmpeg', '-c:v', 'libopenh264', '-profile:v', 'constrained_baseline', 'a.mp4'])
+    assert cmd[1:] == ['-c:v', 'libopenh264', '-profile:v', 'constrained_baseline', 'a.mp4']
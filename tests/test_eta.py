@@ -0,0 +1,47 @@
+import time
+
+from batch import ConversionJob
+from eta import ORDER_LONGEST, ORDER_SHORTEST, batch_remaining, job_remaining, order_jobs
+
+
+def job(index, estimate, status=ConversionJob.PENDING):
+    result = ConversionJob(index, f"{index}.avi", f"{index}.mp4")
+    result.estimate = estimate
+    result.status = status
+    return result
+
+
+def test_pending_jobs_share_workers():
+    jobs = [job(0, 10), job(1, 20), job(2, 30)]
+    assert batch_remaining(jobs, parallel=1) == 60
+    assert batch_remaining(jobs, parallel=3) == 20
+
+
+def test_finished_jobs_ignored_and_unknown_get_average():
+    # Для файла без прогноза - среднее по всем прогнозам пакета (и готовым тоже)
+    jobs = [job(0, 30, ConversionJob.DONE), job(1, 20), job(2, 40), job(3, 0)]
+    assert batch_remaining(jobs, parallel=1) == 20 + 40 + 30
+
+
+def test_longest_running_job_bounds_batch():
+    running = job(0, 100, ConversionJob.RUNNING)
+    running.start_time = time.time()
+    jobs = [running, job(1, 1), job(2, 1)]
+    assert batch_remaining(jobs, parallel=4) == 100
+
+
+def test_live_speed_takes_over():
+    running = job(0, 100, ConversionJob.RUNNING)
+    running.duration, running.current_time, running.speed = 100.0, 50.0, 2.0
+    running.start_time = time.time() - 120  # дольше LIVE_WEIGHT_SECONDS
+    assert job_remaining(running) == 25.0
+
+
+def test_empty_batch():
+    assert batch_remaining([], parallel=2) == 0.0
+
+
+def test_order_jobs():
+    jobs = [job(0, 30), job(1, 0), job(2, 10), job(3, 20)]
+    assert [j.index for j in order_jobs(jobs, ORDER_SHORTEST)] == [2, 3, 0, 1]
+    assert [j.index for j in order_jobs(jobs, ORDER_LONGEST)] == [0, 3, 2, 1]
@@ -0,0 +1,87 @@
+import io
+
+import split_encode
+from ffmpeg_errors import (ErrorClassifier, CORRUPT_INPUT, DISK_FULL, ENCODER_ERROR,
+                           INPUT_NOT_FOUND, MISSING_STREAM, UNKNOWN, WORKER_LOST)
+from split_encode import SplitEncoder
+
+
+def test_fatal_reported_once():
+    classifier = ErrorClassifier()
+    assert classifier.feed("av_interleaved_write_frame(): No space left on device") == DISK_FULL
+    assert classifier.feed("Error writing trailer: No space left on device") is None
+    assert classifier.result_category() == DISK_FULL
+
+
+def test_missing_stream():
+    classifier = ErrorClassifier()
+    assert classifier.feed("Stream map '0:a:0' matches no streams.") == MISSING_STREAM
+
+
+def test_decode_errors_fatal_only_above_limit():
+    classifier = ErrorClassifier(corrupt_limit=3)
+    assert classifier.feed("[h264 @ 0x1] error while decoding MB 1 2") is None
+    assert classifier.feed("[h264 @ 0x1] error while decoding MB 3 4") is None
+    assert classifier.feed("[h264 @ 0x1] error while decoding MB 5 6") == CORRUPT_INPUT
+
+
+def test_repeated_message_counts():
+    classifier = ErrorClassifier(corrupt_limit=10)
+    classifier.feed("[h264 @ 0x1] Invalid NAL unit size")
+    assert classifier.feed("    Last message repeated 9 times") == CORRUPT_INPUT
+
+
+def test_repeat_of_other_line_not_counted():
+    classifier = ErrorClassifier(corrupt_limit=2)
+    classifier.feed("[h264 @ 0x1] Invalid NAL unit size")
+    classifier.feed("frame=  100 fps=25")
+    assert classifier.feed("Last message repeated 50 times") is None
+    assert classifier.corrupt_count == 1
+
+
+def test_final_categories():
+    classifier = ErrorClassifier()
+    assert classifier.feed("x.mp4: No such file or directory") is None
+    assert classifier.result_category() == INPUT_NOT_FOUND
+
+    classifier = ErrorClassifier()
+    classifier.feed("Unknown encoder 'libfoo'")
+    assert classifier.result_category() == ENCODER_ERROR
+
+    classifier = ErrorClassifier()
+    classifier.feed("Связь с исполнителем потеряна: agent-1")
+    assert classifier.result_category() == WORKER_LOST
+
+    assert ErrorClassifier().result_category() == UNKNOWN
+
+
+def test_some_decode_errors_make_failure_corrupt():
+    classifier = ErrorClassifier()
+    classifier.feed("[h264 @ 0x1] concealing 12 DC, 12 AC, 12 MV errors in P frame")
+    assert classifier.result_category() == CORRUPT_INPUT
+
+
+class FinishedProcess:
+    """ffmpeg, который уже вывел stderr и завершился с ошибкой"""
+
+    def __init__(self, stderr):
+        self.stdout = io.BytesIO(b'')
+        self.stderr = io.BytesIO(stderr)
+        self.returncode = 1
+
+    def wait(self):
+        return self.returncode
+
+    def poll(self):
+        return self.returncode
+
+
+def test_split_encoder_classifies_segment_stderr(monkeypatch):
+    monkeypatch.setattr(split_encode.launcher, 'popen', lambda cmd, **kwargs: FinishedProcess(
+        b"[mp4 @ 0x1] av_interleaved_write_frame(): No space left on device\n"))
+    fatal = []
+    classifier = ErrorClassifier()
+    encoder = SplitEncoder('ffmpeg', [], [], classifier=classifier, on_fatal=fatal.append)
+    assert not encoder.encode_segment('src_00000.mkv', 'enc_00000.mkv', None)
+    assert fatal == [DISK_FULL]
+    assert classifier.result_category() == DISK_FULL
@@ -0,0 +1,58 @@
+from journal import BatchJournal
+
+
+def make_journal(tmp_path):
+    journal = BatchJournal(str(tmp_path / 'journal.jsonl'))
+    journal.start_batch(['a.mp4', 'b.mp4', 'c.mp4'], {'video_bitrate': 3000})
+    return journal
+
+
+def test_no_journal(tmp_path):
+    assert BatchJournal(str(tmp_path / 'none.jsonl')).unfinished_batch() is None
+
+
+def test_remaining_files_and_settings(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.set_state(0, 'done')
+    journal.set_state(1, 'failed', 'ошибка')
+    journal.set_state(2, 'running')
+    remaining, settings = journal.unfinished_batch()
+    assert remaining == ['c.mp4']
+    assert settings == {'video_bitrate': 3000}
+
+
+def test_finished_batch(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.finish_batch()
+    assert journal.unfinished_batch() is None
+
+
+def test_all_files_done(tmp_path):
+    journal = make_journal(tmp_path)
+    for index in range(3):
+        journal.set_state(index, 'done')
+    assert journal.unfinished_batch() is None
+
+
+def test_files_added_while_running(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.add_file(4, 'e.mp4')
+    journal.set_state(0, 'done')
+    remaining, _ = journal.unfinished_batch()
+    assert remaining == ['b.mp4', 'c.mp4', 'e.mp4']
+
+
+def test_torn_last_line(tmp_path):
+    journal = make_journal(tmp_path)
+    with open(journal.journal_file, 'a', encoding='utf-8') as f:
+        f.write('{"event": "job", "index": 0, "sta')
+    journal.set_state(1, 'done')
+    remaining, _ = journal.unfinished_batch()
+    assert remaining == ['a.mp4', 'c.mp4']
+
+
+def test_new_batch_replaces_old(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.start_batch(['x.mp4'], {})
+    remaining, _ = journal.unfinished_batch()
+    assert remaining == ['x.mp4']
@@ -0,0 +1,99 @@
+import os
+import shutil
+
+from output_cache import OutputCache, job_fingerprint, normalize_args, quick_hash
+
+
+def test_normalize_args_drops_paths_and_service_keys():
+    cmd = ['/usr/bin/ffmpeg', '-hide_banner', '-y', '-threads', '4', '-i', '/a/in.mkv',
+           '-c:v', 'libx264', '-b:v', '3000k', '-progress', 'pipe:1', '-loglevel', 'error',
+           '/out/Result.MP4']
+    assert normalize_args(cmd) == ['-c:v', 'libx264', '-b:v', '3000k', '.mp4']
+
+
+def test_normalize_args_same_for_other_paths_and_threads():
+    first = ['ffmpeg', '-threads', '2', '-i', 'a.avi', '-c:v', 'libx264', 'x/a.mp4']
+    second = ['C:\\ffmpeg.exe', '-threads', '8', '-i', 'b.avi', '-c:v', 'libx264', 'y/b.mp4']
+    assert normalize_args(first) == normalize_args(second)
+
+
+def test_quick_hash_small_file(tmp_path):
+    path = tmp_path / 'a.bin'
+    path.write_bytes(b'abc' * 1000)
+    other = tmp_path / 'b.bin'
+    other.write_bytes(b'abc' * 1000)
+    assert quick_hash(str(path)) == quick_hash(str(other))
+    other.write_bytes(b'abd' * 1000)
+    assert quick_hash(str(path)) != quick_hash(str(other))
+
+
+def test_quick_hash_samples_large_file(tmp_path):
+    path = tmp_path / 'big.bin'
+    data = bytearray(os.urandom(64 * 1024))
+    path.write_bytes(bytes(data))
+    before = quick_hash(str(path), samples=2, chunk_size=1024)
+
+    # Байт вне выборок не влияет, байт в начале файла - влияет
+    data[5000] ^= 0xFF
+    path.write_bytes(bytes(data))
+    assert quick_hash(str(path), samples=2, chunk_size=1024) == before
+    data[0] ^= 0xFF
+    path.write_bytes(bytes(data))
+    assert quick_hash(str(path), samples=2, chunk_size=1024) != before
+
+
+def test_fingerprint_depends_on_args_and_extra(tmp_path):
+    path = tmp_path / 'in.avi'
+    path.write_bytes(b'video')
+    args = ['ffmpeg', '-i', str(path), '-b:v', '3000k', 'out.mp4']
+    base = job_fingerprint(str(path), args)
+    assert job_fingerprint(str(path), args) == base
+    assert job_fingerprint(str(path), args[:-2] + ['2000k', 'out.mp4']) != base
+    assert job_fingerprint(str(path), args, extra='split') != base
+
+
+def test_store_and_fetch(tmp_path):
+    cache = OutputCache(str(tmp_path / 'cache'), max_bytes=1000)
+    output = tmp_path / 'out.mp4'
+    output.write_bytes(b'x' * 100)
+    cache.store('abc', str(output))
+    assert cache.is_up_to_date(str(output), 'abc')
+
+    other = tmp_path / 'other.mp4'
+    assert cache.fetch('abc', str(other))
+    assert other.read_bytes() == b'x' * 100
+
+
+def test_store_skips_file_larger_than_cache(tmp_path):
+    cache = OutputCache(str(tmp_path / 'cache'), max_bytes=1000)
+    small = tmp_path / 'small.mp4'
+    small.write_bytes(b'x' * 100)
+    cache.store('small', str(small))
+    big = tmp_path / 'big.mp4'
+    big.write_bytes(b'x' * 2000)
+    cache.store('big', str(big))
+
+    # Большой файл не вытесняет остальные, но результат все равно запомнен
+    assert set(cache.entries) == {'small'}
+    assert cache.is_up_to_date(str(big), 'big')
+    assert not cache.fetch('big', str(tmp_path / 'copy.mp4'))
+
+
+def test_store_copies_without_lock(tmp_path, monkeypatch):
+    cache = OutputCache(str(tmp_path / 'cache'), max_bytes=1000)
+    output = tmp_path / 'out.mp4'
+    output.write_bytes(b'x' * 100)
+    locked = []
+
+    def no_link(source, target):
+        raise OSError('другой диск')
+
+    def copy(source, target):
+        locked.append(cache.lock.locked())
+        return shutil.copyfile(source, target)
+
+    monkeypatch.setattr(os, 'link', no_link)
+    monkeypatch.setattr(shutil, 'copy2', copy)
+    cache.store('abc', str(output))
+    assert locked == [False]
+    assert 'abc' in cache.entries
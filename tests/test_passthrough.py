@@ -0,0 +1,53 @@
+from passthrough import StreamPlan, choose_stream_plan
+from probe import MediaInfo, StreamInfo
+
+
+def media(video_codec='h264', profile='High', video_kbps=2500, pix_fmt='yuv420p',
+          audio_codec='aac', audio_kbps=128):
+    streams = []
+    if video_codec:
+        streams.append(StreamInfo(0, 'video', video_codec, profile=profile, bitrate=video_kbps,
+                                  width=1280, height=720, fps=25.0, pix_fmt=pix_fmt))
+    if audio_codec:
+        streams.append(StreamInfo(1, 'audio', audio_codec, bitrate=audio_kbps))
+    return MediaInfo('in.mp4', duration=60.0, streams=streams)
+
+
+def test_compatible_file_is_copied():
+    plan = choose_stream_plan(media(profile='Main'), 3000, 192, 'main')
+    assert plan.mode == StreamPlan.COPY
+
+
+def test_audio_only_reencoded():
+    plan = choose_stream_plan(media(profile='Main', audio_codec='mp3'), 3000, 192, 'main')
+    assert plan.mode == StreamPlan.AUDIO
+    assert plan.reason == "аудио mp3"
+
+
+def test_no_audio_is_copy():
+    assert choose_stream_plan(media(profile='Main', audio_codec=None), 3000, 192, 'main').mode == StreamPlan.COPY
+
+
+def test_profile_above_setting_transcoded():
+    plan = choose_stream_plan(media(profile='High'), 3000, 192, 'main')
+    assert plan.mode == StreamPlan.TRANSCODE
+    assert plan.reason == "профиль High"
+
+
+def test_bitrate_tolerance():
+    assert choose_stream_plan(media(profile='Main', video_kbps=3100), 3000, 192, 'main').video_copy
+    assert not choose_stream_plan(media(profile='Main', video_kbps=3200), 3000, 192, 'main').video_copy
+
+
+def test_video_bitrate_from_container():
+    info = media(profile='Main', video_kbps=0)
+    info.bitrate = 2628  # видео 2500 + аудио 128
+    assert choose_stream_plan(info, 3000, 192, 'main').video_copy
+    info.bitrate = 0
+    assert choose_stream_plan(info, 3000, 192, 'main').reason == "битрейт видео неизвестен"
+
+
+def test_other_codecs_and_pixel_formats():
+    assert choose_stream_plan(media(video_codec='hevc'), 9000, 192, 'main').mode == StreamPlan.TRANSCODE
+    assert not choose_stream_plan(media(profile='Main', pix_fmt='yuv422p'), 3000, 192, 'main').video_copy
+    assert choose_stream_plan(None, 3000, 192, 'main').mode == StreamPlan.TRANSCODE
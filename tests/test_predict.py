@@ -0,0 +1,24 @@
+from predict import sample_windows, spread
+
+
+def test_windows_evenly_spread():
+    windows = sample_windows(0.0, 60.0, count=3, length=2.0)
+    assert windows == [(9.0, 11.0), (29.0, 31.0), (49.0, 51.0)]
+
+
+def test_windows_follow_clip_start():
+    windows = sample_windows(100.0, 30.0, count=3, length=2.0)
+    assert [round(start, 3) for start, _ in windows] == [104.0, 114.0, 124.0]
+    assert all(100.0 <= start and end <= 130.0 for start, end in windows)
+
+
+def test_short_file_sampled_whole():
+    assert sample_windows(5.0, 4.0, count=3, length=2.0) == [(5.0, 9.0)]
+    assert sample_windows(0.0, 0.0) == []
+
+
+def test_spread():
+    items = list(range(100))
+    picked = spread(items, 4)
+    assert picked == [0, 25, 50, 75]
+    assert spread(items[:3], 4) == [0, 1, 2]
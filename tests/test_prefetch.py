@@ -0,0 +1,47 @@
+import threading
+from types import SimpleNamespace
+
+from prefetch import PREFETCH_READAHEAD, Prefetcher
+
+
+def make_jobs(tmp_path, count, size):
+    jobs = []
+    for i in range(count):
+        path = tmp_path / f"{i}.mp4"
+        path.write_bytes(b'x' * size)
+        jobs.append(SimpleNamespace(index=i, input_file=str(path), name=path.name))
+    return jobs
+
+
+def test_read_ahead_reserves_budget(tmp_path):
+    first, second = make_jobs(tmp_path, 2, 100)
+    prefetcher = Prefetcher(lambda job: None, PREFETCH_READAHEAD, budget_bytes=150)
+    prefetcher._read_ahead(first)
+    assert prefetcher.used_bytes == 100
+
+    # Второй файл не помещается в бюджет - ждет, пока первый не закончится
+    thread = threading.Thread(target=prefetcher._read_ahead, args=(second,))
+    thread.start()
+    thread.join(0.2)
+    assert thread.is_alive()
+    prefetcher.release(first)
+    thread.join(5)
+    assert not thread.is_alive()
+    assert prefetcher.read_ahead == {1: 100}
+
+    prefetcher.release(second)
+    assert prefetcher.used_bytes == 0
+
+
+def test_read_ahead_skipped_for_claimed_job(tmp_path):
+    first, second = make_jobs(tmp_path, 2, 100)
+    prefetcher = Prefetcher(lambda job: None, PREFETCH_READAHEAD, budget_bytes=150)
+    prefetcher._read_ahead(first)
+
+    thread = threading.Thread(target=prefetcher._read_ahead, args=(second,))
+    thread.start()
+    prefetcher.claim(second)  # задача уже кодируется - читать заранее незачем
+    thread.join(5)
+    assert not thread.is_alive()
+    assert prefetcher.read_ahead == {0: 100}
+    assert prefetcher.used_bytes == 100
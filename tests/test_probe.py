@@ -0,0 +1,97 @@
+import json
+import os
+
+import probe
+from probe import MediaInfo, ProbeCache, parse_ffmpeg_banner
+
+
+BANNER = """Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'in.mp4':
+  Duration: 00:01:30.50, start: 0.000000, bitrate: 2628 kb/s
+  Stream #0:0[0x1](und): Video: h264 (High) (avc1 / 0x31637661), yuv420p(progressive), 1920x1080 [SAR 1:1 DAR 16:9], 2500 kb/s, 25 fps, 25 tbr, 12800 tbn (default)
+  Stream #0:1[0x2](und): Audio: aac (LC) (mp4a / 0x6134706D), 48000 Hz, stereo, fltp, 128 kb/s (default)
+At least one output file must be specified
+"""
+
+
+def test_parse_banner():
+    info = parse_ffmpeg_banner('in.mp4', BANNER)
+    assert info.container == 'mov,mp4,m4a,3gp,3g2,mj2'
+    assert info.duration == 90.5
+    assert info.bitrate == 2628
+    video, audio = info.video, info.audio
+    assert (video.codec, video.profile, video.pix_fmt) == ('h264', 'High', 'yuv420p')
+    assert (video.width, video.height, video.fps, video.bitrate) == (1920, 1080, 25.0, 2500)
+    assert (audio.codec, audio.sample_rate, audio.channels, audio.bitrate) == ('aac', 48000, 2, 128)
+
+
+def test_cache_round_trip_and_change(tmp_path):
+    source = tmp_path / 'in.mp4'
+    source.write_bytes(b'x')
+    cache = ProbeCache(str(tmp_path / 'cache.json'))
+    cache.put(str(source), parse_ffmpeg_banner(str(source), BANNER))
+    assert cache.get(str(source)).video.profile == 'High'
+
+    source.write_bytes(b'xy')  # другой размер - другой ключ
+    assert cache.get(str(source)) is None
+
+
+def test_cache_written_once_per_batch(tmp_path, monkeypatch):
+    cache_file = str(tmp_path / 'cache.json')
+    cache = ProbeCache(cache_file)
+    for i in range(20):
+        path = tmp_path / f"{i}.mp4"
+        path.write_bytes(b'x')
+        cache.put(str(path), MediaInfo(str(path), duration=1.0))
+    assert not os.path.exists(cache_file)
+
+    cache.save()
+    with open(cache_file, encoding='utf-8') as f:
+        assert len(json.load(f)) == 20
+
+    # Давно не сохраняли - пишем, не дожидаясь конца пакета
+    monkeypatch.setattr(probe, 'SAVE_INTERVAL', 0)
+    path = tmp_path / 'late.mp4'
+    path.write_bytes(b'x')
+    cache.put(str(path), MediaInfo(str(path)))
+    with open(cache_file, encoding='utf-8') as f:
+        assert len(json.load(f)) == 21
+
+
+def test_cache_replaces_changed_file(tmp_path):
+    source = tmp_path / 'in.mp4'
+    source.write_bytes(b'x')
+    cache = ProbeCache(str(tmp_path / 'cache.json'))
+    cache.put(str(source), MediaInfo(str(source), duration=1.0))
+    source.write_bytes(b'xy')
+    cache.put(str(source), MediaInfo(str(source), duration=2.0))
+    assert len(cache.entries) == 1
+    assert cache.get(str(source)).duration == 2.0
+
+    # Индекс путей восстанавливается при загрузке
+    cache.save()
+    loaded = ProbeCache(str(tmp_path / 'cache.json'))
+    source.write_bytes(b'xyz')
+    loaded.put(str(source), MediaInfo(str(source), duration=3.0))
+    assert len(loaded.entries) == 1
+
+
+def test_cache_holds_whole_batch(tmp_path):
+    cache = ProbeCache(str(tmp_path / 'cache.json'), max_entries=5)
+    files = []
+    for i in range(8):
+        path = tmp_path / f"{i}.mp4"
+        path.write_bytes(b'x')
+        files.append(str(path))
+
+    cache.reserve(len(files))
+    for path in files:
+        cache.put(path, MediaInfo(path))
+    assert all(cache.get(path) is not None for path in files)
+
+    # Сверх лимита вытесняются самые давние записи
+    cache.max_entries = 5
+    cache.get(files[0])
+    cache.put(files[1], MediaInfo(files[1], duration=1.0))
+    assert cache.get(files[0]) is not None
+    assert [cache.get(path) is None for path in files[2:5]] == [True] * 3
+    assert set(cache.paths.values()) == set(cache.entries)
@@ -0,0 +1,60 @@
+from progress import ProgressParser, StderrBuffer
+
+
+BLOCK = [
+    "frame=250", "fps=49.8", "out_time_us=10000000", "total_size=1048576",
+    "bitrate=838.9kbits/s", "speed=1.99x", "progress=continue",
+]
+
+
+def test_snapshot_only_at_block_end():
+    parser = ProgressParser()
+    results = [parser.feed(line) for line in BLOCK]
+    assert results[:-1] == [None] * (len(BLOCK) - 1)
+    snapshot = results[-1]
+    assert snapshot.out_time == 10.0
+    assert snapshot.frame == 250
+    assert snapshot.fps == 49.8
+    assert snapshot.speed == 1.99
+    assert snapshot.total_size == 1048576
+    assert not snapshot.done
+
+
+def test_bytes_and_end_block():
+    parser = ProgressParser()
+    parser.feed(b"out_time_us=N/A\n")
+    snapshot = parser.feed(b"progress=end\n")
+    assert snapshot.done
+    assert snapshot.out_time is None  # N/A в конце файла
+
+
+def test_blocks_do_not_leak_values():
+    parser = ProgressParser()
+    for line in BLOCK:
+        parser.feed(line)
+    snapshot = parser.feed("progress=continue")
+    assert snapshot.frame == 0
+    assert snapshot.out_time is None
+
+
+def test_lines_without_value_ignored():
+    parser = ProgressParser()
+    assert parser.feed("просто строка") is None
+    assert parser.values == {}
+
+
+class _Stream:
+    def __init__(self, lines):
+        self.lines = [line.encode('utf-8') + b'\n' for line in lines] + [b'']
+
+    def readline(self):
+        return self.lines.pop(0)
+
+
+def test_stderr_info_lines_go_to_callback():
+    info = []
+    buffer = StderrBuffer(_Stream(["[mp4 @ 0x1] [info] Starting second pass", "[error] беда"]),
+                          on_info=info.append)
+    buffer.join()
+    assert info == ["[mp4 @ 0x1] Starting second pass"]
+    assert buffer.tail() == ["беда"]
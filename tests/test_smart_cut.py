@@ -0,0 +1,86 @@
+import pytest
+
+from probe import StreamInfo
+from smart_cut import (SmartCutter, clip_suffix, edge_video_args, format_time, parse_time,
+                       seek_args, split_clip, with_clip)
+
+
+def test_parse_time():
+    assert parse_time('90') == 90.0
+    assert parse_time('1:30') == 90.0
+    assert parse_time('01:02:03.5') == 3723.5
+    assert parse_time('  ') is None
+    with pytest.raises(ValueError):
+        parse_time('abc')
+
+
+def test_split_clip():
+    assert split_clip('видео.mp4#t=1:30,2:45') == ('видео.mp4', 90.0, 165.0)
+    assert split_clip('видео.mp4#t=10,') == ('видео.mp4', 10.0, None)
+    assert split_clip('видео.mp4#t=,20') == ('видео.mp4', None, 20.0)
+    assert split_clip('видео.mp4') == ('видео.mp4', None, None)
+
+
+def test_split_clip_not_a_clip():
+    # Конец раньше начала или не время - это часть имени файла
+    assert split_clip('a.mp4#t=20,10') == ('a.mp4#t=20,10', None, None)
+    assert split_clip('a#t=x.mp4') == ('a#t=x.mp4', None, None)
+
+
+def test_with_clip_round_trip():
+    spec = with_clip('a.mp4', 90.5, 3723.0)
+    assert spec == 'a.mp4#t=00:01:30.5,01:02:03'
+    assert split_clip(spec) == ('a.mp4', 90.5, 3723.0)
+    assert with_clip('a.mp4') == 'a.mp4'
+    assert format_time(0) == '00:00:00'
+
+
+def test_clip_suffix_and_seek():
+    assert clip_suffix(90, 165) == '_000130-000245'
+    assert clip_suffix(None, None) == '_000000-end'
+    assert seek_args(0, None) == []
+    assert seek_args(1.5, 3) == ['-ss', '1.500', '-to', '3.000']
+
+
+def video(pix_fmt='yuv420p'):
+    return StreamInfo(0, 'video', 'h264', profile='High', width=1920, height=1080, pix_fmt=pix_fmt)
+
+
+def test_edge_args_follow_source_sps():
+    args = edge_video_args({'profile_idc': 100, 'level_idc': 41}, video(), 'fast')
+    assert args == ['-c:v', 'libx264', '-preset', 'fast', '-profile:v', 'high', '-level:v', '4.1',
+                    '-pix_fmt', 'yuv420p', '-s', '1920x1080']
+
+
+def test_edge_args_level_1b():
+    args = edge_video_args({'profile_idc': 66, 'level_idc': 11, 'constraint_set3_flag': 1}, video())
+    assert args[args.index('-level:v') + 1] == '1b'
+
+
+def test_edge_args_impossible():
+    assert edge_video_args(None, video()) is None
+    assert edge_video_args({'profile_idc': 88, 'level_idc': 30}, video()) is None  # Extended
+    assert edge_video_args({'profile_idc': 100, 'level_idc': 40}, video(pix_fmt=None)) is None
+    assert edge_video_args({'profile_idc': 100, 'level_idc': 40}, video(), available=['libopenh264']) is None
+
+
+def test_copy_part_starts_at_keyframe(tmp_path, monkeypatch):
+    # Ключевые кадры между миллисекундами: копия не должна начинаться раньше
+    # кадра (иначе -ss с -c:v copy возьмет предыдущий GOP), края не должны
+    # заходить за него
+    cutter = SmartCutter('ffmpeg', ['-c:v', 'libx264'], [], workers=1)
+    cmds = []
+    monkeypatch.setattr(cutter, 'cut_points', lambda *args: (2.0004, 9.9996))
+    monkeypatch.setattr(cutter, '_run', lambda cmd, on_time=None: cmds.append(cmd) or True)
+    monkeypatch.setattr(cutter, 'concat', lambda *args: True)
+    assert cutter.cut('in.mp4', str(tmp_path / 'out.mp4'), 1.0, 12.0, has_audio=False)[0]
+
+    def seek(cmd, flag):
+        return float(cmd[cmd.index(flag) + 1])
+
+    head, copy, tail = sorted(cmds, key=lambda c: seek(c, '-ss'))
+    assert 'copy' in copy
+    assert seek(copy, '-ss') >= 2.0004
+    assert seek(copy, '-to') <= 9.9996
+    assert seek(head, '-to') <= 2.0004
+    assert seek(tail, '-ss') <= 9.9996
@@ -0,0 +1,31 @@
+import os
+
+from watch_folder import FolderWatcher
+
+
+def make_watcher(folder):
+    return FolderWatcher([folder], lambda path: None, ('.mp4', '.mkv'),
+                         skip_dirs={'converted'}, use_inotify=False)
+
+
+def test_is_video_filters_names_and_result_dirs(tmp_path):
+    watcher = make_watcher(str(tmp_path))
+    assert watcher.is_video(str(tmp_path / 'a.MP4'))
+    assert watcher.is_video(str(tmp_path / 'sub' / 'b.mkv'))
+    assert not watcher.is_video(str(tmp_path / 'a.txt'))
+    assert not watcher.is_video(str(tmp_path / '.a.part.mp4'))
+    assert not watcher.is_video(str(tmp_path / 'converted' / 'a.mp4'))
+    assert not watcher.is_video(str(tmp_path / 'sub' / 'converted' / 'a.mp4'))
+
+
+def test_is_video_outside_watched_folder(tmp_path, monkeypatch):
+    watcher = make_watcher(str(tmp_path / 'watched'))
+    # Папка с похожим именем - не вложенная
+    assert watcher.is_video(str(tmp_path / 'watched2' / 'converted' / 'a.mp4'))
+
+    # Другой диск Windows: commonpath бросает ValueError, поток наблюдения не падает
+    def other_drive(paths):
+        raise ValueError("Paths don't have the same drive")
+
+    monkeypatch.setattr(os.path, 'commonpath', other_drive)
+    assert watcher.is_video(str(tmp_path / 'converted' / 'a.mp4'))
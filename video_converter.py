@@ -1,12 +1,31 @@
 import os
 import sys
-import subprocess
 import tkinter as tk
-from tkinter import filedialog, ttk, messagebox
+from tkinter import filedialog, ttk, messagebox, simpledialog
 import threading
 import json
-import time
-from pathlib import Path
+import queue
+
+from engine import (ConversionEngine, ConversionOptions, DEFAULT_SETTINGS, Event,
+                    detect_ffmpeg, iter_video_files)
+from batch import ConversionJob, batch_percent
+from split_encode import SPLIT_MIN_DURATION
+from passthrough import StreamPlan
+from journal import BatchJournal
+from launcher import FFMPEG_NAME
+from renditions import LADDERS
+from metrics import MetricsHistory, export_report
+from eta import job_remaining
+from file_table import VirtualTable
+from event_bus import EventBus
+from distributed import parse_address, check_token
+from smart_cut import CLIP_MARK, split_clip, with_clip, parse_time, format_time as format_clip_time
+
+# Сколько найденных файлов фоновый поиск передает в окно за раз
+IMPORT_CHUNK = 500
+
+# Как часто окно забирает события движка, мс
+EVENT_POLL_MS = 100
 
 class VideoConverter:
     def __init__(self):
@@ -18,27 +37,45 @@ class VideoConverter:
         self.settings_file = "converter_settings.json"
         self.load_settings()
         
-        # Инициализируем путь к ffmpeg
+        # Журнал пакета для продолжения после закрытия или сбоя
+        self.journal = BatchJournal("conversion_journal.jsonl")
+        
+        # Путь к ffmpeg ищется в фоне (см. find_ffmpeg)
         self.ffmpeg_path = None
-        self.current_process = None
+        self.ffmpeg_version = ""
+        self.ffmpeg_queue = queue.Queue()
+        self.engine = None
+        self.jobs = []
         self.is_converting = False
-        self.total_duration = 0
-        self.converted_duration = 0
+        
+        # События движка идут через очередь: потоки не трогают виджеты
+        self.events = EventBus(coalesce=(Event.JOB_PROGRESS,))
+        
+        # Список файлов и фоновый поиск по папке
+        self.files_to_convert = []
+        self.file_sizes = {}
+        self.import_queue = queue.Queue()
+        self.import_generation = 0
+        self.is_importing = False
+        
+        # Прогноз пакета (пробное кодирование отрывков в фоне)
+        self.prediction_queue = queue.Queue()
+        self.is_predicting = False
         
         # Загружаем тему
         self.setup_theme()
         self.setup_ui()
         self.find_ffmpeg()
+        self.window.after(EVENT_POLL_MS, self.poll_events)
     
     def load_settings(self):
         """Загружаем настройки из файла"""
         self.settings = {
             "theme": "dark",  # По умолчанию темная тема
-            "video_bitrate": "2500",
-            "audio_bitrate": "128",
-            "profile": "main",
-            "output_dir": "converted"
+            "ffmpeg_cache": {}  # Найденный ffmpeg: путь, размер, время изменения, версия, кодировщики
         }
+        # Настройки конвертации - общие с движком и командной строкой
+        self.settings.update(DEFAULT_SETTINGS)
         
         try:
             if os.path.exists(self.settings_file):
@@ -80,9 +117,13 @@ class VideoConverter:
         self.style.configure('TLabelframe', background='#2b2b2b', foreground='#ffffff')
         self.style.configure('TLabelframe.Label', background='#2b2b2b', foreground='#ffffff')
         self.style.configure('TRadiobutton', background='#2b2b2b', foreground='#ffffff')
+        self.style.configure('TCheckbutton', background='#2b2b2b', foreground='#ffffff')
         self.style.configure('TEntry', fieldbackground='#3c3c3c', foreground='#ffffff')
         self.style.configure('TProgressbar', background='#4CAF50', troughcolor='#3c3c3c')
         self.style.configure('Listbox', background='#3c3c3c', foreground='#ffffff')
+        self.style.configure('Treeview', background='#3c3c3c', fieldbackground='#3c3c3c',
+                             foreground='#ffffff')
+        self.style.configure('Treeview.Heading', background='#2b2b2b', foreground='#ffffff')
         
         # Стиль для кнопок темы
         self.style.configure('Theme.TButton', background='#4CAF50', foreground='#ffffff')
@@ -102,9 +143,13 @@ class VideoConverter:
         self.style.configure('TLabelframe', background='#f0f0f0', foreground='#000000')
         self.style.configure('TLabelframe.Label', background='#f0f0f0', foreground='#000000')
         self.style.configure('TRadiobutton', background='#f0f0f0', foreground='#000000')
+        self.style.configure('TCheckbutton', background='#f0f0f0', foreground='#000000')
         self.style.configure('TEntry', fieldbackground='#ffffff', foreground='#000000')
         self.style.configure('TProgressbar', background='#4CAF50', troughcolor='#e0e0e0')
         self.style.configure('Listbox', background='#ffffff', foreground='#000000')
+        self.style.configure('Treeview', background='#ffffff', fieldbackground='#ffffff',
+                             foreground='#000000')
+        self.style.configure('Treeview.Heading', background='#e0e0e0', foreground='#000000')
         
         # Стиль для кнопок темы
         self.style.configure('Theme.TButton', background='#4CAF50', foreground='#ffffff')
@@ -117,80 +162,48 @@ class VideoConverter:
             self.settings["theme"] = "dark"
         
         self.save_settings()
-        self.setup_theme()
         
-        # Перезагружаем UI
-        for widget in self.window.winfo_children():
-            widget.destroy()
-        
-        self.setup_ui()
+        # ttk-виджеты перерисовываются сами после смены стилей - пересоздавать UI не нужно
+        self.setup_theme()
+        self.theme_btn.config(text="🌙" if self.settings["theme"] == "dark" else "☀️")
     
     def find_ffmpeg(self):
-        """Ищем ffmpeg в доступных местах"""
+        """Ищем ffmpeg в фоне: окно показывается сразу, кнопка конвертации ждет"""
+        self.version_label.config(text="Поиск FFmpeg...")
+        cache = self.settings.get("ffmpeg_cache")
+        thread = threading.Thread(target=lambda: self.ffmpeg_queue.put(detect_ffmpeg(cache)))
+        thread.daemon = True
+        thread.start()
+        self.window.after(50, self.poll_ffmpeg)
+    
+    def poll_ffmpeg(self):
+        """Результат поиска ffmpeg (главный поток)"""
         try:
-            # Список мест где может быть ffmpeg
-            possible_locations = []
-            
-            # 1. Проверяем в папке с программой (для EXE)
-            if getattr(sys, 'frozen', False):
-                # Режим EXE - ищем в папке с программой
-                exe_dir = os.path.dirname(sys.executable)
-                possible_locations.append(os.path.join(exe_dir, 'ffmpeg.exe'))
-                
-                # 2. Проверяем во временной папке PyInstaller
-                try:
-                    base_path = sys._MEIPASS
-                    possible_locations.append(os.path.join(base_path, 'ffmpeg.exe'))
-                except:
-                    pass
-            else:
-                # Режим разработки - ищем рядом со скриптом
-                script_dir = os.path.dirname(os.path.abspath(__file__))
-                possible_locations.append(os.path.join(script_dir, 'ffmpeg.exe'))
-            
-            # 3. Проверяем в PATH
-            possible_locations.append('ffmpeg')
-            
-            # Пробуем все варианты
-            for location in possible_locations:
-                if self.try_ffmpeg(location):
-                    self.ffmpeg_path = location
-                    return True
-            
-            # Если ничего не нашли
-            raise Exception("FFmpeg не найден ни в одной из возможных локаций")
-            
-        except Exception as e:
+            found = self.ffmpeg_queue.get_nowait()
+        except queue.Empty:
+            self.window.after(50, self.poll_ffmpeg)
+            return
+        
+        if found is None:
             messagebox.showerror(
                 "Ошибка", 
-                f"Не удалось найти FFmpeg:\n\n{str(e)}\n\n"
-                "Убедитесь что ffmpeg.exe находится в той же папке что и программа."
+                "Не удалось найти FFmpeg:\n\n"
+                "FFmpeg не найден ни в одной из возможных локаций\n\n"
+                f"Убедитесь что {FFMPEG_NAME} находится в той же папке что и программа."
             )
             sys.exit(1)
-    
-    def try_ffmpeg(self, path):
-        """Пробуем запустить ffmpeg"""
-        try:
-            # Создаем startupinfo чтобы скрыть консоль
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            startupinfo.wShowWindow = subprocess.SW_HIDE
-            
-            # Пробуем получить версию
-            result = subprocess.run(
-                [path, '-version'],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                stdin=subprocess.DEVNULL,
-                creationflags=subprocess.CREATE_NO_WINDOW,
-                startupinfo=startupinfo,
-                timeout=2
-            )
-            
-            return result.returncode == 0
-            
-        except:
-            return False
+        
+        self.ffmpeg_path = found["path"]
+        self.ffmpeg_version = found["version"]
+        if found != self.settings.get("ffmpeg_cache"):
+            self.settings["ffmpeg_cache"] = found
+            self.save_settings()
+        
+        self.show_ffmpeg_version()
+        self.update_convert_button()
+        
+        # Предлагаем продолжить прерванный пакет
+        self.offer_resume()
     
     def validate_numeric(self, P):
         """Валидация ввода - только цифры"""
@@ -198,141 +211,6 @@ class VideoConverter:
             return True
         return False
     
-    def get_video_duration(self, input_file):
-        """Получаем длительность видео в секундах"""
-        try:
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            startupinfo.wShowWindow = subprocess.SW_HIDE
-            
-            cmd = [
-                self.ffmpeg_path,
-                '-i', input_file,
-                '-f', 'null',
-                '-'
-            ]
-            
-            process = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                stdin=subprocess.DEVNULL,
-                creationflags=subprocess.CREATE_NO_WINDOW,
-                startupinfo=startupinfo,
-                encoding='utf-8',
-                errors='ignore'
-            )
-            
-            # Ищем длительность в выводе
-            for line in process.stderr.split('\n'):
-                if 'Duration:' in line:
-                    time_str = line.split('Duration:')[1].split(',')[0].strip()
-                    hours, minutes, seconds = time_str.split(':')
-                    seconds = float(seconds)
-                    minutes = int(minutes)
-                    hours = int(hours)
-                    
-                    total_seconds = hours * 3600 + minutes * 60 + seconds
-                    return total_seconds
-            
-            return 0
-            
-        except:
-            return 0
-    
-    def parse_progress(self, line):
-        """Парсим прогресс из строки FFmpeg"""
-        if 'time=' in line:
-            try:
-                time_str = line.split('time=')[1].split(' ')[0]
-                hours, minutes, seconds = time_str.split(':')
-                seconds = float(seconds)
-                minutes = int(minutes)
-                hours = int(hours)
-                
-                current_seconds = hours * 3600 + minutes * 60 + seconds
-                return current_seconds
-            except:
-                pass
-        return None
-    
-    def convert_video_with_progress(self, input_file, output_file, progress_callback):
-        """Конвертирует видео с отслеживанием прогресса"""
-        # Получаем значения и форматируем для FFmpeg
-        video_value = self.video_bitrate.get().strip()
-        audio_value = self.audio_bitrate.get().strip()
-        
-        # Проверяем что значения не пустые
-        if not video_value:
-            video_value = "2500"
-        if not audio_value:
-            audio_value = "128"
-        
-        # Добавляем "k" если его нет
-        video_bitrate = video_value if video_value.endswith('k') else f"{video_value}k"
-        audio_bitrate = audio_value if audio_value.endswith('k') else f"{audio_value}k"
-        
-        profile = self.profile_var.get()
-        
-        # Команда ffmpeg с прогрессом
-        cmd = [
-            self.ffmpeg_path,
-            '-i', input_file,
-            '-c:v', 'libx264',
-            '-preset', 'medium',
-            '-profile:v', profile,
-            '-b:v', video_bitrate,
-            '-maxrate', video_bitrate,
-            '-bufsize', '5000k',
-            '-c:a', 'aac',
-            '-b:a', audio_bitrate,
-            '-movflags', '+faststart',
-            '-progress', 'pipe:1',  # Вывод прогресса
-            '-loglevel', 'info',    # Подробный лог
-            '-y',
-            output_file
-        ]
-        
-        try:
-            # Скрываем консольное окно
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            startupinfo.wShowWindow = subprocess.SW_HIDE
-            
-            # Запускаем процесс
-            self.current_process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,  # Объединяем stdout и stderr
-                stdin=subprocess.DEVNULL,
-                creationflags=subprocess.CREATE_NO_WINDOW,
-                startupinfo=startupinfo,
-                encoding='utf-8',
-                errors='ignore',
-                bufsize=1,
-                universal_newlines=True
-            )
-            
-            # Читаем вывод построчно для отслеживания прогресса
-            for line in iter(self.current_process.stdout.readline, ''):
-                if progress_callback:
-                    current_time = self.parse_progress(line)
-                    if current_time is not None:
-                        progress_callback(current_time)
-            
-            # Ждем завершения процесса
-            self.current_process.wait()
-            
-            if self.current_process.returncode == 0:
-                return True, output_file
-            else:
-                return False, "FFmpeg завершился с ошибкой"
-                
-        except Exception as e:
-            return False, f"Исключение: {str(e)}"
-        finally:
-            self.current_process = None
-    
     def setup_ui(self):
         # Заголовок
         title_frame = ttk.Frame(self.window)
@@ -354,13 +232,33 @@ class VideoConverter:
         frame_files = ttk.LabelFrame(self.window, text="Выбор файлов")
         frame_files.pack(pady=10, padx=20, fill='x')
         
-        self.btn_select = ttk.Button(frame_files, 
+        select_frame = ttk.Frame(frame_files)
+        select_frame.pack(pady=10, padx=10, fill='x')
+        
+        self.btn_select = ttk.Button(select_frame, 
                                     text="📁 Выбрать файлы", 
                                     command=self.select_files)
-        self.btn_select.pack(pady=10, padx=10, fill='x')
+        self.btn_select.pack(side='left', fill='x', expand=True)
         
-        self.file_list = tk.Listbox(frame_files, height=5)
-        self.file_list.pack(pady=5, padx=10, fill='x')
+        # Папка ищется рекурсивно в фоне, список заполняется по мере поиска
+        self.btn_select_folder = ttk.Button(select_frame, 
+                                           text="📂 Выбрать папку", 
+                                           command=self.select_folder)
+        self.btn_select_folder.pack(side='left', fill='x', expand=True, padx=(5, 0))
+        
+        # Таблица рисует только видимые строки - десятки тысяч файлов не тормозят окно
+        self.file_table = VirtualTable(
+            frame_files,
+            columns=[("name", "Файл", 230), ("clip", "Фрагмент", 110), ("status", "Статус", 110),
+                     ("duration", "Длит.", 60), ("size", "Размер", 70), ("speed", "Скорость", 60)],
+            row_count=lambda: len(self.files_to_convert),
+            row_values=self.file_row_values,
+            height=5,
+            on_activate=self.edit_clip
+        )
+        self.file_table.pack(pady=5, padx=10, fill='x')
+        self.file_table.refresh()
+        ttk.Label(frame_files, text="Двойной щелчок по файлу - задать фрагмент (начало и конец)").pack(padx=10, anchor='w')
         
         # Фрейм настроек
         frame_settings = ttk.LabelFrame(self.window, text="Настройки кодирования")
@@ -405,6 +303,118 @@ class VideoConverter:
         self.audio_bitrate.pack(side='left', padx=5)
         ttk.Label(audio_frame, text="kbps").pack(side='left')
         
+        # Параллельные задачи
+        jobs_frame = ttk.Frame(frame_settings)
+        jobs_frame.pack(pady=5, padx=10, fill='x')
+        
+        ttk.Label(jobs_frame, text="Файлов одновременно:").pack(side='left')
+        self.parallel_jobs = ttk.Entry(jobs_frame, width=10, validate='key', validatecommand=vcmd)
+        self.parallel_jobs.insert(0, self.settings["parallel_jobs"])
+        self.parallel_jobs.pack(side='left', padx=5)
+        ttk.Label(jobs_frame, text="(0 - авто)").pack(side='left')
+        
+        # Деление длинных файлов на сегменты
+        self.split_var = tk.BooleanVar(value=self.settings["split_encode"])
+        ttk.Checkbutton(frame_settings,
+                        text=f"Кодировать длинные файлы (от {SPLIT_MIN_DURATION // 60} мин) частями параллельно",
+                        variable=self.split_var).pack(pady=5, padx=10, anchor='w')
+        
+        # Копирование без перекодирования
+        self.smart_copy_var = tk.BooleanVar(value=self.settings["smart_copy"])
+        ttk.Checkbutton(frame_settings,
+                        text="Не перекодировать файлы, которые уже H.264/AAC в пределах битрейта",
+                        variable=self.smart_copy_var).pack(pady=5, padx=10, anchor='w')
+        
+        # Приоритет процессов ffmpeg
+        priority_frame = ttk.Frame(frame_settings)
+        priority_frame.pack(pady=5, padx=10, fill='x')
+        
+        ttk.Label(priority_frame, text="Приоритет:").pack(side='left')
+        self.priority_var = tk.StringVar(value=self.settings["priority"])
+        for text, value in (("Обычный", "normal"), ("Низкий", "low"), ("Фоновый", "idle")):
+            ttk.Radiobutton(priority_frame, text=text,
+                           variable=self.priority_var, value=value).pack(side='left', padx=5)
+        
+        # Фрагментированный MP4: без второго прохода по готовому файлу
+        self.fragmented_var = tk.BooleanVar(value=self.settings["mp4_layout"] == "fragmented")
+        ttk.Checkbutton(frame_settings,
+                        text="Фрагментированный MP4 (быстрее для больших файлов, без перезаписи в конце)",
+                        variable=self.fragmented_var).pack(pady=5, padx=10, anchor='w')
+        
+        # Фрагменты H.264: середина копируется, перекодируются только края
+        self.smart_cut_var = tk.BooleanVar(value=self.settings["smart_cut"])
+        ttk.Checkbutton(frame_settings,
+                        text="Быстрая нарезка фрагментов (копировать между ключевыми кадрами)",
+                        variable=self.smart_cut_var).pack(pady=5, padx=10, anchor='w')
+        
+        # Кодировщик: стандартный или подобранный по замерам этой машины
+        encoder_frame = ttk.Frame(frame_settings)
+        encoder_frame.pack(pady=5, padx=10, fill='x')
+        
+        ttk.Label(encoder_frame, text="Кодировщик:").pack(side='left')
+        self.encoder_target_var = tk.StringVar(value=self.settings["encoder_target"])
+        for text, value in (("medium", ""), ("Быстрее", "speed"), ("Баланс", "balanced"),
+                            ("Качество не медленнее", "quality")):
+            ttk.Radiobutton(encoder_frame, text=text,
+                           variable=self.encoder_target_var, value=value).pack(side='left', padx=5)
+        self.min_realtime = ttk.Entry(encoder_frame, width=5)
+        self.min_realtime.insert(0, str(self.settings["min_realtime"]))
+        self.min_realtime.pack(side='left')
+        ttk.Label(encoder_frame, text="x").pack(side='left')
+        
+        # Распределенный режим: файлы кодируют исполнители на других ПК
+        distributed_frame = ttk.Frame(frame_settings)
+        distributed_frame.pack(pady=5, padx=10, fill='x')
+        
+        ttk.Label(distributed_frame, text="Исполнители по сети, адрес:").pack(side='left')
+        self.distributed_listen = ttk.Entry(distributed_frame, width=20)
+        self.distributed_listen.insert(0, self.settings["distributed_listen"])
+        self.distributed_listen.pack(side='left', padx=5)
+        ttk.Label(distributed_frame, text="ключ:").pack(side='left')
+        self.distributed_token = ttk.Entry(distributed_frame, width=12, show='*')
+        self.distributed_token.insert(0, self.settings["distributed_token"])
+        self.distributed_token.pack(side='left', padx=5)
+        ttk.Label(distributed_frame, text="(пусто - кодирует этот ПК)").pack(side='left')
+        
+        # Подготовка следующих файлов, пока кодируется текущий
+        prefetch_frame = ttk.Frame(frame_settings)
+        prefetch_frame.pack(pady=5, padx=10, fill='x')
+        
+        ttk.Label(prefetch_frame, text="Следующие файлы:").pack(side='left')
+        self.prefetch_var = tk.StringVar(value=self.settings["prefetch"])
+        for text, value in (("Анализ", "probe"), ("Читать заранее", "readahead"),
+                            ("Копировать локально", "stage")):
+            ttk.Radiobutton(prefetch_frame, text=text,
+                           variable=self.prefetch_var, value=value).pack(side='left', padx=5)
+        
+        # Порядок очереди
+        order_frame = ttk.Frame(frame_settings)
+        order_frame.pack(pady=5, padx=10, fill='x')
+        
+        ttk.Label(order_frame, text="Очередь:").pack(side='left')
+        self.queue_order_var = tk.StringVar(value=self.settings["queue_order"])
+        for text, value in (("По порядку", "input"), ("Сначала короткие", "shortest"),
+                            ("Сначала длинные", "longest")):
+            ttk.Radiobutton(order_frame, text=text,
+                           variable=self.queue_order_var, value=value).pack(side='left', padx=5)
+        
+        # Несколько качеств за один проход
+        ladder_frame = ttk.Frame(frame_settings)
+        ladder_frame.pack(pady=5, padx=10, fill='x')
+        
+        ttk.Label(ladder_frame, text="Набор качеств:").pack(side='left')
+        self.ladder_var = tk.StringVar(value=self.settings["ladder"] or "нет")
+        ladder_names = ["нет"] + sorted(set(LADDERS) | set(self.settings["ladders"]))
+        ttk.Combobox(ladder_frame, textvariable=self.ladder_var, values=ladder_names,
+                     state='readonly', width=12).pack(side='left', padx=5)
+        ttk.Label(ladder_frame, text="(например web: 480p + 720p + 1080p)").pack(side='left')
+        
+        # Кэш результатов
+        self.output_cache_var = tk.BooleanVar(value=self.settings["output_cache"])
+        ttk.Checkbutton(frame_settings,
+                        text=f"Не кодировать повторно то же самое (кэш до {self.settings['cache_max_gb']} ГБ)",
+                        variable=self.output_cache_var).pack(pady=5, padx=10, anchor='w')
+        
         # Прогресс
         progress_frame = ttk.LabelFrame(self.window, text="Прогресс")
         progress_frame.pack(pady=10, padx=20, fill='x')
@@ -424,9 +434,17 @@ class VideoConverter:
         # Кнопка конвертации
         self.btn_convert = ttk.Button(self.window, 
                                      text="⚡ Конвертировать", 
-                                     command=self.start_conversion)
+                                     command=self.start_conversion,
+                                     state='disabled')
         self.btn_convert.pack(pady=10)
         
+        # Прогноз размера, места и времени по коротким отрывкам
+        self.btn_predict = ttk.Button(self.window,
+                                     text="🔮 Прогноз",
+                                     command=self.start_prediction,
+                                     state='disabled')
+        self.btn_predict.pack(pady=5)
+        
         # Кнопка отмены
         self.btn_cancel = ttk.Button(self.window, 
                                     text="❌ Отмена", 
@@ -434,6 +452,9 @@ class VideoConverter:
                                     state='disabled')
         self.btn_cancel.pack(pady=5)
         
+        # Экспорт истории метрик
+        ttk.Button(self.window, text="📊 Отчет", command=self.export_metrics).pack(pady=5)
+        
         # Статус
         self.status_label = ttk.Label(self.window, text="Готов к работе", 
                                      font=('Arial', 10, 'italic'))
@@ -442,35 +463,20 @@ class VideoConverter:
         # Версия FFmpeg
         self.version_label = ttk.Label(self.window, text="", font=('Arial', 8))
         self.version_label.pack(pady=5)
-        
-        # Показываем версию ffmpeg
-        self.show_ffmpeg_version()
     
     def show_ffmpeg_version(self):
-        """Показываем версию FFmpeg"""
-        try:
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            startupinfo.wShowWindow = subprocess.SW_HIDE
-            
-            result = subprocess.run(
-                [self.ffmpeg_path, '-version'],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                stdin=subprocess.DEVNULL,
-                creationflags=subprocess.CREATE_NO_WINDOW,
-                startupinfo=startupinfo,
-                encoding='utf-8',
-                errors='ignore'
-            )
-            
-            if result.returncode == 0:
-                # Берем первую строку вывода
-                first_line = result.stdout.split('\n')[0]
-                self.version_label.config(text=f"FFmpeg: {first_line[:50]}...")
-                
-        except:
-            pass
+        """Показываем версию FFmpeg (уже известную - ffmpeg не запускается)"""
+        if self.ffmpeg_version:
+            self.version_label.config(text=f"FFmpeg: {self.ffmpeg_version[:50]}...")
+        else:
+            self.version_label.config(text="")
+    
+    def update_convert_button(self):
+        """Конвертировать можно, когда найден ffmpeg и закончен поиск файлов"""
+        ready = (self.ffmpeg_path is not None and not self.is_importing
+                 and not self.is_converting and not self.is_predicting)
+        self.btn_convert.config(state='normal' if ready else 'disabled')
+        self.btn_predict.config(state='normal' if ready else 'disabled')
     
     def select_files(self):
         files = filedialog.askopenfilenames(
@@ -482,33 +488,207 @@ class VideoConverter:
         )
         
         if files:
-            self.file_list.delete(0, tk.END)
-            for file in files:
-                self.file_list.insert(tk.END, os.path.basename(file))
-            self.files_to_convert = list(files)
-            self.update_status(f"Выбрано файлов: {len(files)}")
-    
-    def update_progress(self, current_time):
-        """Обновляет прогресс бар"""
-        if self.total_duration > 0:
-            progress_percent = (current_time / self.total_duration) * 100
-            self.progress['value'] = progress_percent
-            
-            # Оставшееся время
-            if current_time > 0:
-                elapsed_time = time.time() - self.start_time
-                speed = current_time / elapsed_time if elapsed_time > 0 else 0
-                remaining_time = (self.total_duration - current_time) / speed if speed > 0 else 0
-                
-                # Форматируем время
-                current_str = self.format_time(current_time)
-                total_str = self.format_time(self.total_duration)
-                remaining_str = self.format_time(remaining_time)
-                
-                self.progress_info.config(text=f"{progress_percent:.1f}% ({current_str} / {total_str})")
-                self.time_label.config(text=f"Осталось: {remaining_str}")
+            self.set_files(files)
+    
+    def select_folder(self):
+        folder = filedialog.askdirectory(title="Выберите папку с видео")
+        if not folder:
+            return
+        
+        # Новый поиск отменяет предыдущий: его порции отбрасываются по номеру
+        self.import_generation += 1
+        generation = self.import_generation
+        self.jobs = []
+        self.set_files([])
+        self.is_importing = True
+        self.update_convert_button()
+        self.update_status("Поиск файлов...")
+        
+        skip_dirs = (self.settings["output_dir"], self.settings["cache_dir"])
+        thread = threading.Thread(target=self.import_folder,
+                                  args=(folder, skip_dirs, generation))
+        thread.daemon = True
+        thread.start()
+        self.window.after(50, self.poll_import)
+    
+    def import_folder(self, folder, skip_dirs, generation):
+        """Ищет видео в папке (в потоке) и отдает их окну порциями"""
+        chunk = []
+        for path in iter_video_files(folder, recursive=True, skip_dirs=skip_dirs):
+            if generation != self.import_generation:
+                return
+            chunk.append(path)
+            if len(chunk) >= IMPORT_CHUNK:
+                self.import_queue.put((generation, chunk))
+                chunk = []
+        self.import_queue.put((generation, chunk))
+        self.import_queue.put((generation, None))
+    
+    def poll_import(self):
+        """Забирает найденные файлы в список (главный поток, по таймеру)"""
+        finished = False
+        added = False
+        while True:
+            try:
+                generation, chunk = self.import_queue.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self.import_generation:
+                continue
+            if chunk is None:
+                finished = True
+            else:
+                self.files_to_convert.extend(chunk)
+                added = True
+        
+        if added:
+            self.file_table.refresh()
+        if finished:
+            self.is_importing = False
+            self.update_convert_button()
+            self.update_status(f"Выбрано файлов: {len(self.files_to_convert)}")
+        elif self.is_importing:
+            self.update_status(f"Поиск файлов... найдено: {len(self.files_to_convert)}")
+            self.window.after(50, self.poll_import)
+    
+    def set_files(self, files):
+        """Заполняет список файлов для конвертации"""
+        if files and self.is_importing:
+            # Файлы выбраны вручную - результат поиска по папке больше не нужен
+            self.import_generation += 1
+            self.is_importing = False
+            self.update_convert_button()
+        self.files_to_convert = list(files)
+        self.jobs = []
+        self.file_sizes = {}
+        self.file_table.scroll_to(0)
+        self.update_status(f"Выбрано файлов: {len(files)}")
+    
+    def file_size(self, path):
+        """Размер исходника (запрашивается только для видимых строк)"""
+        path = split_clip(path)[0]
+        if path not in self.file_sizes:
+            try:
+                self.file_sizes[path] = os.path.getsize(path)
+            except OSError:
+                self.file_sizes[path] = None
+        return self.file_sizes[path]
+    
+    def format_size(self, size):
+        if size is None:
+            return ""
+        for unit in ("Б", "КБ", "МБ"):
+            if size < 1024:
+                return f"{size:.0f} {unit}" if unit == "Б" else f"{size:.1f} {unit}"
+            size /= 1024
+        return f"{size:.1f} ГБ"
+    
+    def update_progress(self):
+        """Обновляет общий прогресс пакета"""
+        if not self.jobs:
+            return
+        
+        progress_percent = batch_percent(self.jobs)
+        self.progress['value'] = progress_percent
+        
+        finished = sum(1 for job in self.jobs if job.finished)
+        running = sum(1 for job in self.jobs if job.status == ConversionJob.RUNNING)
+        self.progress_info.config(
+            text=f"{progress_percent:.1f}% (готово {finished}/{len(self.jobs)}, в работе: {running})"
+        )
+        
+        # Оставшееся время: прогноз по прошлым задачам, уточняемый живой скоростью
+        remaining_time = self.engine.batch_eta() if self.engine else 0
+        if remaining_time > 0:
+            running_jobs = [job for job in self.jobs if job.status == ConversionJob.RUNNING]
+            current_text = ""
+            if running_jobs:
+                current_text = f", текущий файл: {self.format_time(job_remaining(running_jobs[0]))}"
             
-            self.window.update_idletasks()
+            # Скорость кодирования по данным ffmpeg (1.0x - реальное время)
+            speeds = [job.speed for job in running_jobs if job.speed > 0]
+            speed_text = f"  (скорость {sum(speeds):.1f}x)" if speeds else ""
+            self.time_label.config(
+                text=f"Осталось: {self.format_time(remaining_time)}{current_text}{speed_text}"
+            )
+        
+        self.window.update_idletasks()
+    
+    def file_row_values(self, row):
+        """Колонки строки таблицы: имя, фрагмент, статус, длительность, размер, скорость"""
+        path, start, end = split_clip(self.files_to_convert[row])
+        size = self.format_size(self.file_size(path))
+        clip = self.format_clip(start, end)
+        if row >= len(self.jobs):
+            return (os.path.basename(path), clip, "", "", size, "")
+        
+        job = self.jobs[row]
+        duration = self.format_time(job.duration) if job.duration > 0 else ""
+        speed = f"{job.speed:.1f}x" if job.speed > 0 else ""
+        return (job.name, clip, self.job_state(job), duration, size, speed)
+    
+    def format_clip(self, start, end):
+        if start is None and end is None:
+            return ""
+        start_text = format_clip_time(start) if start is not None else "начало"
+        end_text = format_clip_time(end) if end is not None else "конец"
+        return f"{start_text} - {end_text}"
+    
+    def edit_clip(self, row):
+        """Задает начало и конец фрагмента файла (пусто - весь файл)"""
+        if self.is_converting:
+            return
+        path, start, end = split_clip(self.files_to_convert[row])
+        current = with_clip('', start, end)[len(CLIP_MARK):]
+        text = simpledialog.askstring(
+            "Фрагмент",
+            f"{os.path.basename(path)}\n\nНачало и конец через запятую, например 1:30,2:45\n"
+            f"(\"1:30,\" - до конца файла, пусто - весь файл):",
+            initialvalue=current, parent=self.window
+        )
+        if text is None:
+            return
+        
+        start_text, _, end_text = text.partition(',')
+        try:
+            start, end = parse_time(start_text), parse_time(end_text)
+        except ValueError:
+            messagebox.showerror("Ошибка", "Время указывается как 90, 1:30 или 01:02:03.5")
+            return
+        if start is not None and end is not None and end <= start:
+            messagebox.showerror("Ошибка", "Конец фрагмента должен быть позже начала")
+            return
+        
+        self.files_to_convert[row] = with_clip(path, start, end)
+        self.file_table.refresh_row(row)
+    
+    def job_state(self, job):
+        """Статус задачи для таблицы (статус и процент)"""
+        if job.status == ConversionJob.RUNNING and job.stage == "faststart":
+            state = "запись индекса..."
+        elif job.status == ConversionJob.RUNNING:
+            state = f"{job.percent:.0f}%"
+        else:
+            state = {
+                ConversionJob.PENDING: "",
+                ConversionJob.DONE: "✅",
+                ConversionJob.FAILED: "❌",
+                ConversionJob.CANCELLED: "отменено"
+            }[job.status]
+        
+        if job.cached == 'skipped':
+            state += " уже готов"
+        elif job.cached == 'cache':
+            state += " из кэша"
+        elif job.renditions:
+            state += f" {' + '.join(r.name for r in job.renditions)}"
+        elif job.mode and job.status != ConversionJob.PENDING:
+            state += f" {StreamPlan.LABELS[job.mode]}"
+        return state.strip()
+    
+    def update_job_row(self, job):
+        """Обновляет строку файла в таблице (если она видна)"""
+        self.file_table.refresh_row(job.index)
     
     def format_time(self, seconds):
         """Форматирует время в ЧЧ:ММ:СС"""
@@ -521,17 +701,26 @@ class VideoConverter:
         else:
             return f"{minutes:02d}:{secs:02d}"
     
-    def start_conversion(self):
-        """Запускает конвертацию в отдельном потоке"""
-        if not hasattr(self, 'files_to_convert') or not self.files_to_convert:
-            messagebox.showwarning("Внимание", "Сначала выберите файлы для конвертации!")
-            return
-        
+    def read_settings(self):
+        """Переносит значения виджетов в настройки; False, если что-то введено неверно"""
         # Сохраняем настройки
         self.settings.update({
             "video_bitrate": self.video_bitrate.get().strip(),
             "audio_bitrate": self.audio_bitrate.get().strip(),
-            "profile": self.profile_var.get()
+            "profile": self.profile_var.get(),
+            "parallel_jobs": self.parallel_jobs.get().strip() or "0",
+            "split_encode": self.split_var.get(),
+            "smart_copy": self.smart_copy_var.get(),
+            "output_cache": self.output_cache_var.get(),
+            "priority": self.priority_var.get(),
+            "prefetch": self.prefetch_var.get(),
+            "queue_order": self.queue_order_var.get(),
+            "encoder_target": self.encoder_target_var.get(),
+            "mp4_layout": "fragmented" if self.fragmented_var.get() else "faststart",
+            "smart_cut": self.smart_cut_var.get(),
+            "distributed_listen": self.distributed_listen.get().strip(),
+            "distributed_token": self.distributed_token.get(),
+            "ladder": "" if self.ladder_var.get() == "нет" else self.ladder_var.get()
         })
         self.save_settings()
         
@@ -542,19 +731,50 @@ class VideoConverter:
             
             if not video_val or int(video_val) <= 0:
                 messagebox.showerror("Ошибка", "Введите корректный битрейт видео (> 0)")
-                return
+                return False
                 
             if not audio_val or int(audio_val) <= 0:
                 messagebox.showerror("Ошибка", "Введите корректный битрейт аудио (> 0)")
-                return
+                return False
                 
         except ValueError:
             messagebox.showerror("Ошибка", "Битрейт должен быть числом!")
+            return False
+        
+        try:
+            min_realtime = float(self.min_realtime.get().strip().replace(',', '.'))
+        except ValueError:
+            messagebox.showerror("Ошибка", "Скорость кодировщика должна быть числом (например 1.5)")
+            return False
+        self.settings["min_realtime"] = min_realtime
+        
+        if self.settings["distributed_listen"]:
+            try:
+                host, _ = parse_address(self.settings["distributed_listen"])
+            except ValueError:
+                messagebox.showerror("Ошибка", "Адрес исполнителей указывается как хост:порт, например 0.0.0.0:8765")
+                return False
+            try:
+                check_token(host, self.settings["distributed_token"])
+            except ValueError:
+                messagebox.showerror("Ошибка", "Чтобы принимать исполнителей с других ПК, задайте ключ доступа")
+                return False
+        self.save_settings()
+        return True
+    
+    def start_conversion(self):
+        """Запускает конвертацию в отдельном потоке"""
+        if not hasattr(self, 'files_to_convert') or not self.files_to_convert:
+            messagebox.showwarning("Внимание", "Сначала выберите файлы для конвертации!")
+            return
+        if not self.read_settings():
             return
         
         # Блокируем кнопки во время конвертации
         self.btn_select.config(state='disabled')
+        self.btn_select_folder.config(state='disabled')
         self.btn_convert.config(state='disabled')
+        self.btn_predict.config(state='disabled')
         self.btn_cancel.config(state='normal')
         self.is_converting = True
         
@@ -562,96 +782,266 @@ class VideoConverter:
         self.progress_info.config(text="Подготовка...")
         self.time_label.config(text="")
         
+        # Движок получает копию настроек и сообщает о ходе работы событиями
+        self.jobs = []
+        self.events.clear()
+        self.engine = ConversionEngine(
+            ConversionOptions.from_settings(self.settings),
+            self.ffmpeg_path,
+            on_event=self.on_engine_event,
+            ffmpeg_encoders=self.settings["ffmpeg_cache"].get("encoders")
+        )
+        
         # Запускаем в отдельном потоке
         thread = threading.Thread(target=self.convert_all)
         thread.daemon = True
         thread.start()
     
+    def start_prediction(self):
+        """Прогноз пакета: несколько коротких отрывков каждого файла кодируются
+        текущими настройками (в фоне, обычно несколько секунд)"""
+        if not self.files_to_convert:
+            messagebox.showwarning("Внимание", "Сначала выберите файлы для конвертации!")
+            return
+        if not self.read_settings():
+            return
+        
+        self.is_predicting = True
+        self.update_convert_button()
+        self.update_status("Прогноз: пробное кодирование отрывков...")
+        engine = ConversionEngine(
+            ConversionOptions.from_settings(self.settings),
+            self.ffmpeg_path,
+            ffmpeg_encoders=self.settings["ffmpeg_cache"].get("encoders")
+        )
+        files = list(self.files_to_convert)
+        
+        def predict():
+            try:
+                result = engine.predict(files)
+            except Exception as e:
+                result = e
+            self.prediction_queue.put(result)
+        
+        thread = threading.Thread(target=predict)
+        thread.daemon = True
+        thread.start()
+        self.window.after(100, self.poll_prediction)
+    
+    def poll_prediction(self):
+        """Результат прогноза из фонового потока"""
+        try:
+            prediction = self.prediction_queue.get_nowait()
+        except queue.Empty:
+            self.window.after(100, self.poll_prediction)
+            return
+        
+        self.is_predicting = False
+        self.update_convert_button()
+        if isinstance(prediction, Exception):
+            self.update_status("Прогноз не удался")
+            messagebox.showerror("Ошибка", f"Не удалось сделать прогноз: {prediction}")
+            return
+        self.show_prediction(prediction)
+    
+    def show_prediction(self, prediction):
+        """Итоги прогноза; если места не хватит - конвертация не запускается"""
+        sampled = sum(1 for f in prediction.files if f.sampled)
+        lines = [
+            f"Файлов: {len(prediction.files)} (по отрывкам: {sampled})",
+            f"Размер результатов: ~{self.format_size(prediction.output_bytes)}",
+            f"Время пакета: ~{self.format_time(prediction.batch_seconds)}"
+        ]
+        if prediction.unknown:
+            lines.append(f"Не удалось прочитать файлов: {prediction.unknown}")
+        for volume in prediction.volumes:
+            free = self.format_size(volume["free_bytes"]) or "?"
+            state = "" if volume["enough"] else " - НЕ ХВАТИТ"
+            lines.append(f"{volume['path']}: нужно {self.format_size(volume['needed_bytes'])}, "
+                         f"свободно {free}{state}")
+        text = "\n".join(lines)
+        self.update_status(f"Прогноз: ~{self.format_size(prediction.output_bytes)}, "
+                           f"~{self.format_time(prediction.batch_seconds)}")
+        
+        if not prediction.enough_space:
+            messagebox.showerror(
+                "Не хватит места",
+                f"{text}\n\nКонвертация не запущена: освободите место на диске или уменьшите битрейт"
+            )
+            return
+        if messagebox.askyesno("Прогноз", f"{text}\n\nНачать конвертацию?"):
+            self.start_conversion()
+    
     def cancel_conversion(self):
-        """Отменяет конвертацию"""
-        if self.current_process and self.is_converting:
-            self.current_process.terminate()
+        """Отменяет конвертацию (останавливает все запущенные задачи)"""
+        if self.engine and self.is_converting:
             self.is_converting = False
+            self.engine.cancel()
             self.update_status("Конвертация отменена")
     
     def convert_all(self):
-        """Конвертирует все выбранные файлы"""
-        total_files = len(self.files_to_convert)
-        success_count = 0
-        errors = []
+        """Конвертирует все выбранные файлы (в потоке, через движок)"""
+        self.engine.run(self.files_to_convert)
+    
+    def on_engine_event(self, event):
+        """Событие движка (приходит из рабочих потоков) - только в очередь"""
+        self.events.post(event)
+    
+    def poll_events(self):
+        """Забирает события движка по таймеру и обновляет окно один раз за такт"""
+        changed = False
+        for event in self.events.drain():
+            if event.kind == Event.BATCH_FINISHED:
+                self.show_results(event.data)
+                changed = False
+            elif self.engine is not None:
+                changed = self.handle_event(event) or changed
         
-        for file_idx, input_file in enumerate(self.files_to_convert, 1):
-            if not self.is_converting:
-                break
-                
-            filename = os.path.basename(input_file)
-            self.window.after(0, lambda f=filename, idx=file_idx, tot=total_files: 
-                            self.update_status(f"Файл {idx}/{tot}: {f}"))
-            
-            # Создаем выходную папку
-            output_dir = os.path.join(os.path.dirname(input_file), self.settings["output_dir"])
-            os.makedirs(output_dir, exist_ok=True)
-            
-            output_file = os.path.join(output_dir, f"{os.path.splitext(filename)[0]}.mp4")
-            
-            # Получаем длительность видео
-            self.total_duration = self.get_video_duration(input_file)
-            self.converted_duration = 0
-            self.start_time = time.time()
-            
-            if self.total_duration > 0:
-                self.window.after(0, lambda: self.progress_info.config(text="0%"))
-            
-            # Функция обратного вызова для обновления прогресса
-            def progress_callback(current_time):
-                self.window.after(0, lambda: self.update_progress(current_time))
-            
-            # Конвертируем с отслеживанием прогресса
-            success, result = self.convert_video_with_progress(
-                input_file, output_file, progress_callback
-            )
-            
-            if success:
-                success_count += 1
-                self.progress['value'] = 100
-                self.progress_info.config(text="100% - Завершено")
-                self.time_label.config(text="")
-            else:
-                errors.append(f"{filename}: {result}")
-            
-            # Сбрасываем прогресс
-            self.window.after(0, lambda: self.progress.configure(value=0))
+        if changed:
+            self.update_progress()
+        self.window.after(EVENT_POLL_MS, self.poll_events)
+    
+    def handle_event(self, event):
+        """Обрабатываем событие движка в главном потоке; True - нужен пересчет прогресса"""
+        if event.kind == Event.BATCH_STARTED:
+            self.jobs = self.engine.jobs
+            self.start_time = self.engine.start_time
+            self.file_table.refresh()
+            return False
+        
+        if event.kind == Event.BATCH_PLANNED:
+            return True
+        
+        if event.kind == Event.ENCODER_SELECTED:
+            preset = f" {event.data['preset']}" if event.data["preset"] else ""
+            self.update_status(f"Кодировщик: {event.data['encoder']}{preset}")
+            return False
+        
+        if event.kind in (Event.AGENT_CONNECTED, Event.AGENT_DISCONNECTED):
+            action = "подключен" if event.kind == Event.AGENT_CONNECTED else "отключен"
+            self.update_status(f"Исполнитель {event.data['agent']} {action}, мест: {event.data['slots']}")
+            return True
+        
+        index = event.data.get("index")
+        if index is None or index >= len(self.jobs):
+            return False
         
-        # Восстанавливаем интерфейс
-        self.window.after(0, self.restore_ui)
+        self.update_job_row(self.jobs[index])
         
-        # Показываем результаты
-        self.window.after(0, lambda: 
-                         self.update_status(f"Готово! Успешно: {success_count}/{total_files}"))
+        if event.kind == Event.JOB_STARTED:
+            running = [job.name for job in self.jobs if job.status == ConversionJob.RUNNING]
+            self.update_status(f"В работе: {', '.join(running)}")
+        return True
+    
+    def show_results(self, summary):
+        """Итоги пакета"""
+        self.restore_ui()
+        self.update_status(f"Готово! Успешно: {summary['succeeded']}/{summary['total']}")
         
+        errors = summary["errors"]
         if errors:
             error_text = "\n\n".join(errors[:3])
             if len(errors) > 3:
                 error_text += f"\n\n...и еще {len(errors) - 3} ошибок"
             
-            self.window.after(0, lambda: 
-                            messagebox.showerror("Ошибки конвертации", 
-                                               f"Были ошибки:\n\n{error_text}"))
-        elif success_count > 0:
-            self.window.after(0, lambda: 
-                            messagebox.showinfo("Готово", 
-                                              f"Конвертация завершена успешно!\n\n"
-                                              f"Успешно: {success_count}/{total_files}\n"
-                                              f"Файлы сохранены в папке '{self.settings['output_dir']}'"))
+            messagebox.showerror("Ошибки конвертации", 
+                                 f"Были ошибки:\n\n{error_text}")
+        elif summary["succeeded"] > 0:
+            messagebox.showinfo("Готово", 
+                                f"Конвертация завершена успешно!\n\n"
+                                f"Успешно: {summary['succeeded']}/{summary['total']}\n"
+                                f"Без перекодирования видео: {summary['copied']}\n"
+                                f"Уже были готовы или взяты из кэша: {summary['cached']}\n"
+                                f"Средняя скорость: {summary['metrics']['fps_avg']} fps "
+                                f"({summary['metrics']['speed_avg']}x)\n"
+                                f"Файлы сохранены в папке '{self.settings['output_dir']}'")
+    
+    def export_metrics(self):
+        """Сохраняет историю метрик задач в CSV или JSON"""
+        records = MetricsHistory("metrics_history.jsonl").load()
+        if not records:
+            messagebox.showinfo("Отчет", "История пока пуста: сначала сконвертируйте файлы")
+            return
+        
+        path = filedialog.asksaveasfilename(
+            title="Сохранить отчет",
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("JSON", "*.json")]
+        )
+        if not path:
+            return
+        
+        try:
+            export_report(records, path)
+            self.update_status(f"Отчет сохранен: {os.path.basename(path)} ({len(records)} задач)")
+        except OSError as e:
+            messagebox.showerror("Ошибка", f"Не удалось сохранить отчет: {str(e)}")
+    
+    def offer_resume(self):
+        """Предлагает продолжить пакет, прерванный закрытием или сбоем"""
+        batch = self.journal.unfinished_batch()
+        if batch is None or self.ffmpeg_path is None:
+            return
+        
+        remaining, saved_settings = batch
+        remaining = [path for path in remaining if os.path.exists(split_clip(path)[0])]
+        if not remaining:
+            self.journal.finish_batch()
+            return
+        
+        if not messagebox.askyesno(
+            "Незавершенная конвертация",
+            f"Прошлый пакет не был завершен.\n\n"
+            f"Осталось файлов: {len(remaining)}\n\n"
+            f"Продолжить с первого незавершенного файла?"
+        ):
+            self.journal.finish_batch()
+            return
+        
+        # Продолжаем с теми же настройками, что были у пакета
+        saved_settings.pop("theme", None)
+        self.settings.update(saved_settings)
+        self.apply_settings_to_ui()
+        self.set_files(remaining)
+        self.start_conversion()
+    
+    def apply_settings_to_ui(self):
+        """Переносит настройки в виджеты"""
+        for entry, key in ((self.video_bitrate, "video_bitrate"),
+                           (self.audio_bitrate, "audio_bitrate"),
+                           (self.parallel_jobs, "parallel_jobs")):
+            entry.delete(0, tk.END)
+            entry.insert(0, self.settings[key])
+        
+        self.profile_var.set(self.settings["profile"])
+        self.split_var.set(self.settings["split_encode"])
+        self.smart_copy_var.set(self.settings["smart_copy"])
+        self.output_cache_var.set(self.settings["output_cache"])
+        self.priority_var.set(self.settings["priority"])
+        self.prefetch_var.set(self.settings["prefetch"])
+        self.queue_order_var.set(self.settings["queue_order"])
+        self.encoder_target_var.set(self.settings["encoder_target"])
+        self.fragmented_var.set(self.settings["mp4_layout"] == "fragmented")
+        self.smart_cut_var.set(self.settings["smart_cut"])
+        self.min_realtime.delete(0, tk.END)
+        self.min_realtime.insert(0, str(self.settings["min_realtime"]))
+        self.distributed_listen.delete(0, tk.END)
+        self.distributed_listen.insert(0, self.settings["distributed_listen"])
+        self.distributed_token.delete(0, tk.END)
+        self.distributed_token.insert(0, self.settings["distributed_token"])
+        self.ladder_var.set(self.settings["ladder"] or "нет")
     
     def restore_ui(self):
         """Восстанавливает UI после конвертации"""
         self.btn_select.config(state='normal')
+        self.btn_select_folder.config(state='normal')
         self.btn_convert.config(state='normal')
+        self.btn_predict.config(state='normal')
         self.btn_cancel.config(state='disabled')
         self.is_converting = False
-        self.current_process = None
+        self.engine = None
         
+        self.progress['value'] = 0
         self.progress_info.config(text="Ожидание...")
         self.time_label.config(text="")
     
@@ -0,0 +1,282 @@
+import os
+import time
+import errno
+import select
+import struct
+import threading
+
+
+# inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_libc():
+    """libc с inotify или None (не Linux)"""
+    try:
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+        return libc
+    except (OSError, AttributeError, ImportError):
+        return None
+
+
+class InotifyBackend:
+    """Изменения в папках через inotify (Linux)"""
+
+    def __init__(self, libc, should_skip_dir):
+        import ctypes
+
+        self.ctypes = ctypes
+        self.libc = libc
+        self.should_skip_dir = should_skip_dir
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self.watches = {}  # дескриптор -> папка
+
+    def add_folder(self, folder, recursive):
+        """Подписывается на папку (и вложенные); возвращает новые папки"""
+        added = []
+        for path in _walk_dirs(folder, recursive, self.should_skip_dir):
+            if path in self.watches.values():
+                continue
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                # Например, кончился лимит max_user_watches - такие папки остаются без слежения
+                continue
+            self.watches[wd] = path
+            added.append(path)
+        return added
+
+    def wait(self, timeout, recursive):
+        """Ждет событий: (измененные файлы, нужен_полный_пересмотр)"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set(), False
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return set(), False
+            raise
+
+        changed = set()
+        rescan = False
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                rescan = True
+                continue
+            folder = self.watches.get(wd)
+            if mask & (IN_IGNORED | IN_DELETE_SELF):
+                self.watches.pop(wd, None)
+                continue
+            if folder is None or not name:
+                continue
+
+            path = os.path.join(folder, name)
+            if mask & IN_ISDIR:
+                # Новая вложенная папка: следим и за ней, файлы в ней - проверяем
+                if recursive and mask & (IN_CREATE | IN_MOVED_TO) and not self.should_skip_dir(name):
+                    for new_folder in self.add_folder(path, recursive):
+                        changed.update(_list_files(new_folder))
+                continue
+            changed.add(path)
+        return changed, rescan
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+def _walk_dirs(folder, recursive, should_skip_dir):
+    yield folder
+    if not recursive:
+        return
+    for root, dirs, _ in os.walk(folder):
+        dirs[:] = [name for name in dirs if not should_skip_dir(name)]
+        for name in dirs:
+            yield os.path.join(root, name)
+
+
+def _list_files(folder):
+    try:
+        with os.scandir(folder) as entries:
+            return [entry.path for entry in entries if entry.is_file()]
+    except OSError:
+        return []
+
+
+class FolderWatcher:
+    """Следит за папками и отдает новые видеофайлы, когда их дописали.
+
+    Файл считается готовым, когда его размер и время изменения не менялись
+    settle секунд (недокопированные файлы пропускаются). На Linux изменения
+    приходят через inotify, иначе папки просматриваются раз в poll_interval.
+    """
+
+    def __init__(self, folders, on_ready, extensions, recursive=False, settle=5.0,
+                 poll_interval=2.0, skip_dirs=(), include_existing=True, use_inotify=True):
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.on_ready = on_ready
+        self.extensions = tuple(extensions)
+        self.recursive = recursive
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.skip_dirs = set(skip_dirs)
+        self.include_existing = include_existing
+
+        self.candidates = {}  # путь -> (размер, mtime, с какого момента не меняется)
+        self.seen = {}        # путь -> (размер, mtime) уже отданных файлов
+        self.stopped = threading.Event()
+
+        self.backend = None
+        libc = _load_libc() if use_inotify else None
+        if libc is not None:
+            try:
+                self.backend = InotifyBackend(libc, self.should_skip_dir)
+            except OSError:
+                self.backend = None
+
+    @property
+    def mode(self):
+        return 'inotify' if self.backend else 'polling'
+
+    def should_skip_dir(self, name):
+        # Папки с результатами и служебные: иначе результаты конвертировались бы снова
+        return name.startswith('.') or name in self.skip_dirs
+
+    def is_video(self, path):
+        name = os.path.basename(path)
+        # Скрытые - в том числе недописанные результаты (.имя.part.mp4)
+        if name.startswith('.') or not name.lower().endswith(self.extensions):
+            return False
+        # Файлы из папок с результатами не берем, даже если пришло событие
+        directory = os.path.dirname(os.path.abspath(path))
+        for folder in self.folders:
+            # На Windows пути с разных дисков несравнимы (ValueError) - значит, не эта папка
+            try:
+                if os.path.commonpath([folder, directory]) != folder:
+                    continue
+            except ValueError:
+                continue
+            relative = os.path.relpath(directory, folder)
+            return not any(self.should_skip_dir(part) for part in relative.split(os.sep)
+                           if part != os.curdir)
+        return True
+
+    def scan(self):
+        """Все видео в папках: {путь: (размер, mtime)}"""
+        files = {}
+        for folder in self.folders:
+            for path in _walk_dirs(folder, self.recursive, self.should_skip_dir):
+                for file_path in _list_files(path):
+                    if self.is_video(file_path):
+                        stat = _stat(file_path)
+                        if stat:
+                            files[file_path] = stat
+        return files
+
+    def touch(self, path, now):
+        """Файл изменился (или мог измениться): проверим его на готовность"""
+        if not self.is_video(path):
+            return
+        stat = _stat(path)
+        if stat is None:
+            self.candidates.pop(path, None)
+            return
+        if self.seen.get(path) == stat:
+            return
+        current = self.candidates.get(path)
+        if current is None or current[:2] != stat:
+            self.candidates[path] = (stat[0], stat[1], now)
+
+    def check_ready(self, now):
+        """Отдает файлы, которые не менялись settle секунд"""
+        ready = []
+        for path, (size, mtime, since) in list(self.candidates.items()):
+            stat = _stat(path)
+            if stat is None:
+                del self.candidates[path]
+            elif stat != (size, mtime):
+                self.candidates[path] = (stat[0], stat[1], now)
+            elif now - since >= self.settle and size > 0:
+                del self.candidates[path]
+                self.seen[path] = stat
+                ready.append(path)
+
+        for path in sorted(ready):
+            self.on_ready(path)
+
+    def run(self):
+        """Основной цикл (блокирует до stop())"""
+        now = time.monotonic()
+        existing = self.scan()
+        if self.include_existing:
+            for path in existing:
+                self.touch(path, now)
+        else:
+            self.seen.update(existing)
+
+        if self.backend:
+            for folder in self.folders:
+                self.backend.add_folder(folder, self.recursive)
+
+        try:
+            while not self.stopped.is_set():
+                # Пока есть кандидаты, просыпаемся чаще, чтобы не ждать лишнего
+                timeout = 0.5 if self.candidates else self.poll_interval
+                now = time.monotonic()
+                if self.backend:
+                    changed, rescan = self.backend.wait(timeout, self.recursive)
+                    now = time.monotonic()
+                    if rescan:
+                        changed.update(self.scan())
+                    for path in changed:
+                        self.touch(path, now)
+                else:
+                    self.stopped.wait(timeout)
+                    now = time.monotonic()
+                    for path, stat in self.scan().items():
+                        if self.seen.get(path) != stat and path not in self.candidates:
+                            self.touch(path, now)
+                self.check_ready(now)
+        finally:
+            if self.backend:
+                self.backend.close()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns